@@ -0,0 +1,341 @@
+"""
+Read-only HTTP API over the trials store, for integrations.
+
+A plain ASGI app (no framework): any ASGI server can run it, e.g.
+
+    python api.py --port 8502              # needs `pip install uvicorn`
+    uvicorn api:app --port 8502
+
+Endpoints (GET, JSON unless noted):
+
+    /health                      data version / epoch / max id
+    /trials                      filtered page, newest first (keyset: ?before_id=)
+    /trials/<id>                 one trial
+    /stats                       dashboard metrics (?today=YYYY-MM-DD)
+    /changes?since=&after_id=    rows changed + ids deleted since a sync
+    /export.csv, /export.ndjson  streamed export of the filtered trials
+
+Filters: ?from=&to= (YYYY-MM-DD), ?subject= and ?status= (repeatable),
+?evaluator=, ?q= (same search as the app).
+
+Every response carries an ETag built from the data version and the path +
+query it answers, so clients polling with If-None-Match get a 304 (no query
+run) until something is written. Incremental sync: load everything once (/health for the version,
+epoch and max id, then /export.ndjson), then keep the `version`, `max_id`
+and `epoch` of the last response and pass them back as
+/changes?since=&after_id=&epoch=; a 409 means the table was rebuilt and the
+client must reload.
+
+Queries run on a pool of read-only SQLite connections, off the event loop.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import threading
+from datetime import date, datetime
+from urllib.parse import parse_qs
+
+from trialhub import db, repository, schema
+from trialhub.trial_time import now_vn
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+POOL_SIZE = 4
+EXPORT_CHUNK_ROWS = 5000
+
+API_COLUMNS = repository.TRIAL_COLUMNS + ['trial_day', 'version', 'updated_at']
+
+
+class BadRequest(Exception):
+    pass
+
+
+# --- Request parsing ---
+def _param(query, name, default=None):
+    values = query.get(name)
+    return values[-1] if values else default
+
+
+def _int(query, name, default=None, minimum=None, maximum=None):
+    value = _param(query, name)
+    if value is None:
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise BadRequest(f"'{name}' must be an integer")
+    if minimum is not None and value < minimum:
+        raise BadRequest(f"'{name}' must be >= {minimum}")
+    return min(value, maximum) if maximum is not None else value
+
+
+def _date(query, name):
+    value = _param(query, name)
+    if value is None:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise BadRequest(f"'{name}' must be a date (YYYY-MM-DD)")
+
+
+def parse_filters(query):
+    """Query string -> repository filter dict (same filters as the app sidebar)."""
+    start, end = _date(query, 'from'), _date(query, 'to')
+    date_range = None
+    if start or end:
+        date_range = (start or date(1900, 1, 1), end or date(9999, 12, 31))
+    return repository.make_filters(
+        date_range=date_range,
+        subjects=query.get('subject'),
+        statuses=query.get('status'),
+        evaluator=_param(query, 'evaluator'),
+        search=_param(query, 'q'),
+    )
+
+
+def _records(df):
+    # NaN/None -> null, numpy scalars -> plain Python values
+    return json.loads(df.to_json(orient='records', force_ascii=False))
+
+
+# --- Handlers (run in a worker thread with a pooled connection) ---
+def _watermark(conn):
+    return {
+        'version': repository.data_version(conn),
+        'epoch': repository.data_epoch(conn),
+        'max_id': repository.max_id(conn),
+    }
+
+
+def health(conn, query):
+    return _watermark(conn)
+
+
+def list_trials(conn, query):
+    filters = parse_filters(query)
+    limit = _int(query, 'limit', DEFAULT_PAGE_SIZE, minimum=1, maximum=MAX_PAGE_SIZE)
+    before_id = _int(query, 'before_id')
+    page = repository.fetch_page(conn, filters, API_COLUMNS, before_id, limit)
+    body = {
+        'items': _records(page),
+        # Cursor of the next page (None on the last one)
+        'next_before_id': int(page['id'].iloc[-1]) if len(page) == limit else None,
+    }
+    if _param(query, 'count') in ('1', 'true'):
+        body['count'] = repository.count_trials(conn, filters)
+    return body
+
+
+def get_trial(conn, query, trial_id):
+    trial = repository.get_trial(conn, trial_id)
+    if trial is None:
+        return 404, {'error': f"trial {trial_id} not found"}
+    return trial
+
+
+def stats(conn, query):
+    # VN calendar day, like the dashboard (not the server's local date)
+    today = _date(query, 'today') or now_vn().date()
+    result = repository.dashboard_stats(conn, today)
+    result['status_counts'] = {k: int(v) for k, v in result['status_counts'].items()}
+    result['today_date'] = today.isoformat()
+    return result
+
+
+def changes(conn, query):
+    since = _int(query, 'since', minimum=0)
+    after_id = _int(query, 'after_id', minimum=0)
+    if since is None or after_id is None:
+        raise BadRequest("'since' and 'after_id' are required: the version and max_id of the last sync "
+                         "(initial load: /health + /export.ndjson)")
+    # One read snapshot: the watermark matches exactly the rows returned
+    conn.execute("BEGIN")
+    mark = _watermark(conn)
+    client_epoch = _int(query, 'epoch')
+    if client_epoch is not None and client_epoch != mark['epoch']:
+        return 409, {'error': "table was rebuilt, reload everything", 'epoch': mark['epoch']}
+    changed, deleted = repository.fetch_changes(conn, since, after_id, API_COLUMNS)
+    return {**mark, 'changed': _records(changed), 'deleted': deleted}
+
+
+ROUTES = {
+    '/health': health,
+    '/trials': list_trials,
+    '/stats': stats,
+    '/changes': changes,
+}
+
+EXPORTS = {
+    '/export.csv': 'text/csv; charset=utf-8',
+    '/export.ndjson': 'application/x-ndjson',
+}
+
+
+def export_chunks(conn, query, fmt):
+    """Encoded chunks of the filtered export (csv with one header row, or NDJSON)."""
+    filters = parse_filters(query)
+    first = True
+    for chunk in repository.iter_trials(conn, API_COLUMNS, EXPORT_CHUNK_ROWS, filters):
+        if fmt == '/export.csv':
+            text = chunk.to_csv(index=False, header=first)
+        else:
+            text = chunk.to_json(orient='records', lines=True, force_ascii=False)
+            if text and not text.endswith('\n'):
+                text += '\n'
+        first = False
+        yield text.encode('utf-8')
+
+
+def _query_key(query):
+    # The order of different parameters does not change the response; repeated
+    # values keep theirs (single-value parameters use the last one)
+    return json.dumps(sorted(query.items()), ensure_ascii=False)
+
+
+def etag_for(conn, path, query):
+    """Validator of a response: data version + epoch, path and query (+ the day /stats depends on)."""
+    key = f"{repository.data_epoch(conn)}.{repository.data_version(conn)}"
+    if path == '/stats' and not _param(query, 'today'):
+        key += f".{now_vn().date().isoformat()}"
+    return '"' + hashlib.sha1(f"{key}|{path}?{_query_key(query)}".encode('utf-8')).hexdigest()[:16] + '"'
+
+
+def _not_modified(headers, etag):
+    candidates = headers.get('if-none-match', '')
+    return any(tag.strip().removeprefix('W/') in (etag, '*') for tag in candidates.split(','))
+
+
+# --- ASGI ---
+def create_app(db_path=db.DB_PATH, pool_size=POOL_SIZE):
+    """ASGI application serving the read-only API on `db_path`."""
+    state = {'pool': None}
+    lock = threading.Lock()
+
+    def pool():
+        # Opened on first use (also works under servers without lifespan events)
+        with lock:
+            if state['pool'] is None:
+                pool = db.open_read_pool(db_path, pool_size)
+                with db.read_connection(pool) as conn:
+                    migrated = conn.execute("PRAGMA user_version").fetchone()[0] >= len(schema.MIGRATIONS)
+                if not migrated:
+                    db.close_pool(pool)
+                    raise RuntimeError(f"{db_path} is not migrated yet: open the app or run import_data.py once")
+                state['pool'] = pool
+            return state['pool']
+
+    async def run_db(func, *args):
+        def call():
+            with db.read_connection(pool()) as conn:
+                return func(conn, *args)
+        return await asyncio.get_running_loop().run_in_executor(None, call)
+
+    async def send_json(send, status, body, etag=None):
+        payload = json.dumps(body, ensure_ascii=False, default=str).encode('utf-8')
+        headers = [(b'content-type', b'application/json; charset=utf-8')]
+        if etag:
+            headers.append((b'etag', etag.encode()))
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': payload})
+
+    async def send_export(send, path, query, etag):
+        loop = asyncio.get_running_loop()
+        conn = await loop.run_in_executor(None, pool().get)
+        chunks = export_chunks(conn, query, path)
+        try:
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', EXPORTS[path].encode()),
+                (b'etag', etag.encode()),
+                (b'content-disposition', f'attachment; filename="trials{path[len("/export"):]}"'.encode()),
+            ]})
+            while True:
+                chunk = await loop.run_in_executor(None, next, chunks, None)
+                if chunk is None:
+                    break
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            # Client may have gone away mid-stream: finish the statement first
+            chunks.close()
+            state['pool'].put(conn)
+
+    async def handle(scope, send):
+        path = scope['path'].rstrip('/') or '/'
+        query = parse_qs(scope.get('query_string', b'').decode('utf-8'))
+        headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope.get('headers', [])}
+
+        if scope['method'] != 'GET':
+            return await send_json(send, 405, {'error': "read-only API: GET only"})
+
+        handler, args = ROUTES.get(path), ()
+        if handler is None and path.startswith('/trials/'):
+            trial_id = path[len('/trials/'):]
+            if not trial_id.isdigit():
+                return await send_json(send, 404, {'error': "not found"})
+            handler, args = get_trial, (int(trial_id),)
+        if handler is None and path not in EXPORTS:
+            return await send_json(send, 404, {'error': "not found"})
+
+        # Conditional request: answered from the data version alone
+        etag = await run_db(etag_for, path, query)
+        if _not_modified(headers, etag):
+            await send({'type': 'http.response.start', 'status': 304, 'headers': [(b'etag', etag.encode())]})
+            return await send({'type': 'http.response.body', 'body': b''})
+
+        try:
+            if path in EXPORTS:
+                parse_filters(query)
+                return await send_export(send, path, query, etag)
+            result = await run_db(handler, query, *args)
+        except BadRequest as e:
+            return await send_json(send, 400, {'error': str(e)})
+        status, body = result if isinstance(result, tuple) else (200, result)
+        await send_json(send, status, body, etag if status == 200 else None)
+
+    async def app(scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    if state['pool'] is not None:
+                        db.close_pool(state['pool'])
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        if scope['type'] != 'http':
+            return
+        started = []
+
+        async def tracked_send(message):
+            if message['type'] == 'http.response.start':
+                started.append(True)
+            await send(message)
+
+        try:
+            await handle(scope, tracked_send)
+        except Exception as e:
+            if started:
+                # Mid-stream failure: nothing more can be reported to the client
+                raise
+            await send_json(send, 500, {'error': str(e)})
+
+    return app
+
+
+app = create_app()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the read-only TrialHub HTTP API.")
+    parser.add_argument("--db", default=db.DB_PATH, help="SQLite file (default: trialhub.db)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    args = parser.parse_args()
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("uvicorn is needed to serve the API: pip install uvicorn")
+    uvicorn.run(create_app(args.db), host=args.host, port=args.port)
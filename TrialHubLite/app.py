@@ -1,6 +1,6 @@
 import streamlit as st
-import sqlite3
-import pandas as pd
+
+from trialhub import db, repository, schema
 
 # Page Config
 st.set_page_config(
@@ -12,34 +12,17 @@ st.set_page_config(
 # Title
 st.title("📊 TrialHub Lite")
 
-# Database Connection
-@st.cache_resource
-def get_connection():
-    return sqlite3.connect("trialhub.db", check_same_thread=False)
-
-conn = get_connection()
-
-# Fetch Data
-def load_data():
-    query = "SELECT * FROM trials"
-    df = pd.read_sql(query, conn)
-    return df
+# Database Connection (pooled, one per rerun thread, see trialhub/db.py)
+conn = db.get_connection(db.DB_PATH)
+schema.migrate(conn)
 
 try:
-    df = load_data()
-    
     # Metrics
-    st.metric("Total Trials", len(df))
+    st.metric("Total Trials", repository.count_trials(conn))
     
-    # Search/Filter
+    # Search/Filter (done in SQL, same search as the main app)
     search_term = st.text_input("Search (Subject, Phone, Note, etc.)", "")
-    
-    if search_term:
-        # Simple case-insensitive search across all columns
-        mask = df.apply(lambda x: x.astype(str).str.contains(search_term, case=False).any(), axis=1)
-        df_display = df[mask]
-    else:
-        df_display = df
+    df_display = repository.fetch_trials(conn, repository.make_filters(search=search_term))
 
     # Display Data
     st.dataframe(
@@ -0,0 +1,313 @@
+"""
+Benchmarks of the hot paths, outside Streamlit.
+
+Generates sheet-like trial fixtures (messy dates, times, phones and
+statuses, as in the real Google Sheet), imports them into a scratch
+SQLite file and times each path the app runs: reading/cleaning/inserting
+an upload, the list page load, the API's change feed (/changes: rows
+edited since the last sync), search, sidebar filters, pagination, row
+styling, dashboard metrics and the Excel export.
+The `memory` cases report the in-memory size of the export frame
+(DataFrame.memory_usage(deep=True)), object dtypes vs fetch_compact.
+
+Results go to a JSON report (one per run) that can be compared across commits:
+
+    python bench.py                               # 1k, 10k, 100k rows
+    python bench.py --sizes 1000 1000000 --skip export
+    python bench.py --compare bench_results/old.json bench_results/new.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from trialhub import cleaning, db, export, importer, repository, schema, styling
+from trialhub.trial_time import VN_TZ
+
+RESULTS_DIR = "bench_results"
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_REPEAT = 3
+# Relative change reported as a regression / improvement by --compare
+COMPARE_THRESHOLD = 0.10
+
+# Header row of the real sheet (trailing spaces included)
+SHEET_HEADER = ['STT', 'Ngày Trial ', 'Thời gian ', 'Link Trial', 'Môn ', 'Số Điện Thoại',
+                'Tình Trạng ', 'Note', 'Phiếu Đánh Giá', 'TVV']
+# Applied to the uploaded columns (names are stripped on read)
+MAPPINGS = {
+    'stt': 'STT', 'trial_date': 'Ngày Trial', 'time': 'Thời gian', 'meet_link': 'Link Trial',
+    'subject': 'Môn', 'phone': 'Số Điện Thoại', 'status': 'Tình Trạng', 'note': 'Note',
+    'evaluator': 'Phiếu Đánh Giá', 'creator': 'TVV',
+}
+
+# Value pools, roughly weighted like the real data
+STATUSES = ['Hủy lịch', 'Hủy lịch', 'Hủy lịch', 'Đã trial', 'Đã trial', 'Done', 'Gãy', 'gáy ',
+            'Chưa confirm', 'Chờ trial', 'Đã confirm', 'Cọc', 'Reschedule', 'dời lịch', '']
+TIMES = ['18h00', '19h30', '17h30', '20h', '10h', '18h ', '9h00', '19g30', '7', '14:00',
+         '19.30', '20:00', '15h00', '']
+SUBJECTS = ['Art', 'Coding', 'Coding', 'coding ', 'ART', 'Robotics', '']
+PEOPLE = ['Huỳnh Lê', 'Vĩ Triệu', 'Admin', 'TIỀN', 'Huỳnh Lê CHƯA GỬI ZALO', 'Mai Anh', 'Thảo Nguyễn', '']
+NOTES = ['- 18/10: Mai sáng gọi lại cho mẹ', 'phụ huynh không nhấc máy', 'knm', 'tắt máy ngang',
+         'Có Ipad, bạn đã học vẽ được vài tháng', 'từ chối vì không có thời gian học',
+         'Đã gửi thông tin', 'mẹ muốn tìm hiểu cho biết', '']
+
+
+def make_fixture(n, seed=0, today=None):
+    """
+    Sheet-like frame of `n` trials (columns = SHEET_HEADER, all text).
+    Dates span ~4 months around `today`; most date cells are blank (merged
+    cells, forward-filled by the cleaning pipeline). Phones are unique.
+    """
+    rng = np.random.default_rng(seed)
+    today = today or datetime.now(VN_TZ).date()
+
+    def pick(pool):
+        return np.asarray(pool, dtype=object)[rng.integers(0, len(pool), n)]
+
+    # ~1/8 rows start a new day block, days in row order like the sheet
+    day_offsets = np.cumsum(rng.random(n) < 1 / 8) * 120 // max(n // 8, 1) - 90
+    dates = np.array([(today + timedelta(days=int(d))).strftime("%d/%m/%Y") for d in day_offsets], dtype=object)
+    starts = np.r_[True, day_offsets[1:] != day_offsets[:-1]]
+    dates[~starts & (rng.random(n) < 0.9)] = ''
+
+    # Same number written several ways: 84..., 0..., dotted/spaced, float tail
+    digits = (rng.permutation(n) + 900_000_000).astype(str)
+    style = rng.integers(0, 5, n)
+    phones = np.where(style == 0, '84' + digits.astype(object), '0' + digits.astype(object))
+    phones = np.where(style == 2, [f"0{d[:3]}.{d[3:6]}.{d[6:]}" for d in digits], phones)
+    phones = np.where(style == 3, [f"0{d[:3]} {d[3:6]} {d[6:]}" for d in digits], phones)
+    phones = np.where(style == 4, '84' + digits.astype(object) + '.0', phones)
+    phones[rng.random(n) < 0.01] = ''
+
+    letters = rng.integers(ord('a'), ord('z') + 1, (n, 10), dtype=np.uint8).view('S10').ravel()
+    links = np.array([f"https://meet.google.com/{c[:3]}-{c[3:7]}-{c[7:]}" for c in letters.astype(str)], dtype=object)
+    return pd.DataFrame({
+        'STT': np.arange(1, n + 1).astype(str),
+        'Ngày Trial ': dates,
+        'Thời gian ': pick(TIMES),
+        'Link Trial': links,
+        'Môn ': pick(SUBJECTS),
+        'Số Điện Thoại': phones,
+        'Tình Trạng ': pick(STATUSES),
+        'Note': pick(NOTES),
+        'Phiếu Đánh Giá': pick(PEOPLE),
+        'TVV': pick(PEOPLE),
+    }, columns=SHEET_HEADER)
+
+
+def fixture_csv(df):
+    """The fixture as an uploaded .csv file object."""
+    upload = io.BytesIO(df.to_csv(index=False).encode('utf-8'))
+    upload.name = 'bench.csv'
+    upload.size = len(upload.getvalue())
+    return upload
+
+
+# --- Timing ---
+def measure(func, repeat=DEFAULT_REPEAT, setup=None):
+    """Runs func() `repeat` times (after setup(), untimed). Returns (seconds list, last result)."""
+    runs, result = [], None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        t0 = time.perf_counter()
+        result = func()
+        runs.append(time.perf_counter() - t0)
+    return runs, result
+
+
+def _rows(result):
+    if isinstance(result, tuple):
+        result = result[0]
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return len(result)
+    if isinstance(result, int):
+        return result
+    return None
+
+
+# Big frames live in these helpers only: freed on return, before the next cases run
+def _import_cases(case, conn, n, now):
+    """Upload pipeline on an `n`-row fixture: read, clean, insert (the rows stay in conn)."""
+    upload = fixture_csv(make_fixture(n, today=now.date()))
+    df_raw = case('import.read', lambda: importer.read_upload(upload)[0])
+    if df_raw is None:
+        df_raw = importer.read_upload(upload)[0]
+    cleaned = case('import.clean', lambda: cleaning.clean(df_raw, MAPPINGS)[0])
+    if cleaned is None:
+        cleaned = cleaning.clean(df_raw, MAPPINGS)[0]
+
+    def reset():
+        with db.write_transaction(conn):
+            conn.execute("DELETE FROM trials")
+
+    # Insert into an empty table each run (a second run would only hit duplicates)
+    case('import.insert', lambda: importer.bulk_insert_trials(conn, cleaned)[0], setup=reset)
+    if not conn.execute("SELECT COUNT(*) FROM trials").fetchone()[0]:
+        importer.bulk_insert_trials(conn, cleaned)
+
+
+def _styling_cases(case, conn, now):
+    """Row styling (highlight_rows) on the whole list."""
+    frame = repository.fetch_trials(conn, None, repository.LIST_COLUMNS)
+    categories = case('styling.classify', lambda: styling.classify_trials(frame, now))
+    if categories is not None:
+        page = frame.head(50)
+        case('styling.render_page', lambda: styling.style_trials(page, categories.head(50)).to_html())
+
+
+def run_size(n, workdir, repeat=DEFAULT_REPEAT, skip=(), log=print):
+    """Benchmarks every case on an `n`-row fixture. Returns a list of result dicts."""
+    results = []
+    now = datetime.now(VN_TZ).replace(tzinfo=None)
+
+    def case(name, func, runs=repeat, setup=None):
+        if name.split('.')[0] in skip:
+            return None
+        seconds, result = measure(func, runs, setup)
+        row = {
+            'size': n, 'case': name, 'runs': len(seconds),
+            'min': min(seconds), 'median': statistics.median(seconds), 'rows': _rows(result),
+        }
+        results.append(row)
+        log(f"{n:>9,}  {name:<22} {row['median'] * 1000:>10.1f} ms  (min {row['min'] * 1000:.1f})")
+        return result
+
+    def memory(name, func):
+        if name.split('.')[0] in skip:
+            return
+        frame = func()
+        row = {'size': n, 'case': name, 'bytes': int(frame.memory_usage(deep=True).sum()), 'rows': len(frame)}
+        results.append(row)
+        log(f"{n:>9,}  {name:<22} {row['bytes'] / 2**20:>10.1f} MB")
+
+    path = os.path.join(workdir, f"bench_{n}.db")
+    conn = db.connect(path)
+    schema.migrate(conn)
+    _import_cases(case, conn, n, now)
+    conn.execute("PRAGMA optimize")
+
+    # List tab (first keyset page, no filters) and the API's incremental sync
+    case('load_data.page', lambda: repository.fetch_page(conn, None, repository.LIST_COLUMNS))
+    mark = {}
+
+    def touch():
+        # 1% of the rows edited since the last sync
+        mark['since'], mark['after_id'] = repository.data_version(conn), repository.max_id(conn)
+        with db.write_transaction(conn):
+            conn.execute("UPDATE trials SET note = note || '.' WHERE id % 100 = 0")
+
+    case('load_data.changes', lambda: len(repository.fetch_changes(conn, mark['since'], mark['after_id'])[0]), setup=touch)
+
+    # Search / sidebar filters (SQL side)
+    # Words match by prefix (FTS); digits also match anywhere in the phone
+    # (instr scan): a number typed up to its last two digits, and its last four
+    phone_prefix, phone_suffix = conn.execute(
+        "SELECT substr(phone, 1, length(phone) - 2), substr(phone, -4) FROM trials WHERE phone != '' LIMIT 1").fetchone()
+    for name, term in (('search.phone', phone_prefix), ('search.phone_suffix', phone_suffix), ('search.text', 'gọi lại')):
+        found = case(name, lambda term=term: repository.fetch_trials(conn, repository.make_filters(search=term)))
+        if found is not None and found.empty:
+            # A search finding nothing would time a no-op
+            raise RuntimeError(f"{name}: no trial matches {term!r}")
+    filters = repository.make_filters(
+        date_range=(now.date() - timedelta(days=30), now.date()),
+        subjects=['Coding'], statuses=['Đã trial', 'Gãy'],
+    )
+    case('filters.sidebar', lambda: repository.fetch_trials(conn, filters, repository.LIST_COLUMNS))
+    case('filters.count', lambda: repository.count_trials(conn, filters))
+    case('filters.page', lambda: repository.fetch_page(conn, filters, repository.LIST_COLUMNS))
+
+    _styling_cases(case, conn, now)
+
+    case('dashboard', lambda: repository.dashboard_stats(conn, now.date()))
+    # Export is slow on big tables: run once
+    case('export.xlsx', lambda: len(export.export_trials_xlsx(conn, {}, now)), runs=1)
+    # Export frame held while the workbook is written
+    memory('memory.export_object', lambda: repository.fetch_trials(conn, None, repository.EXPORT_COLUMNS))
+    memory('memory.export_compact', lambda: repository.fetch_compact(conn, None, repository.EXPORT_COLUMNS))
+
+    conn.close()
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return results
+
+
+# --- Report ---
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        'commit': _git_commit(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'sqlite': sqlite3.sqlite_version,
+        'machine': platform.platform(),
+    }
+
+
+def run(sizes, repeat=DEFAULT_REPEAT, skip=(), out=None):
+    """Benchmarks every size and writes the JSON report. Returns its path."""
+    report = {'meta': environment(), 'results': []}
+    with tempfile.TemporaryDirectory(prefix="trialhub-bench-") as workdir:
+        for n in sizes:
+            report['results'] += run_size(n, workdir, repeat, skip)
+
+    if out is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        out = os.path.join(RESULTS_DIR, f"{report['meta']['commit'] or 'local'}_{stamp}.json")
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    return out
+
+
+def compare(base_path, new_path, threshold=COMPARE_THRESHOLD):
+    """Side by side medians (sizes for memory cases) of two reports, with the relative change."""
+    def load(path):
+        with open(path, encoding='utf-8') as f:
+            report = json.load(f)
+        return report['meta'], {(r['size'], r['case']): r for r in report['results']}
+
+    base_meta, base = load(base_path)
+    new_meta, new = load(new_path)
+    print(f"{'size':>9}  {'case':<22} {base_meta['commit'] or 'base':>12} {new_meta['commit'] or 'new':>12}   change")
+    for key in sorted(base.keys() & new.keys()):
+        if 'bytes' in base[key]:
+            old_v, new_v, scale, unit, worse, better = base[key]['bytes'], new[key].get('bytes', 0), 2**20, "MB", "larger", "smaller"
+        else:
+            old_v, new_v, scale, unit, worse, better = base[key]['median'], new[key]['median'], 1e-3, "ms", "slower", "faster"
+        change = (new_v - old_v) / old_v if old_v else 0.0
+        flag = f"  {worse}" if change > threshold else f"  {better}" if change < -threshold else ""
+        print(f"{key[0]:>9,}  {key[1]:<22} {old_v / scale:>9.1f} {unit} {new_v / scale:>9.1f} {unit}  {change:>+7.1%}{flag}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the TrialHub hot paths on synthetic data.")
+    parser.add_argument("--sizes", type=int, nargs='+', default=DEFAULT_SIZES, help="Fixture sizes in rows (default: 1000 10000 100000)")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Runs per case (median is reported)")
+    parser.add_argument("--skip", nargs='*', default=[], help="Case groups to skip (import, load_data, search, filters, styling, dashboard, export, memory)")
+    parser.add_argument("--out", help=f"Report file (default: {RESULTS_DIR}/<commit>_<time>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="Compare two reports instead of running")
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+    else:
+        print(f"Report: {run(args.sizes, args.repeat, set(args.skip), args.out)}")
@@ -1,126 +1,258 @@
 import pandas as pd
-import sqlite3
 import os
+import io
+import hashlib
+import argparse
+import urllib.request
+from datetime import datetime
+
+from trialhub import db, importer, schema
 
 # Configuration
 SHEET_ID = "1p4FiH2z5tgr8vlfbg5EE2dZm7g4HHWRr8doBbPzpUrk"
 CSV_URL = f"https://docs.google.com/spreadsheets/d/{SHEET_ID}/export?format=csv"
 DB_NAME = "trialhub.db"
 
-def import_data():
-    print("Downloading data from Google Sheet...")
-    try:
-        # Read first few rows to find header
-        df_raw = pd.read_csv(CSV_URL, header=None, nrows=20)
-        
-        # Find header row index
-        header_row_idx = None
-        for i, row in df_raw.iterrows():
-            # Check if row contains 'STT' and 'Ngày Trial' (or similar)
-            row_str = row.astype(str).str.cat(sep=' ')
-            if 'STT' in row_str and 'Trial' in row_str:
-                header_row_idx = i
-                break
-        
-        if header_row_idx is None:
-            print("Could not find header row. Defaulting to 0.")
-            header_row_idx = 0
+# Rename map
+RENAME_MAP = {
+    'STT': 'stt',
+    'Ngày Trial': 'trial_date',
+    'Thời gian': 'time',
+    'Link Trial': 'meet_link',
+    'Môn': 'subject',
+    'Số Điện Thoại': 'phone',
+    'Tình Trạng': 'status',
+    'Note': 'note',
+    'Phiếu Đánh Giá': 'evaluator',
+    'TVV': 'creator'
+}
+
+# Target columns
+TARGET_COLS = ['stt', 'trial_date', 'time', 'meet_link', 'subject', 'phone', 'status', 'note', 'evaluator', 'creator']
+
+
+def fetch_sheet(source=CSV_URL):
+    """Downloads (or reads, for a local path) the CSV once. Returns raw bytes."""
+    if source.startswith(("http://", "https://")):
+        with urllib.request.urlopen(source, timeout=60) as resp:
+            return resp.read()
+    with open(source, "rb") as f:
+        return f.read()
+
+
+def parse_sheet(content):
+    """Parses the CSV bytes, detecting the header row among the first 20 rows."""
+    df_raw = pd.read_csv(io.BytesIO(content), header=None, dtype=str)
+
+    # Find header row index
+    header_row_idx = None
+    for i, row in df_raw.head(20).iterrows():
+        # Check if row contains 'STT' and 'Ngày Trial' (or similar)
+        row_str = row.astype(str).str.cat(sep=' ')
+        if 'STT' in row_str and 'Trial' in row_str:
+            header_row_idx = i
+            break
+
+    if header_row_idx is None:
+        print("Could not find header row. Defaulting to 0.")
+        header_row_idx = 0
+    else:
+        print(f"Found header at row index: {header_row_idx}")
+
+    # Header from the detected row (deduplicated like pandas does: 'Note', 'Note.1')
+    columns = []
+    seen = {}
+    for i, col in enumerate(df_raw.iloc[header_row_idx]):
+        name = str(col).strip() if pd.notna(col) else f"Unnamed: {i}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
         else:
-            print(f"Found header at row index: {header_row_idx}")
+            seen[name] = 0
+        columns.append(name)
 
-        # Read full data with correct header
-        df = pd.read_csv(CSV_URL, header=header_row_idx)
-        print(f"Downloaded {len(df)} rows.")
-        
-    except Exception as e:
-        print(f"Error downloading data: {e}")
-        return
+    df = df_raw.iloc[header_row_idx + 1:].reset_index(drop=True)
+    df.columns = columns
+    return df
 
-    print("Columns found:", df.columns.tolist())
 
-    # Normalize column names
-    df.columns = df.columns.str.strip()
-    
-    # Rename map
-    rename_map = {
-        'STT': 'stt',
-        'Ngày Trial': 'trial_date',
-        'Thời gian': 'time',
-        'Link Trial': 'meet_link',
-        'Môn': 'subject',
-        'Số Điện Thoại': 'phone',
-        'Tình Trạng': 'status',
-        'Note': 'note',
-        'Phiếu Đánh Giá': 'evaluator',
-        'TVV': 'creator'
-    }
-    
-    # Rename
-    df_db = df.rename(columns=rename_map)
-    
-    # Target columns
-    target_cols = ['stt', 'trial_date', 'time', 'meet_link', 'subject', 'phone', 'status', 'note', 'evaluator', 'creator']
-    
+def to_db_frame(df):
+    """Renames sheet columns to DB columns and drops empty rows."""
+    df_db = df.rename(columns=RENAME_MAP)
+
     # Add missing
-    for col in target_cols:
+    for col in TARGET_COLS:
         if col not in df_db.columns:
             df_db[col] = None
-            
-    df_db = df_db[target_cols]
+
+    df_db = df_db[TARGET_COLS]
 
     # Filter empty
-    df_db = df_db.dropna(subset=['stt', 'trial_date'], how='all')
-    
-    print(f"Rows to insert: {len(df_db)}")
+    return df_db.dropna(subset=['stt', 'trial_date'], how='all')
 
-    # Connect to SQLite
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-
-    # Insert data
-    print("Inserting data...")
-    
-    # Drop table to ensure fresh schema with ID
-    cursor.execute("DROP TABLE IF EXISTS trials")
-    
-    # Create table
-    print("Creating table 'trials'...")
-    cursor.execute("""
-    CREATE TABLE trials (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        stt TEXT,
-        trial_date TEXT,
-        time TEXT,
-        meet_link TEXT,
-        subject TEXT,
-        phone TEXT,
-        status TEXT,
-        note TEXT,
-        evaluator TEXT,
-        creator TEXT
-    )
-    """)
-    
+
+def row_hashes(df_db):
+    """Content fingerprint of each sheet row (all target columns)."""
+    text = df_db[TARGET_COLS].astype('string').fillna('')
+    joined = text.apply(lambda col: col.str.strip()).agg('\x1f'.join, axis=1)
+    return joined.map(lambda s: hashlib.sha1(s.encode('utf-8')).hexdigest())
+
+
+def full_import(conn, df_db):
+    """
+    Full mode: replaces every trial with the sheet rows (wipes app edits), in
+    one transaction. Rows are normalized like sync_rows, so a later sync
+    matches them instead of inserting the same people again.
+    Returns (inserted, unkeyed).
+    """
+    hashes = row_hashes(df_db)
+    rows, unkeyed = importer.prepare_rows(df_db)
+    rows['sheet_hash'] = hashes.loc[rows.index]
+    columns = importer.DB_COLUMNS + ['sheet_hash']
+
+    with db.write_transaction(conn):
+        cursor = conn.cursor()
+        # Reminders already sent follow their trial (same phone + date) to its new id
+        cursor.execute("DROP TABLE IF EXISTS temp.reminders_keep")
+        cursor.execute("""
+            CREATE TEMP TABLE reminders_keep AS
+            SELECT t.phone, t.trial_date, r.lead_seconds, r.trial_ts, r.sent_at
+            FROM reminders_sent r JOIN trials t ON t.id = r.trial_id
+        """)
+        print("Replacing all trials...")
+        cursor.execute("DELETE FROM trials")
+        # Tombstones and sent flags of the old rows must not attach to new ones
+        cursor.execute("DELETE FROM trial_tombstones")
+        cursor.execute("DELETE FROM reminders_sent")
+        cursor.execute("DELETE FROM trial_stats WHERE n = 0")
+        # New epoch: incremental readers (api.py /changes) reload everything
+        cursor.execute("UPDATE data_meta SET value = value + 1 WHERE key = 'trials_epoch'")
+
+        importer.stage_rows(cursor, rows, columns)
+        # Repeated (phone, trial_date): first occurrence wins
+        inserted = importer.merge_staged(cursor, columns)
+        cursor.execute("DROP TABLE IF EXISTS temp.import_staging")
+
+        cursor.execute("""
+            INSERT OR IGNORE INTO reminders_sent (trial_id, lead_seconds, trial_ts, sent_at)
+            SELECT t.id, k.lead_seconds, k.trial_ts, k.sent_at
+            FROM temp.reminders_keep k
+            JOIN trials t ON t.phone = k.phone AND t.trial_date = k.trial_date
+        """)
+        cursor.execute("DROP TABLE temp.reminders_keep")
+
+    if len(rows) > inserted:
+        print(f"Skipped {len(rows) - inserted} duplicate rows (same phone + date).")
+    return inserted, unkeyed
+
+
+def sync_rows(conn, df_db):
+    """
+    Incremental mode: upserts sheet rows keyed on (phone, trial_date).
+    - new key                          -> inserted
+    - synced before, sheet row changed -> updated from the sheet
+    - synced before, unchanged         -> untouched (app edits are kept)
+    - created in the app (no hash yet) -> only adopts the hash, fields untouched
+    Returns (inserted, updated, unkeyed) - unkeyed rows lack phone/date.
+    """
+    hashes = row_hashes(df_db)
+    rows, unkeyed = importer.prepare_rows(df_db)
+    rows['sheet_hash'] = hashes.loc[rows.index]
+    columns = importer.DB_COLUMNS + ['sheet_hash']
+    set_cols = ", ".join(f"{c} = s.{c}" for c in columns)
+    key_match = """
+        trials.phone = s.phone AND trials.trial_date = s.trial_date
+        AND trials.phone <> '' AND trials.trial_date <> ''
+    """
+
+    with db.write_transaction(conn):
+        cursor = conn.cursor()
+        importer.stage_rows(cursor, rows, columns)
+        # Sheet-side duplicates: first occurrence wins (same rule as inserts)
+        cursor.execute("""
+            DELETE FROM temp.import_staging WHERE rowid NOT IN (
+                SELECT MIN(rowid) FROM temp.import_staging GROUP BY phone, trial_date
+            )
+        """)
+        cursor.execute(f"""
+            UPDATE trials SET {set_cols}
+            FROM temp.import_staging s
+            WHERE {key_match}
+              AND trials.sheet_hash IS NOT NULL AND trials.sheet_hash <> s.sheet_hash
+        """)
+        updated = cursor.rowcount
+        cursor.execute(f"""
+            UPDATE trials SET sheet_hash = s.sheet_hash
+            FROM temp.import_staging s
+            WHERE {key_match} AND trials.sheet_hash IS NULL
+        """)
+        inserted = importer.merge_staged(cursor, columns)
+        cursor.execute("DROP TABLE IF EXISTS temp.import_staging")
+
+    return inserted, updated, unkeyed
+
+
+def import_data(source=CSV_URL, db_name=DB_NAME, full=False):
+    print("Downloading data from Google Sheet..." if source == CSV_URL else f"Reading {source}...")
     try:
-        df_db.to_sql('trials', conn, if_exists='append', index=False)
-        print("Data imported successfully.")
+        content = fetch_sheet(source)
     except Exception as e:
-        print(f"Error inserting data: {e}")
+        print(f"Error downloading data: {e}")
+        return
 
-    conn.commit()
-    
-    # Verify
-    cursor.execute("SELECT COUNT(*) FROM trials")
-    count = cursor.fetchone()[0]
-    print(f"Total rows in database: {count}")
-    
-    conn.close()
+    content_hash = hashlib.sha1(content).hexdigest()
 
-if __name__ == "__main__":
-    import_data()
+    # Connect to SQLite
+    conn = db.connect(db_name)
+    schema.migrate(conn)
+    if not schema.phone_date_index_unique(conn):
+        print(f"Warning: {len(schema.duplicate_phone_dates(conn))} (phone, trial_date) keys are stored more than once.")
 
+    # Sync watermark: an unchanged sheet is a no-op
+    state = conn.execute(
+        "SELECT content_hash, synced_at FROM sync_state WHERE source = ?", (source,)
+    ).fetchone()
+    if not full and state and state[0] == content_hash:
+        print(f"Sheet unchanged since {state[1]}. Nothing to do.")
+        conn.close()
+        return
 
+    df = parse_sheet(content)
+    print(f"Downloaded {len(df)} rows.")
+    print("Columns found:", df.columns.tolist())
 
+    df_db = to_db_frame(df)
+    print(f"Rows in sheet: {len(df_db)}")
 
+    if full:
+        inserted, unkeyed = full_import(conn, df_db)
+        updated = 0
+        print(f"Inserted: {inserted}")
+    else:
+        inserted, updated, unkeyed = sync_rows(conn, df_db)
+        print(f"Inserted: {inserted}, updated: {updated}, unchanged: {len(df_db) - unkeyed - inserted - updated}")
+    if unkeyed:
+        print(f"Skipped {unkeyed} rows without phone/date (cannot be matched).")
 
+    with db.write_transaction(conn):
+        conn.execute("""
+            INSERT INTO sync_state (source, content_hash, synced_at, rows_seen, inserted, updated)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(source) DO UPDATE SET
+                content_hash = excluded.content_hash, synced_at = excluded.synced_at,
+                rows_seen = excluded.rows_seen, inserted = excluded.inserted, updated = excluded.updated
+        """, (source, content_hash, datetime.now().isoformat(timespec='seconds'), len(df_db), inserted, updated))
 
+    # Verify
+    count = conn.execute("SELECT COUNT(*) FROM trials").fetchone()[0]
+    print(f"Total rows in database: {count}")
+
+    conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync trials from the Google Sheet into SQLite.")
+    parser.add_argument("--source", default=CSV_URL, help="CSV URL or local CSV file (default: the Google Sheet)")
+    parser.add_argument("--db", default=DB_NAME, help="SQLite file (default: trialhub.db)")
+    parser.add_argument("--full", action="store_true", help="Replace every trial with the sheet (wipes app edits)")
+    args = parser.parse_args()
+    import_data(args.source, args.db, args.full)
@@ -1,35 +1,14 @@
 import streamlit as st
 import sqlite3
+import os
 import pandas as pd
-import io
-from datetime import datetime, timedelta
-import pytz
+from datetime import datetime
 
-# --- Global Timezone ---
-vn_tz = pytz.timezone('Asia/Ho_Chi_Minh')
-now_vn = datetime.now(vn_tz)
-# Get local date as naive datetime for comparison
-today_vn = now_vn.replace(hour=0, minute=0, second=0, microsecond=0).replace(tzinfo=None)
-current_dt_naive = now_vn.replace(tzinfo=None)
+from trialhub import backup, changeset, cleaning, db, export, importer, jobs, profiling, reminders, repository, schema, styling
+from trialhub.trial_time import now_vn
 
-def parse_trial_datetime(date_str, time_str):
-    try:
-        # Parse date
-        d = datetime.strptime(str(date_str), "%d/%m/%Y")
-        # Parse time
-        t_str = str(time_str).lower().replace('h', ':').replace('g', ':').strip()
-        if ':' not in t_str:
-            if t_str.isdigit():
-                t_str += ":00"
-            else:
-                return d # Date only
-        
-        parts = t_str.split(':')
-        h = int(parts[0])
-        m = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 0
-        return d.replace(hour=h, minute=m)
-    except:
-        return None
+# --- Current VN time, read once per rerun (naive wall clock) ---
+current_dt_naive = now_vn()
 
 # --- Page Config ---
 st.set_page_config(
@@ -39,6 +18,13 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# --- Profiling (panel for admins, opened with ?admin=<TRIALHUB_ADMIN_TOKEN>) ---
+is_admin = profiling.is_admin(st.query_params.get("admin", ""))
+rerun_profile = profiling.start_run(
+    'rerun', capture=is_admin and st.session_state.get("profile_capture", False),
+    tab=st.session_state.get("active_tab")
+)
+
 # --- Custom CSS ---
 st.markdown("""
 <style>
@@ -137,346 +123,173 @@ st.markdown("""
 
 def import_trials_from_file(uploaded_file):
     """
-    Reads file, detects header, and allows external mapping.
+    Reads file once, detects header, and allows external mapping.
     Returns: df_raw (with correct header), error_message
     """
     try:
-        # Read file without header first to find the correct row
-        if uploaded_file.name.endswith('.csv'):
-            df_raw = pd.read_csv(uploaded_file, header=None, nrows=20)
-        else:
-            df_raw = pd.read_excel(uploaded_file, header=None, nrows=20)
-            
-        # Detect header row index
-        header_idx = 0
-        found = False
-        for i, row in df_raw.iterrows():
-            row_str = row.astype(str).str.lower().tolist()
-            # Strict keywords for header detection
-            # 'stt' or 'no.' AND 'phone' or 'sđt'
-            has_stt = any(x == str(s).strip().lower() or "số thứ tự" in str(s).lower() or "no." in str(s).lower() for s in row_str for x in ["stt"])
-            has_phone = any("phone" in str(s).lower() or "sđt" in str(s).lower() or "số điện thoại" in str(s).lower() for s in row_str)
-            
-            if has_stt and has_phone:
-                header_idx = i
-                found = True
-                break
-        
-        # Reload with correct header
-        if uploaded_file.name.endswith('.csv'):
-            uploaded_file.seek(0)
-            df_import = pd.read_csv(uploaded_file, header=header_idx)
-        else:
-            uploaded_file.seek(0)
-            df_import = pd.read_excel(uploaded_file, header=header_idx, dtype=str) # Read all as string first to preserve "09..." phone
-            
-        # Deduplicate columns
-        new_cols = []
-        col_counts = {}
-        for col in df_import.columns:
-            c = str(col).strip()
-            if c in col_counts:
-                col_counts[c] += 1
-                new_cols.append(f"{c}.{col_counts[c]}")
-            else:
-                col_counts[c] = 0
-                new_cols.append(c)
-        df_import.columns = new_cols
-        
+        if importer.is_large(uploaded_file):
+            # Only the first rows are read here; the import streams the whole file
+            st.info(f"📦 File lớn ({uploaded_file.size / 1024 / 1024:.0f} MB): xem trước {importer.PREVIEW_ROWS} dòng đầu, import sẽ xử lý theo từng phần.")
+            return importer.read_upload_head(uploaded_file), None
+        with profiling.timer('import.read'):
+            df_import, timings = importer.read_upload(uploaded_file)
+        st.caption("⏱️ " + " · ".join(f"{k}: {v * 1000:.0f} ms" for k, v in timings.items()))
         return df_import, None
 
     except Exception as e:
         return None, str(e)
 
-def identify_column_mapping(columns):
-    """
-    Auto-detects mapping based on keywords.
-    Returns: dict {db_col: file_col}
-    """
-    col_map = {}
-    
-    # Priority Keywords (Exact match preferred)
-    keywords = {
-        'stt': ['stt', 'số thứ tự', 'no.'],
-        'trial_date': ['ngày trial', 'ngày', 'date', 'day'],
-        'time': ['thời gian', 'time', 'giờ'],
-        'meet_link': ['link trial', 'meet link', 'link', 'meet', 'zoom', 'url'],
-        'subject': ['môn học', 'môn', 'subject', 'lớp', 'class'],
-        'phone': ['số điện thoại', 'sđt', 'phone', 'tel', 'mobile', 'hotline'],
-        'status': ['tình trạng', 'status', 'trạng thái', 'kết quả'],
-        'note': ['ghi chú', 'note', 'nhận xét', 'comment', 'lý do'],
-        'evaluator': ['phụ trách đánh giá', 'phụ trách', 'người đánh giá', 'evaluator', 'gv', 'giáo viên', 'đánh giá'],
-        'creator': ['người tạo', 'tvv', 'creator', 'nguoi tao', 'sale', 'tư vấn viên']
-    }
-    
-    # Helper to check match
-    def get_match(targets):
-        # 1. Exact match
-        for col in columns:
-            c_lower = str(col).lower().strip()
-            if c_lower in targets:
-                return col
-        # 2. Contains match
-        for col in columns:
-             c_lower = str(col).lower().strip()
-             if any(t in c_lower for t in targets):
-                 return col
-        return None
-
-    for db_col, kw_list in keywords.items():
-        match = get_match(kw_list)
-        if match:
-             col_map[db_col] = match
-             
-    return col_map
 # --- Database Functions ---
-@st.cache_resource
 def get_connection():
-    return sqlite3.connect("trialhub.db", check_same_thread=False)
+    # Pooled WAL-mode connection held by this rerun's thread (see db.py)
+    return db.get_connection("trialhub.db")
 
+@st.cache_resource
 def init_db():
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS trials (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                stt TEXT,
-                trial_date TEXT,
-                time TEXT,
-                meet_link TEXT,
-                subject TEXT,
-                phone TEXT,
-                status TEXT,
-                note TEXT,
-                evaluator TEXT,
-                creator TEXT
-            )
-        """)
-        conn.commit()
-    except Exception as e:
-        st.error(f"DB Init Error: {e}")
-
-# Initialize DB on load
-init_db()
+    """Once per process: creates/migrates the schema and starts the background workers."""
+    # Creates the table and applies pending migrations (time columns, indexes...)
+    conn = get_connection()
+    schema.migrate(conn)
+    # (phone, trial_date) index left non-unique by legacy duplicates: retried once they are merged
+    if not schema.phone_date_index_unique(conn):
+        with db.write_transaction(conn):
+            schema.ensure_phone_date_index(conn)
+    # Worker pool for imports/exports
+    jobs.start()
+    # Reminders before upcoming trials (config: TRIALHUB_REMINDER_LEADS / _WEBHOOK)
+    reminders.start(db.DB_PATH)
+
+try:
+    init_db()
+except Exception as e:
+    st.error(f"DB Init Error: {e}")
 conn = get_connection()
 
-# Use cache_data for performance, invalidate when data changes
-@st.cache_data(ttl=60) 
-def load_data():
-    try:
-        query = "SELECT * FROM trials ORDER BY id DESC"
-        df = pd.read_sql(query, conn)
-        return df
-    except Exception as e:
-        # If table is missing despite init (weird), allow failing gracefully
-        st.error(f"Error loading data: {e}. Attempting to recreate table...")
-        init_db()
-        return pd.DataFrame(columns=['id', 'stt', 'trial_date', 'status', 'subject', 'phone', 'note'])
-
-def clear_cache():
-    load_data.clear()
-
-def identify_column_mapping(columns):
+# Cached reads are keyed on the DB write counter: a write from any session
+# (or import_data.py) makes every reader re-query on its next rerun, and
+# nothing is re-queried while the data is unchanged.
+# Each view asks only for the rows (filters) and columns it needs.
+def data_version():
+    return repository.data_version(conn)
+
+@st.cache_data(max_entries=128, show_spinner=False)
+def _load_count(filters, version):
+    return repository.count_trials(conn, filters)
+
+@profiling.timed()
+def load_count(filters=None):
+    return _load_count(filters, data_version())
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _load_dashboard(today, version):
+    return repository.dashboard_stats(conn, today)
+
+@profiling.timed()
+def load_dashboard(today):
+    return _load_dashboard(today, data_version())
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _load_page(filters, before_id, page_size, version):
+    return repository.fetch_page(conn, filters, repository.LIST_COLUMNS, before_id, page_size)
+
+@profiling.timed()
+def load_page(filters, before_id, page_size):
+    return _load_page(filters, before_id, page_size, data_version())
+
+@st.fragment(run_every=1.0)
+def job_progress(job_id):
+    """Live progress of a background job; reruns the page once it finishes."""
+    # Fragment reruns run on their own thread: use that thread's connection
+    job = jobs.get(get_connection(), job_id)
+    if not jobs.is_active(job):
+        st.rerun()
+    rows = f" ({job['rows_done']}/{job['rows_total']} dòng)" if job['rows_total'] else ""
+    st.progress(job['progress'], text=f"{job['message'] or 'Đang chờ...'}{rows}")
+
+def pending_changes():
+    """Unsaved list edits of all editor instances: (edited {id: {col: val}}, deleted [id], added [row])."""
+    edited, deleted, added = {}, [], []
+    for change in st.session_state.get("list_changes", {}).values():
+        for row_id, cols in change['edited'].items():
+            edited.setdefault(row_id, {}).update(cols)
+        deleted.extend(change['deleted'])
+        added.extend(change['added'])
+    return edited, deleted, added
+
+def reset_list_changes():
+    for key in ("list_changes", "list_versions", "list_editor"):
+        st.session_state.pop(key, None)
+
+def collect_edits(key, frame):
     """
-    Auto-detects mapping based on keywords.
-    Returns: dict {db_col: file_col}
+    data_editor on_change: maps the editor's positional edited/deleted rows to
+    ids of `frame` and records the version each touched row was loaded with.
+    The editor state is cumulative, so this instance's entry is replaced.
     """
-    col_map = {}
-    
-    # Priority Keywords (Exact match preferred)
-    keywords = {
-        'stt': ['stt', 'số thứ tự', 'no.'],
-        'trial_date': ['ngày trial', 'ngày', 'date', 'day'],
-        'time': ['thời gian', 'time', 'giờ'],
-        'meet_link': ['link trial', 'meet link', 'link', 'meet', 'zoom', 'url'],
-        'subject': ['môn học', 'môn', 'subject', 'lớp', 'class'],
-        'phone': ['số điện thoại', 'sđt', 'phone', 'tel', 'mobile', 'hotline'],
-        'status': ['tình trạng', 'status', 'trạng thái', 'kết quả'],
-        'note': ['ghi chú', 'note', 'nhận xét', 'comment', 'lý do'],
-        'evaluator': ['phụ trách đánh giá', 'phụ trách', 'người đánh giá', 'evaluator', 'gv', 'giáo viên', 'đánh giá'],
-        'creator': ['người tạo', 'tvv', 'creator', 'nguoi tao', 'sale', 'tư vấn viên']
-    }
+    state = st.session_state.get(key, {})
+    ids = frame.index.tolist()
+    edited = {}
+    for pos, cols in state.get("edited_rows", {}).items():
+        pos = int(pos)
+        if pos < len(ids) and cols:
+            edited[ids[pos]] = cols
+    deleted = [ids[pos] for pos in state.get("deleted_rows", []) if pos < len(ids)]
+    added = [{c: v for c, v in row.items() if c != '_index'} for row in state.get("added_rows", [])]
     
-    # Helper to check match
-    def get_match(targets):
-        # 1. Exact match
-        for col in columns:
-            c_lower = str(col).lower().strip()
-            if c_lower in targets:
-                return col
-        # 2. Contains match
-        for col in columns:
-             c_lower = str(col).lower().strip()
-             if any(t in c_lower for t in targets):
-                 return col
-        return None
+    st.session_state.setdefault("list_changes", {})[key] = {'edited': edited, 'deleted': deleted, 'added': added}
+    versions = st.session_state.setdefault("list_versions", {})
+    for row_id in list(edited) + deleted:
+        versions.setdefault(row_id, int(frame.at[row_id, 'version']))
 
-    for db_col, kw_list in keywords.items():
-        match = get_match(kw_list)
-        if match:
-             col_map[db_col] = match
-             
-    return col_map
-
-# --- Database Functions ---
-@st.cache_resource
-def get_connection():
-    return sqlite3.connect("trialhub.db", check_same_thread=False)
-
-def init_db():
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS trials (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                stt TEXT,
-                trial_date TEXT,
-                time TEXT,
-                meet_link TEXT,
-                subject TEXT,
-                phone TEXT,
-                status TEXT,
-                note TEXT,
-                evaluator TEXT,
-                creator TEXT
-            )
-        """)
-        conn.commit()
-    except Exception as e:
-        st.error(f"DB Init Error: {e}")
-
-# Initialize DB on load
-init_db()
-conn = get_connection()
-
-# Use cache_data for performance, invalidate when data changes
-@st.cache_data(ttl=60) 
-def load_data():
-    try:
-        query = "SELECT * FROM trials ORDER BY id DESC"
-        df = pd.read_sql(query, conn)
-        return df
-    except Exception as e:
-        # If table is missing despite init (weird), allow failing gracefully
-        st.error(f"Error loading data: {e}. Attempting to recreate table...")
-        init_db()
-        return pd.DataFrame(columns=['id', 'stt', 'trial_date', 'status', 'subject', 'phone', 'note'])
-
-def clear_cache():
-    load_data.clear()
-
-def save_batch_changes(edited_rows, original_df):
+def save_batch_changes(edited_rows, added_rows=None, deleted_ids=None):
     """
-    Saves changes from st.data_editor's session state (edited_rows) to SQLite.
-    edited_rows is a dict: {row_index: {col_name: new_value, ...}}
-    Note: row_index corresponds to the index of the DataFrame passed to data_editor.
-    If filter is applied, we must ensure we map back to the correct DB ID.
-    We set existing dataframe index to 'id' before passing to editor to make this easy.
+    Saves pending list changes to SQLite in one transaction (changeset.py).
+    edited_rows is a dict: {id: {col_name: new_value, ...}} (see collect_edits).
+    Rows changed by someone else since they were loaded are skipped and
+    returned in result['conflicts']. Returns the result dict, None on error.
     """
     try:
-        cursor = conn.cursor()
-        count = 0
-        for row_id, changes in edited_rows.items():
-            # row_id is the primary key 'id' because we set df.index = id
-            updates = []
-            params = []
-            for col, val in changes.items():
-                updates.append(f"{col} = ?")
-                params.append(val)
-            
-            if updates:
-                params.append(row_id)
-                sql = f"UPDATE trials SET {', '.join(updates)} WHERE id = ?"
-                cursor.execute(sql, params)
-                count += 1
-                
-        conn.commit()
-        clear_cache() # Clear cache to refresh data next load
-        return count
+        result = changeset.apply_changes(
+            conn, edited_rows, added_rows, deleted_ids,
+            versions=st.session_state.get("list_versions", {})
+        )
+        result['total'] = result['updated'] + result['inserted'] + result['deleted']
+        return result
+    except sqlite3.IntegrityError:
+        st.error("Trùng lịch: SĐT này đã có trial vào ngày này.")
+        return None
     except Exception as e:
         st.error(f"Lỗi save batch: {e}")
-        return 0
+        return None
 
-def update_single_row(row_id, data):
+def update_single_row(row_id, data, version=None):
+    """Saves the edit form; refuses if the row changed since `version` was read."""
     try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE trials SET 
-            trial_date=?, time=?, meet_link=?, subject=?, phone=?, 
-            status=?, note=?, evaluator=?, creator=?
-            WHERE id=?
-        """, (
-            data['trial_date'], data['time'], data['meet_link'], 
-            data['subject'], data['phone'], data['status'], 
-            data['note'], data['evaluator'], data['creator'], 
-            row_id
-        ))
-        conn.commit()
-        clear_cache()
+        result = changeset.apply_changes(
+            conn, {row_id: data}, versions={row_id: version} if version is not None else None
+        )
+        if result['conflicts']:
+            st.warning("Trial này vừa được người khác sửa/xóa. Vui lòng tải lại và thử lại.")
+            return False
         return True
+    except sqlite3.IntegrityError:
+        st.error("Trùng lịch: SĐT này đã có trial vào ngày này.")
+        return False
     except Exception as e:
         st.error(f"Lỗi update row: {e}")
         return False
 
 def add_trial(data):
     try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO trials (stt, trial_date, time, meet_link, subject, phone, status, note, evaluator, creator)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            data.get('stt'), data.get('trial_date'), data.get('time'), 
-            data.get('meet_link'), data.get('subject'), data.get('phone'), 
-            data.get('status'), data.get('note'), data.get('evaluator'), 
-            data.get('creator')
-        ))
-        conn.commit()
-        clear_cache()
+        changeset.apply_changes(conn, added=[data])
         return True
+    except sqlite3.IntegrityError:
+        st.error("Trùng lịch: SĐT này đã có trial vào ngày này.")
+        return False
     except Exception as e:
         st.error(f"Error adding trial: {e}")
         return False
 
-# --- Styling Logic (Global) ---
-def highlight_rows(row):
-    status = str(row['status']).lower()
-    
-    # Colors
-    COLOR_RED = 'background-color: #fecaca' # Fail
-    COLOR_GREEN = 'background-color: #d1fae5' # Done
-    COLOR_GRAY = 'background-color: #f3f4f6; color: #9ca3af' # Cancel
-    COLOR_ORANGE = 'background-color: #ffedd5' # Urgent
-    
-    if 'gãy' in status or 'gáy' in status:
-        return [COLOR_RED] * len(row)
-    if 'hủy' in status:
-        return [COLOR_GRAY] * len(row)
-    if 'đã trial' in status or 'thích' in status or 'done' in status:
-        return [COLOR_GREEN] * len(row)
-    
-    # Urgent: Today or < 2 hours
-    try:
-        dt = parse_trial_datetime(row['trial_date'], row['time'])
-        if dt:
-            # Check if today
-            if dt.date() == today_vn.date():
-                return [COLOR_ORANGE] * len(row)
-            
-            # Check < 2 hours from now
-            diff = dt - current_dt_naive
-            if timedelta(hours=0) <= diff <= timedelta(hours=2):
-                return [COLOR_ORANGE] * len(row)
-    except:
-        pass
-        
-    return [''] * len(row)
-
-# --- Data Loading (Global) ---
-df = load_data()
-df_export = df.copy() # Prepare export/filtering base
-
 # --- Sidebar ---
 with st.sidebar:
     st.markdown("<h2 style='color: white; text-align: center;'>MindX TrialHub 🚀</h2>", unsafe_allow_html=True)
@@ -496,7 +309,6 @@ with st.sidebar:
     with st.expander("🔍 Bộ lọc danh sách", expanded=True):
         # Refresh Button
         if st.button("🔄 Refresh dữ liệu", use_container_width=True):
-            clear_cache()
             st.toast("Đã reload dữ liệu mới nhất!", icon="✅")
             st.rerun()
             
@@ -511,6 +323,14 @@ with st.sidebar:
         filter_status = st.multiselect("yw Trạng thái", all_statuses)
         filter_evaluator = st.text_input("👨‍🏫 Người đánh giá")
 
+    # Sidebar filters -> SQL filter spec (shared by export + list tab)
+    sidebar_filters = repository.make_filters(
+        date_range=filter_date,
+        subjects=filter_subject,
+        statuses=filter_status,
+        evaluator=filter_evaluator,
+    )
+
     st.markdown("---")
 
     # --- 2. Import Excel/CSV ---
@@ -527,7 +347,7 @@ with st.sidebar:
                 st.info("💡 Hệ thống tự động nhận diện cột. Vui lòng kiểm tra và sửa nếu cần:")
                 
                 # Detected
-                auto_map = identify_column_mapping(df_raw.columns)
+                auto_map = importer.identify_column_mapping(df_raw.columns)
                 
                 # UI for mapping
                 cols = st.columns(4)
@@ -563,90 +383,26 @@ with st.sidebar:
                 st.markdown("---")
                 
                 if st.button("👁️ Xem trước & Xử lý số liệu"):
-                    # Apply Mapping
-                    df_preview = df_raw.copy()
-                    rename_map = {v: k for k, v in mappings.items()}
-                    df_preview = df_preview.rename(columns=rename_map)
-                    
-                    # --- ABSOLUTE FINAL CLEANING LOGIC ---
-                    # Tracker for auto-filled cells (only Date now)
-                    df_preview['_ffilled_cells'] = [[] for _ in range(len(df_preview))]
-
-                    # 1. CREATOR & EVALUATOR: NO FFILL, CLEAN JUNK ONLY
-                    junk_list = ["TIỀN", "TIEN", "CHƯA GỬI ZALO", "CHUA GUI ZALO", "CHƯA GỬI", "CHUA GUI"]
-                    import re
-                    junk_pattern = '|'.join(map(re.escape, junk_list))
-
-                    for col in ['creator', 'evaluator']:
-                        if col in df_preview.columns:
-                            # a) Convert to string & cleanup standard NA
-                            s = df_preview[col].astype(str).replace(['nan', 'NaN', 'None', '<NA>'], '')
-                            # b) Remove JUNK using regex (Case Insensitive)
-                            s = s.str.replace(junk_pattern, '', regex=True, flags=re.IGNORECASE).str.strip()
-                            # c) Assign back (Faithful representation: Empty stays Empty)
-                            df_preview[col] = s
-
-                    # 2. TRIAL DATE: SAFE FFILL (Merged)
-                    if 'trial_date' in df_preview.columns:
-                        # Convert to string and clean
-                        df_preview['trial_date'] = df_preview['trial_date'].astype(str).replace(['nan', 'NaN', 'None', ''], pd.NA)
-                        
-                        # Monitor for highlighting
-                        empty_mask_d = df_preview['trial_date'].isna()
-                        
-                        # Ffill
-                        df_preview['trial_date'] = df_preview['trial_date'].ffill()
-                        
-                        # Track
-                        filled_mask_d = empty_mask_d & df_preview['trial_date'].notna()
-                        if filled_mask_d.any():
-                             df_preview.loc[filled_mask_d, '_ffilled_cells'] = df_preview.loc[filled_mask_d, '_ffilled_cells'].apply(lambda x: x + ['trial_date'])
-                        
-                        # Restore string
-                        df_preview['trial_date'] = df_preview['trial_date'].fillna('')
-                        
-                        # Parse
-                        df_preview['trial_date'] = pd.to_datetime(df_preview['trial_date'], dayfirst=True, errors='coerce').dt.strftime("%d/%m/%Y").fillna('')
-
-                    # 3. OTHER TEXT COLS: CLEAN ONLY
-                    for c in ['note', 'subject', 'status', 'meet_link']:
-                        if c in df_preview.columns:
-                            df_preview[c] = df_preview[c].astype(str).replace(['nan', 'NaN', 'None', '<NA>'], '').str.strip()
-
-                    # 4. PHONE: REQUIRED
-                    if 'phone' in df_preview.columns:
-                         df_preview = df_preview[df_preview['phone'].astype(str).str.strip() != '']
-                    
-                    # 5. TIME: CLEAN
-                    if 'time' in df_preview.columns:
-                        def clean_time(val):
-                            s = str(val).lower().strip()
-                            if s in ['nan', 'none', '']: return ''
-                            s = s.replace('h', ':').replace('g', ':').replace('.', ':')
-                            if len(s) <= 2 and s.isdigit(): return f"{int(s):02d}:00"
-                            return s
-                        df_preview['time'] = df_preview['time'].apply(clean_time)
-                        
-                    st.session_state['df_import_ready'] = df_preview
+                    with profiling.timer('import.clean'):
+                        df_preview, filled, timings = cleaning.clean(df_raw, mappings)
+                    st.session_state['df_import_ready'] = (df_preview, filled, timings)
 
                 # --- PREVIEW UI ---
                 if 'df_import_ready' in st.session_state:
-                    df_ready = st.session_state['df_import_ready']
+                    df_ready, filled, timings = st.session_state['df_import_ready']
                     st.caption(f"Kết quả xử lý ({len(df_ready)} dòng):")
+                    st.caption("⏱️ " + " · ".join(f"{k}: {v * 1000:.0f} ms" for k, v in timings.items()))
                     
-                    def highlight(row):
-                        styles = [''] * len(row)
-                        filled = row.get('_ffilled_cells', [])
-                        for col in filled:
-                            if col in row.index:
-                                idx = row.index.get_loc(col)
-                                styles[idx] = 'background-color: #fef9c3; color: #854d0e;'
-                        return styles
+                    # Auto-filled cells (mask frame) highlighted in one pass
+                    def highlight(frame):
+                        css = pd.DataFrame('', index=frame.index, columns=frame.columns)
+                        for col in filled.columns.intersection(frame.columns):
+                            css.loc[filled[col], col] = 'background-color: #fef9c3; color: #854d0e;'
+                        return css
                     
                     st.dataframe(
-                        df_ready.style.apply(highlight, axis=1),
+                        df_ready.style.apply(highlight, axis=None),
                         column_config={
-                            '_ffilled_cells': None,
                             'note': st.column_config.TextColumn("Ghi chú", width="medium"),
                             'creator': st.column_config.TextColumn("Người tạo", width="small"),
                             'evaluator': st.column_config.TextColumn("Người đánh giá", width="small"),
@@ -656,127 +412,125 @@ with st.sidebar:
                     )
                     
                     if st.button("🚀 Thực hiện Import", type="primary"):
-                        try:
-                            cursor = conn.cursor()
-                            count = 0
-                            skipped = 0
-                            
-                            for _, row in df_ready.iterrows():
-                                phone = str(row.get('phone', '')).strip()
-                                t_date = row.get('trial_date', '')
-                                
-                                if not phone or not t_date:
-                                    skipped += 1
-                                    continue
-                                
-                                cursor.execute("SELECT id FROM trials WHERE phone=? AND trial_date=?", (phone, t_date))
-                                if cursor.fetchone(): 
-                                    skipped += 1
-                                    continue
-                                
-                                # Creator: Pure data from sheet (No fallback to Admin)
-                                creator = row.get('creator', '')
-                                
-                                cursor.execute("""
-                                    INSERT INTO trials (stt, trial_date, time, meet_link, subject, phone, status, note, evaluator, creator)
-                                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                                """, (
-                                    row.get('stt', ''), t_date, row.get('time', ''), 
-                                    row.get('meet_link', ''), row.get('subject', ''), 
-                                    phone, row.get('status', 'Chờ trial'), 
-                                    row.get('note', ''), row.get('evaluator', ''), creator
-                                ))
-                                count += 1
-                            
-                            conn.commit()
-                            clear_cache()
-                            st.success(f"✅ Đã import {count} dòng. Dữ liệu Người tạo/Đánh giá được giữ nguyên từ sheet (đã dọn rác 'TIỀN/CHƯA GỬI').")
-                            if skipped: st.warning(f"⚠️ Bỏ qua {skipped} dòng trùng hoặc thiếu ngày/sđt.")
-                            st.balloons()
-                            del st.session_state['df_import_ready']
-                            import time
-                            time.sleep(1.5)
-                            st.rerun()
-                            
-                        except Exception as e:
-                            st.error(f"Lỗi database: {e}")
+                        # Clean + insert run in the background. Same file + mapping = same job:
+                        # joined while it runs, run again once finished (the DB may have changed)
+                        if importer.is_large(uploaded_file):
+                            data = uploaded_file.getvalue()
+                            st.session_state['import_job'] = jobs.submit(
+                                'import', importer.stream_key(data, mappings),
+                                importer.run_streaming_import, data, uploaded_file.name, mappings,
+                                label=uploaded_file.name, force=True
+                            )
+                        else:
+                            st.session_state['import_job'] = jobs.submit(
+                                'import', importer.upload_key(df_raw, mappings),
+                                importer.run_import, df_raw, mappings,
+                                label=uploaded_file.name, force=True
+                            )
+                        del st.session_state['df_import_ready']
+                        st.rerun()
+        
+        # Progress / result of the last import (survives reruns)
+        import_job = jobs.get(conn, st.session_state['import_job']) if 'import_job' in st.session_state else None
+        if jobs.is_active(import_job):
+            job_progress(import_job['id'])
+        elif import_job and import_job['status'] == 'done':
+            result = import_job['result']
+            st.success(f"✅ Đã import {result['inserted']} dòng. Dữ liệu Người tạo/Đánh giá được giữ nguyên từ sheet (đã dọn rác 'TIỀN/CHƯA GỬI').")
+            if result['skipped']: st.warning(f"⚠️ Bỏ qua {result['skipped']} dòng trùng hoặc thiếu ngày/sđt.")
+            if not st.session_state.get('import_celebrated') == import_job['id']:
+                st.session_state['import_celebrated'] = import_job['id']
+                st.balloons()
+        elif import_job and import_job['status'] == 'failed':
+            st.error(f"Lỗi database: {import_job['message']}")
 
     st.markdown("---")
 
     # --- 3. Export & Backup ---
     with st.expander("💾 Export & Backup", expanded=False):
-        # Filter Logic for Export
-        df_export = df.copy()
+        # Filter Logic for Export (done in SQL)
+        # Search term lives in the list tab, reuse its last value from session state
+        search_term_global = st.session_state.get("search_box_tab2", "")
+        export_filters = {**sidebar_filters, **repository.make_filters(search=search_term_global)}
+        export_count = load_count(export_filters)
         
-        if not df_export.empty:
-            # Apply Sidebar Filters
-            if len(filter_date) == 2:
-                start_date, end_date = filter_date
-                df_export['date_temp'] = pd.to_datetime(df_export['trial_date'], format='%d/%m/%Y', errors='coerce').dt.date
-                df_export = df_export[(df_export['date_temp'] >= start_date) & (df_export['date_temp'] <= end_date)]
-                df_export = df_export.drop(columns=['date_temp'])
-                
-            if filter_subject:
-                mask_sub = df_export['subject'].apply(lambda x: any(s.lower() in str(x).lower() for s in filter_subject))
-                df_export = df_export[mask_sub]
-                
-            if filter_status:
-                mask_stat = df_export['status'].apply(lambda x: any(s.lower() in str(x).lower() for s in filter_status))
-                df_export = df_export[mask_stat]
-                
-            if filter_evaluator:
-                df_export = df_export[df_export['evaluator'].str.contains(filter_evaluator, case=False, na=False)]
-                
-            # Apply Search Term (from session state if available, or just skip for export if not critical)
-            # Note: Search term is in main content, so it might not be updated here yet if user just typed it.
-            # But usually export is done after viewing.
-            search_term_global = st.session_state.get("search_term", "")
-            if search_term_global:
-                mask = df_export.apply(lambda x: x.astype(str).str.contains(search_term_global, case=False).any(), axis=1)
-                df_export = df_export[mask]
-
-            # 1. Export Excel
-            buffer = io.BytesIO()
-            try:
-                # Apply style
-                df_export.style.apply(highlight_rows, axis=1).to_excel(buffer, engine='openpyxl', index=False)
-            except:
-                # Fallback
-                df_export.to_excel(buffer, engine='openpyxl', index=False)
-                
-            buffer.seek(0)
-            st.download_button(
-                label="📥 Export Excel (Filtered)",
-                data=buffer,
-                file_name=f"trialhub_export_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
+        if export_count > 0:
+            # 1. Export Excel - only built on request, cached per filters + data version
+            export_key = (repr(sorted(export_filters.items())), data_version())
+
+            def submit_export(force=False):
+                # Urgent coloring depends on the clock, reuse a file for at most 15 minutes
+                # (a file deleted since is built again)
+                now_bucket = current_dt_naive.replace(minute=current_dt_naive.minute // 15 * 15, second=0, microsecond=0)
+                job_key = repr((export_key, now_bucket))
+                with profiling.timer('export.submit'):
+                    st.session_state['export_job'] = (export_key, jobs.submit(
+                        'export', job_key, export.run_export,
+                        export_filters, now_bucket, jobs.output_path(jobs.job_id('export', job_key), ".xlsx"),
+                        label=f"{export_count} dòng", force=force
+                    ))
+                jobs.prune(conn, 'export')
+
+            if st.button(f"⚙️ Tạo file Excel ({export_count} dòng)", use_container_width=True):
+                submit_export()
+            
+            export_job = st.session_state.get('export_job')
+            job = jobs.get(conn, export_job[1]) if export_job else None
+            if job and export_job[0] != export_key:
+                st.caption("Bộ lọc hoặc dữ liệu đã thay đổi, hãy tạo lại file Excel.")
+            elif jobs.is_active(job):
+                job_progress(job['id'])
+            elif job and job['status'] == 'done':
+                if os.path.exists(job['result']['path']):
+                    with open(job['result']['path'], "rb") as f:
+                        st.download_button(
+                            label="📥 Export Excel (Filtered)",
+                            data=f,
+                            file_name=f"trialhub_export_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx",
+                            mime=export.XLSX_MIME
+                        )
+                else:
+                    st.caption("File Excel này đã bị dọn khỏi server.")
+                if st.button("🔁 Tạo lại file Excel", use_container_width=True):
+                    submit_export(force=True)
+                    st.rerun()
+            elif job and job['status'] == 'failed':
+                st.error(f"Lỗi export: {job['message']}")
         else:
             st.warning("Không có dữ liệu để export.")
 
-        # 2. Backup DB
-        try:
-            with open("trialhub.db", "rb") as f:
-                db_bytes = f.read()
-            st.download_button(
-                label="📦 Tải backup DB",
-                data=db_bytes,
-                file_name=f"trialhub_backup_{datetime.now().strftime('%Y%m%d')}.db",
-                mime="application/x-sqlite3"
+        # 2. Backup DB - consistent snapshot on disk, only read when downloading
+        st.markdown("---")
+        compress_backup = st.checkbox("Nén backup (.gz)", value=True)
+        if st.button("🗄️ Tạo bản backup DB", use_container_width=True):
+            try:
+                with st.spinner("Đang tạo backup..."):
+                    snapshot_path = backup.create_snapshot(conn, compress=compress_backup)
+                st.session_state['backup_ready'] = snapshot_path
+            except Exception as e:
+                st.error(f"Lỗi backup DB: {e}")
+        
+        snapshots = backup.list_snapshots()
+        if snapshots:
+            snapshot_names = [s['name'] for s in snapshots]
+            picked = st.selectbox(
+                "Bản backup gần đây",
+                snapshot_names,
+                format_func=lambda n: next(f"{s['created']:%d/%m %H:%M} – {s['size'] / 1024:.0f} KB" for s in snapshots if s['name'] == n)
             )
-        except Exception as e:
-            st.error(f"Lỗi đọc DB: {e}")
-
-# --- RE-WRITING THE LOGIC FLOW FOR REPLACEMENT ---
-# The replacement chunk covers lines 174 to 268 (Sidebar + old Data Loading).
-# I will replace it with:
-# 1. Data Loading (moved up)
-# 2. Sidebar UI (Filters)
-# 3. Filter Application
-# 4. Sidebar UI (Import)
-# 5. Sidebar UI (Export)
-
-    # ... (See actual replacement content)
+            if st.button("📂 Chuẩn bị tải bản này", use_container_width=True):
+                st.session_state['backup_ready'] = snapshots[snapshot_names.index(picked)]['path']
+        
+        backup_ready = st.session_state.get('backup_ready')
+        if backup_ready and os.path.exists(backup_ready):
+            with open(backup_ready, "rb") as f:
+                st.download_button(
+                    label="📦 Tải backup DB",
+                    data=f,
+                    file_name=os.path.basename(backup_ready),
+                    mime="application/gzip" if backup_ready.endswith(".gz") else "application/x-sqlite3",
+                    on_click=lambda: st.session_state.pop('backup_ready', None)
+                )
 
 # --- Main Content ---
 st.title("TrialHub Lite – MindX Trial Management")
@@ -799,42 +553,21 @@ st.markdown("---")
 # --- Tab 1: Dashboard ---
 if selected_tab == "📊 Dashboard":
     st.header("Tổng quan")
-    # df is already loaded globally
+    # Precomputed per (day, subject, status) counts, no raw rows
+    stats = load_dashboard(current_dt_naive.date())
     
-    if not df.empty:
-        # Pre-process dates
-        # Assuming format dd/mm/yyyy
-        df['date_obj'] = pd.to_datetime(df['trial_date'], format='%d/%m/%Y', errors='coerce')
-        
-        # 1. Tổng Trial
-        total_trials = len(df)
-        
-        # 2. Trial hôm nay
-        # Compare date part only
-        trials_today_count = len(df[df['date_obj'] == today_vn])
-        
-        # 3. Sắp tới (7 ngày tới)
-        # From tomorrow to today+7
-        next_7_days = today_vn + timedelta(days=7)
-        upcoming_count = len(df[(df['date_obj'] > today_vn) & (df['date_obj'] <= next_7_days)])
-        
-        # 4. Đã trial
-        completed_count = len(df[df['status'].str.contains('Đã trial|Done', case=False, na=False)])
+    if stats['total'] > 0:
+        total_trials = stats['total']
+        trials_today_count = stats['today']
+        upcoming_count = stats['upcoming']
+        completed_count = stats['completed']
+        # "Gáy" as requested, data often has "Gãy": both are counted
+        broken_count = stats['broken']
+        cancelled_count = stats['cancelled']
         
-        # 5. Gáy (Gãy)
-        # User requested "Gáy", data often has "Gãy". Matching both or "G" generally if specific?
-        # Let's match "Gãy" or "Gáy"
-        broken_count = len(df[df['status'].str.contains('Gãy|Gáy', case=False, na=False)])
-        
-        # 6. Hủy lịch
-        cancelled_count = len(df[df['status'].str.contains('Hủy', case=False, na=False)])
-        
-        # 7. Coding (%)
-        coding_count = len(df[df['subject'].str.contains('Coding', case=False, na=False)])
+        coding_count = stats['coding']
         coding_pct = (coding_count / total_trials * 100) if total_trials > 0 else 0
-        
-        # 8. Art (%)
-        art_count = len(df[df['subject'].str.contains('Art', case=False, na=False)])
+        art_count = stats['art']
         art_pct = (art_count / total_trials * 100) if total_trials > 0 else 0
         
         # Row 1
@@ -861,7 +594,7 @@ if selected_tab == "📊 Dashboard":
             
         st.markdown("---")
         st.markdown("### Biểu đồ trạng thái")
-        st.bar_chart(df['status'].value_counts())
+        st.bar_chart(stats['status_counts'])
     else:
         st.warning("Chưa có dữ liệu.")
 
@@ -870,72 +603,94 @@ if selected_tab == "📋 Danh sách Trial":
     st.header("Danh sách Trial")
     
     # 1. Prepare Display Data
-    # df_display is already filtered in the main scope (lines 535-560 in previous version)
-    # But wait, the previous code block for Tab 2 was replaced partly.
-    # We need to make sure we access the correct filtered dataframe.
-    # In the provided file content, `df_display` was created around line 535.
-    # We will assume `df_display` is available or re-create it if needed.
-    # Actually, the user asked to replace "The entire 'Danh sách Trial' tab code".
-    # So we should include the filtering logic for the VIEW here if it was inside the tab, 
-    # but in the previous file state, it was seemingly inside `with tab2`.
-    # Let's check lines 496-591 of the file provided in context... yes, it is inside `with tab2`.
-    
-    if not df.empty:
-        # --- Local Filtering (View) ---
-        df_view = df.copy()
-        
+    if load_count() > 0:
+        # --- Filtering (View) ---
         # Search Term
         search_term_key = "search_box_tab2"
         search_term = st.text_input("🔍 Tìm kiếm toàn cục", placeholder="Nhập SĐT, Tên, Note...", key=search_term_key)
         
-        if search_term:
-            mask = df_view.apply(lambda x: x.astype(str).str.contains(search_term, case=False).any(), axis=1)
-            df_view = df_view[mask]
-            
-        # Sidebar Filters (Global variables `filter_date`, `filter_subject`, etc. are available from sidebar scope)
-        if len(filter_date) == 2:
-            start_date, end_date = filter_date
-            df_view['date_temp'] = pd.to_datetime(df_view['trial_date'], format='%d/%m/%Y', errors='coerce').dt.date
-            df_view = df_view[(df_view['date_temp'] >= start_date) & (df_view['date_temp'] <= end_date)]
-            
-        if filter_subject:
-            df_view = df_view[df_view['subject'].apply(lambda x: any(s.lower() in str(x).lower() for s in filter_subject))]
-            
-        if filter_status:
-            df_view = df_view[df_view['status'].apply(lambda x: any(s.lower() in str(x).lower() for s in filter_status))]
-            
-        if filter_evaluator:
-            df_view = df_view[df_view['evaluator'].str.contains(filter_evaluator, case=False, na=False)]
+        # Sidebar filters + search box, evaluated in SQL
+        with profiling.timer('filters'):
+            view_filters = {**sidebar_filters, **repository.make_filters(search=search_term)}
+            total_rows = load_count(view_filters)
+        
+        # --- Pagination (keyset on id, newest first) ---
+        page_size = st.session_state.get("list_page_size", 50)
+        pager_key = (repr(sorted(view_filters.items())), page_size)
+        pager = st.session_state.get("list_pager")
+        if not pager or pager['key'] != pager_key:
+            # Filters changed -> back to first page
+            pager = st.session_state["list_pager"] = {'key': pager_key, 'cursors': [None]}
+        page_no = len(pager['cursors'])
+        
+        cursor = pager['cursors'][-1]
 
         # --- 2. Edit Interface ---
         
-        # Set Index to ID for reliable updates
-        df_view = df_view.set_index('id')
+        # One editor instance per page visit. Its frame is frozen while the widget
+        # lives (data_editor resets when its data changes); edits made in earlier
+        # instances are overlaid when a new one is built.
+        list_editor = st.session_state.get("list_editor")
+        if (not list_editor or list_editor['pager'] != pager_key or list_editor['cursor'] != cursor
+                or list_editor['key'] not in st.session_state):
+            instance = st.session_state.get("editor_instance", 0) + 1
+            st.session_state["editor_instance"] = instance
+            
+            # Set Index to ID for reliable updates
+            df_page = load_page(view_filters, cursor, page_size).set_index('id')
+            last_id = df_page.index[-1] if len(df_page) else None
+            edited, deleted, _ = pending_changes()
+            df_page = df_page.drop(index=[i for i in deleted if i in df_page.index])
+            for row_id, cols in edited.items():
+                if row_id in df_page.index:
+                    for col, val in cols.items():
+                        df_page.at[row_id, col] = val
+            
+            list_editor = st.session_state["list_editor"] = {
+                'key': f"data_editor_tab2_{instance}",
+                'pager': pager_key,
+                'cursor': cursor,
+                'last_id': last_id,
+                'frame': df_page,
+            }
+            # Styling (visible page only, one vectorized pass)
+            with profiling.timer('styling'):
+                list_editor['categories'] = styling.classify_trials(df_page, current_dt_naive)
         
-        # Styling
-        styled_df = df_view.style.apply(highlight_rows, axis=1)
+        df_page = list_editor['frame']
+        page_ids = df_page.index.tolist()
+        # trial_day / trial_ts only feed the classification
+        df_view = df_page.drop(columns=repository.STYLE_COLUMNS)
+        with profiling.timer('styling'):
+            styled_df = styling.style_trials(df_view, list_editor['categories'])
         
         # Check for unsaved changes (visual indicator)
-        # We look at session state
-        editor_key = "data_editor_tab2"
-        edited_rows = st.session_state.get(editor_key, {}).get("edited_rows", {})
-        has_unsaved = len(edited_rows) > 0
+        pending_edited, pending_deleted, pending_added = pending_changes()
+        pending_count = len(pending_edited) + len(pending_deleted) + len(pending_added)
+        has_unsaved = pending_count > 0
         
         col_btn, col_msg = st.columns([1, 3])
         with col_btn:
             if st.button("💾 Lưu thay đổi", type="primary", disabled=not has_unsaved):
-                count = save_batch_changes(edited_rows, df)
-                if count > 0:
-                    st.toast(f"Đã lưu thành công {count} thay đổi!", icon="✅")
+                result = save_batch_changes(pending_edited, pending_added, pending_deleted)
+                if result is not None:
+                    reset_list_changes()
+                    if result['conflicts']:
+                        ids = ", ".join(str(i) for i in result['conflicts'])
+                        st.session_state["list_conflicts"] = f"⚠️ Không lưu các dòng ID {ids}: đã bị người khác sửa/xóa. Dữ liệu mới đã được tải lại."
+                    if result['total'] > 0:
+                        st.toast(f"Đã lưu thành công {result['total']} thay đổi!", icon="✅")
                     st.rerun()
-                else:
-                    st.info("Không có thay đổi nào để lưu.")
         
         with col_msg:
             if has_unsaved:
-                st.markdown(f"<span style='color:red; font-weight:bold;'>● Có {len(edited_rows)} dòng chưa lưu!</span>", unsafe_allow_html=True)
+                st.markdown(f"<span style='color:red; font-weight:bold;'>● Có {pending_count} thay đổi chưa lưu!</span>", unsafe_allow_html=True)
+            if st.session_state.get("list_conflicts"):
+                st.warning(st.session_state.pop("list_conflicts"))
+        
+        # Data Editor (edits/adds/deletes are folded into list_changes by id)
+        editor_key = list_editor['key']
         
-        # Data Editor
         st.data_editor(
             styled_df,
             use_container_width=True,
@@ -946,9 +701,30 @@ if selected_tab == "📋 Danh sách Trial":
                 "status": st.column_config.SelectboxColumn("Status", options=all_statuses),
                 "subject": st.column_config.SelectboxColumn("Subject", options=all_subjects),
                 "stt": st.column_config.TextColumn("STT"), # Show STT
+                "version": None,
             },
-            key=editor_key
+            key=editor_key,
+            on_change=collect_edits,
+            args=(editor_key, df_page)
         )
+        if pending_added:
+            st.caption(f"➕ {len(pending_added)} dòng mới sẽ được thêm khi lưu.")
+        
+        # Page navigation
+        total_pages = max(1, -(-total_rows // page_size))
+        nav_prev, nav_info, nav_next, nav_size = st.columns([1, 2, 1, 1])
+        with nav_prev:
+            if st.button("◀ Trang trước", disabled=page_no <= 1, use_container_width=True):
+                pager['cursors'].pop()
+                st.rerun()
+        with nav_info:
+            st.markdown(f"Trang **{page_no} / {total_pages}** · {total_rows} dòng")
+        with nav_next:
+            if st.button("Trang sau ▶", disabled=page_no >= total_pages or list_editor['last_id'] is None, use_container_width=True):
+                pager['cursors'].append(list_editor['last_id'])
+                st.rerun()
+        with nav_size:
+            st.selectbox("Số dòng/trang", [25, 50, 100, 200], index=1, key="list_page_size", label_visibility="collapsed")
         
         st.caption("ℹ️ Chỉnh sửa trực tiếp trên bảng và bấm **'Lưu thay đổi'**.")
         
@@ -970,7 +746,7 @@ if selected_tab == "📋 Danh sách Trial":
             if selected_id_edit:
                 # Get row data
                 try:
-                    row_data = df.set_index('id').loc[selected_id_edit]
+                    row_data = repository.get_trial(conn, selected_id_edit)
                     
                     with st.form(key=f"edit_form_{selected_id_edit}"):
                         c1, c2 = st.columns(2)
@@ -1004,7 +780,7 @@ if selected_tab == "📋 Danh sách Trial":
                                 'evaluator': e_eval,
                                 'creator': row_data['creator'] # Keep creator
                             }
-                            if update_single_row(selected_id_edit, update_data):
+                            if update_single_row(selected_id_edit, update_data, row_data['version']):
                                 st.success("Cập nhật thành công!")
                                 st.rerun()
                 except Exception as ex:
@@ -1055,3 +831,45 @@ if selected_tab == "➕ Thêm Trial mới":
             if add_trial(new_data):
                 st.success("Đã thêm Trial mới thành công!")
                 st.rerun()
+
+# --- Profiling panel (admins only) ---
+profiling.finish_run(rerun_profile)
+if is_admin:
+    with st.sidebar:
+        with st.expander("⏱️ Profiling", expanded=False):
+            st.caption(
+                f"Lần chạy này: **{rerun_profile['seconds'] * 1000:.0f} ms** · "
+                f"{rerun_profile['queries']} truy vấn · {rerun_profile['rows']} dòng đọc"
+            )
+            if rerun_profile['timers']:
+                timers = pd.DataFrame.from_dict(rerun_profile['timers'], orient='index')
+                timers['ms'] = (timers.pop('seconds') * 1000).round(1)
+                st.dataframe(timers.sort_values('ms', ascending=False), use_container_width=True)
+            
+            recent_jobs = profiling.recent('job', limit=5)
+            if recent_jobs:
+                st.caption("Job gần đây:")
+                st.dataframe(pd.DataFrame([
+                    {'job': r['meta'].get('fn'), 'lúc': r['started_at'], 'ms': round(r['seconds'] * 1000), 'truy vấn': r['queries']}
+                    for r in recent_jobs
+                ]), hide_index=True, use_container_width=True)
+
+            reminder_state = reminders.start(db.DB_PATH)
+            st.caption(
+                f"Nhắc lịch: {reminder_state['sent']} đã gửi · {len(reminder_state['heap'])} đang chờ · "
+                f"{reminder_state['errors']} lỗi · log `{reminders.LOG_PATH}`"
+            )
+
+            if not schema.phone_date_index_unique(get_connection()):
+                duplicates = schema.duplicate_phone_dates(get_connection())
+                st.warning(
+                    f"{len(duplicates)} cặp (SĐT, ngày trial) bị trùng: chưa chặn được trùng lặp khi sửa/thêm. "
+                    "Gộp hoặc xóa các dòng trùng rồi khởi động lại app."
+                )
+                st.dataframe(pd.DataFrame(duplicates[:20], columns=['SĐT', 'Ngày trial', 'Số dòng']),
+                             hide_index=True, use_container_width=True)
+
+            st.checkbox("Ghi profile chi tiết (cProfile) cho lần chạy sau", key="profile_capture")
+            if rerun_profile['profile']:
+                st.code(rerun_profile['profile'], language=None)
+            st.caption(f"Log: `{profiling.log_path()}`")
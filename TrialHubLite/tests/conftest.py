@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# Tests import the app's modules (trialhub/, import_data.py, api.py...) from the repo folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from trialhub import db, schema  # noqa: E402
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """A freshly migrated trials DB."""
+    path = str(tmp_path / "trialhub.db")
+    conn = db.connect(path)
+    schema.migrate(conn)
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def conn(db_path):
+    conn = db.connect(db_path)
+    yield conn
+    conn.close()
@@ -0,0 +1,96 @@
+import asyncio
+import json
+from datetime import datetime
+
+import pytest
+
+import api
+from trialhub import changeset
+
+
+def _trial(phone, status):
+    return {'trial_date': "20/10/2026", 'time': "19:00", 'phone': phone, 'subject': "Coding", 'status': status}
+
+
+@pytest.fixture
+def call(db_path, conn):
+    changeset.apply_changes(conn, added=[_trial("0900000001", "Hủy lịch"), _trial("0900000002", "Đã trial")])
+    app = api.create_app(db_path, pool_size=1)
+
+    def call(path, query='', headers=()):
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request'}
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': path, 'query_string': query.encode(),
+            'headers': [(k.encode(), v.encode()) for k, v in headers],
+        }
+        asyncio.run(app(scope, receive, send))
+        start = messages[0]
+        body = b''.join(m.get('body', b'') for m in messages[1:])
+        return start['status'], {k.decode(): v.decode() for k, v in start['headers']}, body
+    return call
+
+
+def test_etag_depends_on_the_query(call):
+    status, headers, _ = call('/trials', 'status=Hủy lịch')
+    etag = headers['etag']
+    assert status == 200
+    assert call('/trials', 'q=0900000002')[1]['etag'] != etag
+    # Same query in another order: same representation
+    assert call('/trials', 'limit=5&status=Hủy lịch')[1]['etag'] == call('/trials', 'status=Hủy lịch&limit=5')[1]['etag']
+
+    # Revalidating another query with this ETag gets the full body, not a 304
+    status, _, body = call('/trials', 'q=0900000002', headers=[('if-none-match', etag)])
+    assert status == 200
+    assert [item['phone'] for item in json.loads(body)['items']] == ["0900000002"]
+    assert call('/trials', 'status=Hủy lịch', headers=[('if-none-match', etag)])[0] == 304
+
+
+def test_changes_since_watermark(call, conn):
+    mark = json.loads(call('/health')[2])
+    changeset.apply_changes(conn, edited={1: {'note': "gọi lại"}}, added=[_trial("0900000003", "Chờ trial")])
+
+    status, _, body = call('/changes', f"since={mark['version']}&after_id={mark['max_id']}&epoch={mark['epoch']}")
+    body = json.loads(body)
+    assert status == 200
+    assert [row['id'] for row in body['changed']] == [1, 3]
+    assert call('/changes', f"since={mark['version']}")[0] == 400
+    assert call('/changes', f"since=0&after_id=0&epoch={mark['epoch'] + 1}")[0] == 409
+
+
+def test_client_delta_refresh_matches_full_reload(call, conn):
+    # Initial load, then patch the copy by id with each /changes response
+    mark = json.loads(call('/health')[2])
+    rows = {row['id']: row for row in map(json.loads, call('/export.ndjson')[2].splitlines())}
+
+    changeset.apply_changes(conn, edited={1: {'status': "Đã trial"}}, added=[_trial("0900000003", "Chờ trial")])
+    changeset.apply_changes(conn, deleted=[2], edited={3: {'note': "gọi lại"}})
+    for _ in range(2):
+        delta = json.loads(call('/changes', f"since={mark['version']}&after_id={mark['max_id']}&epoch={mark['epoch']}")[2])
+        rows.update({row['id']: row for row in delta['changed']})
+        for row_id in delta['deleted']:
+            rows.pop(row_id, None)
+        mark = delta
+
+    fresh = {row['id']: row for row in map(json.loads, call('/export.ndjson')[2].splitlines())}
+    assert sorted(rows) == [1, 3]
+    assert rows == fresh
+
+
+def test_stats_today_is_the_vn_day(call, monkeypatch):
+    # 20/10 00:30 in Vietnam is still 19/10 on a UTC server
+    monkeypatch.setattr(api, 'now_vn', lambda: datetime(2026, 10, 20, 0, 30))
+    status, headers, body = call('/stats')
+    assert status == 200
+    assert json.loads(body)['today_date'] == "2026-10-20"
+    assert json.loads(body)['today'] == 2
+
+    # Next VN day: the cached /stats is stale
+    monkeypatch.setattr(api, 'now_vn', lambda: datetime(2026, 10, 21, 0, 30))
+    assert call('/stats', headers=[('if-none-match', headers['etag'])])[0] == 200
@@ -0,0 +1,88 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from trialhub import changeset, codes, importer, repository
+
+
+def _trial(phone, status="Chờ trial", subject="Coding", time="19:00"):
+    return {'trial_date': "20/10/2026", 'time': time, 'phone': phone, 'subject': subject, 'status': status}
+
+
+@pytest.fixture
+def seeded(conn):
+    changeset.apply_changes(conn, added=[_trial(f"090000000{i}") for i in range(1, 5)])
+    return conn
+
+
+def _row(conn, row_id, *columns):
+    return conn.execute(f"SELECT {', '.join(columns)} FROM trials WHERE id = ?", (row_id,)).fetchone()
+
+
+def test_grouped_edits_with_mixed_column_sets(seeded):
+    result = changeset.apply_changes(seeded, edited={
+        1: {'note': "gọi lại"},
+        2: {'note': "ok", 'status': "Đã trial"},
+        3: {'status': "Hủy lịch"},
+        4: {'time': "20:30"},
+    })
+    assert result == {'updated': 4, 'inserted': 0, 'deleted': 0, 'conflicts': []}
+    assert _row(seeded, 1, 'note', 'status', 'version') == ("gọi lại", "Chờ trial", 1)
+    assert _row(seeded, 2, 'note', 'status', 'status_code') == ("ok", "Đã trial", codes.status_code("Đã trial"))
+    assert _row(seeded, 3, 'note', 'status_code') == (None, codes.status_code("Hủy lịch"))
+    # Derived time columns follow the edited time
+    _, ts_before = _row(seeded, 3, 'time', 'trial_ts')
+    assert _row(seeded, 4, 'time')[0] == "20:30"
+    assert _row(seeded, 4, 'trial_ts')[0] - ts_before == 90 * 60
+
+
+def test_stale_version_is_reported_and_left_untouched(seeded):
+    changeset.apply_changes(seeded, edited={1: {'note': "người khác sửa"}})
+
+    result = changeset.apply_changes(
+        seeded, edited={1: {'note': "bản cũ"}, 2: {'note': "mới"}}, deleted=[3, 99],
+        versions={1: 0, 2: 0, 3: 1},
+    )
+    assert sorted(result['conflicts']) == [1, 3, 99]
+    assert (result['updated'], result['deleted']) == (1, 0)
+    assert _row(seeded, 1, 'note', 'version') == ("người khác sửa", 1)
+    assert _row(seeded, 2, 'note')[0] == "mới"
+    assert repository.count_trials(seeded) == 4
+
+
+@pytest.mark.parametrize('changes', [
+    {'edited': {1: {'version': 7}}},
+    {'edited': {1: {'note': "x", 'id': 9}}},
+    {'edited': {1: {'note = note; --': "x"}}},
+    {'added': [{**_trial("0900000009"), 'status_code': 0}]},
+])
+def test_only_editable_columns_are_written(seeded, changes):
+    with pytest.raises(ValueError, match="not editable"):
+        changeset.apply_changes(seeded, **changes)
+    assert _row(seeded, 1, 'note', 'version') == (None, 0)
+    assert repository.count_trials(seeded) == 4
+
+
+def test_add_and_delete_in_one_transaction(seeded):
+    result = changeset.apply_changes(seeded, added=[_trial("0900000005"), {'note': ''}], deleted=[1, 2])
+    assert (result['inserted'], result['deleted']) == (1, 2)
+    assert sorted(r[0] for r in seeded.execute("SELECT phone FROM trials")) == [
+        "0900000003", "0900000004", "0900000005"]
+
+    # A failing insert rolls back the deletes of the same change set
+    with pytest.raises(sqlite3.IntegrityError):
+        changeset.apply_changes(seeded, added=[_trial("0900000003")], deleted=[4])
+    assert repository.count_trials(seeded) == 3
+    assert _row(seeded, 4, 'phone')[0] == "0900000004"
+
+
+def test_phones_are_stored_like_imports(seeded):
+    changeset.apply_changes(seeded, added=[_trial("0900 000 009")], edited={1: {'phone': "0900.000.007"}})
+    assert [r[0] for r in seeded.execute("SELECT phone FROM trials WHERE id IN (1, 5) ORDER BY id")] == [
+        "0900000007", "0900000009"]
+
+    # Same key as the imports' normalized phones
+    with pytest.raises(sqlite3.IntegrityError):
+        changeset.apply_changes(seeded, added=[_trial("0900-000-002")])
+    assert importer.bulk_insert_trials(seeded, pd.DataFrame([_trial("0900000009")])) == (0, 1)
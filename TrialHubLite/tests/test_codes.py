@@ -0,0 +1,77 @@
+import random
+import unicodedata
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from trialhub import changeset, codes, repository, styling
+
+# Texts found in real sheets: labels, case/spacing variants, English, blanks
+STATUSES = ["Chờ trial", "chờ trial ", "Đã trial", "ĐÃ TRIAL", "Done", "done", "Hủy lịch", "hủy",
+            "Reschedule", "Gãy", "Gáy", "gãy", "Đã confirm", "Chưa confirm", "", "???"]
+SUBJECTS = ["Coding", "coding ", "CODING", "Art", "art", "Robotics", "", "Toán"]
+
+
+def _regex_counts(df):
+    """Dashboard counts as computed before the codes (substring regexes)."""
+    status, subject = df['status'], df['subject']
+    return {
+        'completed': int(status.str.contains('Đã trial|Done', case=False).sum()),
+        'broken': int(status.str.contains('Gãy|Gáy', case=False).sum()),
+        'cancelled': int(status.str.contains('Hủy', case=False).sum()),
+        'coding': int(subject.str.contains('Coding', case=False).sum()),
+        'art': int(subject.str.contains('Art', case=False).sum()),
+    }
+
+
+def _regex_categories(df):
+    """Status part of the old row classification (styling.py)."""
+    status = df['status'].fillna('').astype(str).str.lower()
+    conditions = [
+        status.str.contains('gãy|gáy', regex=True).to_numpy(),
+        status.str.contains('hủy', regex=False).to_numpy(),
+        status.str.contains('đã trial|thích|done', regex=True).to_numpy(),
+    ]
+    return np.select(conditions, styling.CATEGORIES[:3], default='normal')
+
+
+def _rows(n, seed=0):
+    rnd = random.Random(seed)
+    return pd.DataFrame({
+        'status': [rnd.choice(STATUSES) for _ in range(n)],
+        'subject': [rnd.choice(SUBJECTS) for _ in range(n)],
+    })
+
+
+def test_dashboard_counts_match_regex_counts(conn):
+    df = _rows(500)
+    changeset.apply_changes(conn, added=[
+        {'trial_date': "20/10/2026", 'time': "19:00", 'phone': f"09{i:08d}", 'status': s, 'subject': sub}
+        for i, (s, sub) in enumerate(zip(df['status'], df['subject']))
+    ])
+
+    stats = repository.dashboard_stats(conn, date(2026, 10, 20))
+
+    assert stats['total'] == stats['today'] == 500
+    assert {k: stats[k] for k in _regex_counts(df)} == _regex_counts(df)
+
+
+def test_row_categories_match_regex_classification():
+    df = _rows(500, seed=1)
+    # Far from `now`: only the status decides the category
+    df['trial_ts'] = pd.Series(0, index=df.index, dtype='Int64')
+
+    categories = styling.classify_trials(df, datetime(2026, 10, 20, 12, 0))
+
+    assert categories.astype(str).tolist() == _regex_categories(df).tolist()
+
+
+def test_codes_fix_regex_misses():
+    # Other tone placement / decomposed marks: the regexes missed these
+    assert codes.status_code("Huỷ lịch") == codes.STATUS_CANCEL
+    assert codes.status_code(unicodedata.normalize('NFD', "Gãy")) == codes.STATUS_FAIL
+    # One code per row: no longer counted as both broken and cancelled
+    assert codes.status_code("Gãy, hủy lịch") == codes.STATUS_FAIL
+    assert codes.subject_codes(pd.Series(["Coding", None, " ART"])).tolist() == [
+        codes.SUBJECT_CODING, codes.SUBJECT_OTHER, codes.SUBJECT_ART]
@@ -0,0 +1,59 @@
+import threading
+
+import pytest
+
+from trialhub import db
+
+
+def _in_thread(fn):
+    out = []
+    thread = threading.Thread(target=lambda: out.append(fn()))
+    thread.start()
+    thread.join()
+    return out[0]
+
+
+def test_rerun_threads_reuse_pooled_connection(db_path):
+    # Streamlit runs each rerun in a new thread
+    first = _in_thread(lambda: id(db.get_connection(db_path)))
+    assert db.idle_connections(db_path) == 1
+    assert _in_thread(lambda: id(db.get_connection(db_path))) == first
+
+
+def test_live_threads_never_share_and_idle_pool_is_bounded(db_path, monkeypatch):
+    monkeypatch.setattr(db, 'POOL_SIZE', 2)
+    held = []
+    ready = threading.Barrier(4)
+
+    def hold():
+        held.append(id(db.get_connection(db_path)))
+        ready.wait()
+
+    threads = [threading.Thread(target=hold) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    for thread in threads:
+        thread.join()
+    assert len(set(held)) == 3
+    assert db.idle_connections(db_path) == 2
+
+
+def test_write_depth_is_per_connection(db_path):
+    conn = db.get_connection(db_path)
+    with pytest.raises(RuntimeError):
+        with db.write_transaction(conn):
+            conn.execute("INSERT INTO data_meta (key, value) VALUES ('t', 1)")
+            with db.write_transaction(conn):
+                conn.execute("INSERT INTO data_meta (key, value) VALUES ('u', 1)")
+            raise RuntimeError
+    # The inner block joined the outer transaction: both rolled back
+    assert conn.execute("SELECT COUNT(*) FROM data_meta WHERE key IN ('t', 'u')").fetchone()[0] == 0
+
+    # Another thread with its own connection starts a real transaction
+    def write():
+        other = db.get_connection(db_path)
+        with db.write_transaction(other):
+            other.execute("INSERT INTO data_meta (key, value) VALUES ('v', 1)")
+    _in_thread(write)
+    assert conn.execute("SELECT COUNT(*) FROM data_meta WHERE key = 'v'").fetchone()[0] == 1
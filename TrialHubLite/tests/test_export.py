@@ -0,0 +1,57 @@
+import io
+from datetime import datetime
+
+from openpyxl import load_workbook
+
+from trialhub import changeset, export, repository
+
+NOW = datetime(2026, 10, 20, 12, 0)
+
+
+def _trial(phone, status, **extra):
+    return {'trial_date': "25/10/2026", 'time': "19:00", 'phone': phone, 'subject': "Coding", 'status': status, **extra}
+
+
+def _seed(conn):
+    changeset.apply_changes(conn, added=[
+        _trial("0900000001", "Gãy", note="báo bận"),
+        _trial("0900000002", "Hủy lịch"),
+        _trial("0900000003", "Đã trial", evaluator="Vĩ Triệu"),
+        _trial("0900000004", "Chờ trial"),
+    ])
+
+
+def _fill(cell):
+    return cell.fill.fgColor.rgb[-6:] if cell.fill.fill_type == 'solid' else None
+
+
+def test_export_round_trip(conn):
+    _seed(conn)
+
+    wb = load_workbook(io.BytesIO(export.export_trials_xlsx(conn, {}, NOW)))
+    rows = list(wb["Trials"].iter_rows())
+
+    assert [c.value for c in rows[0]] == repository.TRIAL_COLUMNS
+    assert all(c.font.b for c in rows[0])
+    expected = repository.fetch_trials(conn, {}, repository.TRIAL_COLUMNS)
+    # Blank/NULL cells come back as None, ids as ints
+    assert [[c.value for c in row] for row in rows[1:]] == [
+        [None if v in ('', None) else v for v in values] for values in expected.itertuples(index=False, name=None)]
+
+    by_status = {row[repository.TRIAL_COLUMNS.index('status')].value: row for row in rows[1:]}
+    assert {s: _fill(row[0]) for s, row in by_status.items()} == {
+        "Gãy": 'FECACA', "Hủy lịch": 'F3F4F6', "Đã trial": 'D1FAE5', "Chờ trial": None}
+    assert by_status["Hủy lịch"][0].font.color.rgb[-6:] == '9CA3AF'
+
+
+def test_run_export_writes_file_and_reports_progress(conn, tmp_path, monkeypatch):
+    _seed(conn)
+    monkeypatch.setattr(export, 'PROGRESS_EVERY', 2)
+    reports = []
+    dest = str(tmp_path / "trials.xlsx")
+
+    result = export.run_export(conn, lambda *a: reports.append(a), {}, NOW, dest)
+
+    assert result == {'rows': 4, 'path': dest}
+    assert len(list(load_workbook(dest)["Trials"].iter_rows())) == 5
+    assert [r[:2] for r in reports] == [(0, None), (0, 4), (2, 4), (4, 4)]
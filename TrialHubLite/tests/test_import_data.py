@@ -0,0 +1,42 @@
+import import_data
+from trialhub import changeset, repository
+
+SHEET = """Danh sách trial,,,,,,,,,
+STT,Ngày Trial,Thời gian,Link Trial,Môn,Số Điện Thoại,Tình Trạng,Note,Phiếu Đánh Giá,TVV
+1,20/10/2026,19h30,,Coding,0900 000 001,Chờ trial,,,Mai Anh
+2,20/10/2026,20:00,,Art,84900000002,Đã trial,,,Mai Anh
+3,21/10/2026,19:00,,Coding,0900.000.003,Chờ trial,,,Vĩ Triệu
+4,21/10/2026,19:00,,Coding,0900.000.003,Chờ trial,trùng,,Vĩ Triệu
+""".encode('utf-8')
+
+
+def _sheet():
+    return import_data.to_db_frame(import_data.parse_sheet(SHEET))
+
+
+def test_full_import_then_sync_adds_nobody_twice(conn):
+    inserted, unkeyed = import_data.full_import(conn, _sheet())
+    assert (inserted, unkeyed) == (3, 0)
+    # Stored normalized, like rows written by the sync
+    assert sorted(r[0] for r in conn.execute("SELECT phone FROM trials")) == ['0900000001', '0900000003', '84900000002']
+
+    assert import_data.sync_rows(conn, _sheet()) == (0, 0, 0)
+    assert repository.count_trials(conn) == 3
+
+
+def test_full_import_resets_change_log_and_keeps_sent_reminders(conn):
+    import_data.full_import(conn, _sheet())
+    first = conn.execute("SELECT id, trial_ts FROM trials WHERE phone = '0900000001'").fetchone()
+    with conn:
+        conn.execute("INSERT INTO reminders_sent VALUES (?, 900, ?, '2026-10-20T19:15:00')", first)
+    changeset.apply_changes(conn, deleted=[first[0] + 1])
+    epoch = repository.data_epoch(conn)
+
+    import_data.full_import(conn, _sheet())
+
+    assert repository.data_epoch(conn) == epoch + 1
+    assert conn.execute("SELECT COUNT(*) FROM trial_tombstones").fetchone()[0] == 0
+    new_id = conn.execute("SELECT id FROM trials WHERE phone = '0900000001'").fetchone()[0]
+    assert conn.execute("SELECT trial_id FROM reminders_sent").fetchall() == [(new_id,)]
+    # Dashboard aggregate matches the new rows
+    assert conn.execute("SELECT SUM(n) FROM trial_stats").fetchone()[0] == 3
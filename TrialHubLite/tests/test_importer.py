@@ -0,0 +1,130 @@
+import csv
+import io
+import random
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from trialhub import db, importer, schema
+from trialhub.trial_time import time_columns
+
+OLD_COLUMNS = ['stt', 'trial_date', 'time', 'meet_link', 'subject', 'phone', 'status', 'note',
+               'evaluator', 'creator', 'trial_day', 'trial_ts']
+
+
+def _loop_insert(conn, df_ready):
+    """The per-row SELECT + INSERT import that bulk_insert_trials replaced."""
+    cursor = conn.cursor()
+    count = 0
+    skipped = 0
+    for _, row in df_ready.iterrows():
+        phone = str(row.get('phone', '')).strip()
+        t_date = row.get('trial_date', '')
+        if not phone or not t_date:
+            skipped += 1
+            continue
+        cursor.execute("SELECT id FROM trials WHERE phone=? AND trial_date=?", (phone, t_date))
+        if cursor.fetchone():
+            skipped += 1
+            continue
+        trial_day, trial_ts = time_columns(t_date, row.get('time', ''))
+        cursor.execute("""
+            INSERT INTO trials (stt, trial_date, time, meet_link, subject, phone, status, note, evaluator, creator, trial_day, trial_ts)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            row.get('stt', ''), t_date, row.get('time', ''),
+            row.get('meet_link', ''), row.get('subject', ''),
+            phone, row.get('status', 'Chờ trial'),
+            row.get('note', ''), row.get('evaluator', ''), row.get('creator', ''),
+            trial_day, trial_ts
+        ))
+        count += 1
+    conn.commit()
+    return count, skipped
+
+
+def _cleaned(n, seed):
+    """Cleaned import frame: repeated keys, blank dates/phones, keys already in the DB."""
+    rnd = random.Random(seed)
+    return pd.DataFrame({
+        'stt': [str(i) for i in range(n)],
+        'trial_date': [rnd.choice(["20/10/2026", "21/10/2026", "22/10/2026", ""]) for _ in range(n)],
+        'time': [rnd.choice(["19:00", "19:30", ""]) for _ in range(n)],
+        'subject': [rnd.choice(["Coding", "Art"]) for _ in range(n)],
+        'phone': [rnd.choice([f"09000000{i:02d}" for i in range(40)] + [""]) for _ in range(n)],
+        'note': [rnd.choice(["", "gọi lại"]) for _ in range(n)],
+        'creator': [rnd.choice(["Mai Anh", ""]) for _ in range(n)],
+    })
+
+
+def _open(path):
+    conn = db.connect(str(path))
+    schema.migrate(conn)
+    return conn
+
+
+def _rows(conn):
+    return conn.execute(f"SELECT {', '.join(OLD_COLUMNS)} FROM trials ORDER BY id").fetchall()
+
+
+@pytest.mark.parametrize('seed', [1, 2])
+def test_bulk_insert_matches_row_loop(tmp_path, seed):
+    existing, upload = _cleaned(30, seed), _cleaned(400, seed + 10)
+    loop_conn, bulk_conn = _open(tmp_path / "loop.db"), _open(tmp_path / "bulk.db")
+    try:
+        assert _loop_insert(loop_conn, existing) == importer.bulk_insert_trials(bulk_conn, existing)
+        assert _loop_insert(loop_conn, upload) == importer.bulk_insert_trials(bulk_conn, upload)
+        assert _rows(bulk_conn) == _rows(loop_conn)
+    finally:
+        loop_conn.close()
+        bulk_conn.close()
+
+
+def _sheet_rows(n, seed):
+    """Raw sheet: title row, header, merged (blank) date cells, repeated keys."""
+    rnd = random.Random(seed)
+    rows = [["Danh sách trial"], ["STT", "Ngày Trial", "Thời gian", "Môn", "Số Điện Thoại", "Tình Trạng", "TVV"]]
+    for i in range(n):
+        rows.append([
+            str(i + 1), rnd.choice(["20/10/2026", "21/10/2026", "1/11/2026", "", ""]),
+            rnd.choice(["19h30", "7", "20:00", ""]), rnd.choice(["Coding", "Art"]),
+            rnd.choice([f"0900 000 {j:03d}" for j in range(150)] + [""]),
+            rnd.choice(["Chờ trial", "Đã trial"]), rnd.choice(["Mai Anh TIỀN", ""]),
+        ])
+    return rows
+
+
+def _upload(rows, name):
+    buf = io.BytesIO()
+    if name.endswith('.csv'):
+        text = io.StringIO(newline='')
+        csv.writer(text).writerows(rows)
+        buf.write(text.getvalue().encode('utf-8'))
+    else:
+        wb = Workbook()
+        for row in rows:
+            wb.active.append([v if v != '' else None for v in row])
+        wb.save(buf)
+    buf.name = name
+    return buf
+
+
+@pytest.mark.parametrize('name', ["trials.csv", "trials.xlsx"])
+def test_streaming_import_matches_whole_file_import(tmp_path, name):
+    upload = _upload(_sheet_rows(1000, 3), name)
+    df_raw, _ = importer.read_upload(upload)
+    mappings = importer.identify_column_mapping(df_raw.columns)
+    whole_conn, stream_conn = _open(tmp_path / "whole.db"), _open(tmp_path / "stream.db")
+    try:
+        whole = importer.run_import(whole_conn, lambda *a: None, df_raw, mappings)
+        streamed = importer.run_streaming_import(
+            stream_conn, lambda *a: None, upload.getvalue(), name, mappings, chunk_rows=97)
+
+        assert streamed.pop('chunks') == 11
+        assert streamed == whole
+        assert whole['inserted'] > 0
+        assert _rows(stream_conn) == _rows(whole_conn)
+    finally:
+        whole_conn.close()
+        stream_conn.close()
@@ -0,0 +1,80 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from trialhub import db, jobs
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    # Job outputs are written under ./jobs
+    monkeypatch.chdir(tmp_path)
+
+
+def _wait(conn, jid, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = jobs.get(conn, jid)
+        if not jobs.is_active(job):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {jid} still running")
+
+
+def _write_file(conn, report, path, calls):
+    calls.append(path)
+    with open(path, "w") as f:
+        f.write("x")
+    return {'path': path}
+
+
+def _dead_pid():
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+def test_finished_job_is_reused_while_its_output_exists(db_path, conn):
+    calls = []
+    path = jobs.output_path("t", ".txt")
+    jid = jobs.submit('export', 'k', _write_file, path, calls, db_path=db_path)
+    assert _wait(conn, jid)['status'] == 'done'
+    assert jobs.submit('export', 'k', _write_file, path, calls, db_path=db_path) == jid
+    _wait(conn, jid)
+    assert len(calls) == 1
+
+    # Output pruned/deleted: the same submission builds it again
+    os.remove(path)
+    jobs.submit('export', 'k', _write_file, path, calls, db_path=db_path)
+    assert _wait(conn, jid)['status'] == 'done'
+    assert len(calls) == 2 and os.path.exists(path)
+
+    # Explicit re-run
+    jobs.submit('export', 'k', _write_file, path, calls, db_path=db_path, force=True)
+    _wait(conn, jid)
+    assert len(calls) == 3
+
+
+def _insert_job(conn, jid, owner):
+    with db.write_transaction(conn):
+        conn.execute("""
+            INSERT INTO jobs (id, kind, status, created_at, updated_at, owner)
+            VALUES (?, 'import', 'running', '2026-01-01T00:00:00', '2026-01-01T00:00:00', ?)
+        """, (jid, owner))
+
+
+def test_only_jobs_of_dead_processes_are_failed(conn):
+    host = jobs.OWNER.split(":")[0]
+    _insert_job(conn, 'mine', jobs.OWNER)
+    _insert_job(conn, 'other_live', f"{host}:{os.getppid()}:abcd1234")
+    _insert_job(conn, 'other_dead', f"{host}:{_dead_pid()}:abcd1234")
+    _insert_job(conn, 'previous_run', f"{host}:{os.getpid()}:abcd1234")
+    _insert_job(conn, 'legacy', None)
+
+    assert sorted(jobs.fail_orphans(conn)) == ['legacy', 'other_dead', 'previous_run']
+    assert jobs.get(conn, 'mine')['status'] == 'running'
+    assert jobs.get(conn, 'other_live')['status'] == 'running'
+    assert jobs.get(conn, 'other_dead')['status'] == 'failed'
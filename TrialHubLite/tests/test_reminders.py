@@ -0,0 +1,51 @@
+from datetime import datetime
+
+from trialhub import changeset, reminders, repository, schema, styling
+from trialhub.trial_time import to_epoch
+
+
+def _trial(phone, time, status="Chờ trial"):
+    return {'trial_date': "20/10/2026", 'time': time, 'phone': phone, 'subject': "Coding", 'status': status}
+
+
+def _at(day, hour, minute=0):
+    return to_epoch(datetime(2026, 10, day, hour, minute))
+
+
+def test_date_only_trials_get_no_reminder(db_path, conn):
+    changeset.apply_changes(conn, added=[_trial("0900000001", ""), _trial("0900000002", "19h30")])
+    assert conn.execute("SELECT trial_day, trial_ts FROM trials WHERE id = 1").fetchone() == ("2026-10-20", None)
+
+    events = []
+    sched = reminders.new_scheduler(db_path, [events.append])
+    # 00:00 minus the default leads: nothing for the date-only trial
+    for now in (_at(19, 22), _at(19, 23, 45), _at(20, 0)):
+        assert reminders.tick(sched, now) == []
+    assert [t['id'] for t in reminders.upcoming(conn, _at(20, 0), _at(21, 0))] == [2]
+
+    reminders.tick(sched, _at(20, 17, 30))
+    reminders.tick(sched, _at(20, 19, 15))
+    assert [(e['trial_id'], e['trial_at'], e['lead_minutes']) for e in events] == [
+        (2, "20/10/2026 19:30", 120), (2, "20/10/2026 19:30", 15)]
+
+
+def test_closed_trials_get_no_reminder(db_path, conn):
+    changeset.apply_changes(conn, added=[_trial("0900000001", "19:00", status="Hủy lịch")])
+    sched = reminders.new_scheduler(db_path, [])
+    assert reminders.tick(sched, _at(20, 18, 50)) == []
+
+
+def test_date_only_trials_are_still_today(conn):
+    changeset.apply_changes(conn, added=[_trial("0900000001", ""), _trial("0900000002", "19h30")])
+    df = repository.fetch_trials(conn, None, repository.LIST_COLUMNS, order_by="id")
+    assert styling.classify_trials(df, datetime(2026, 10, 20, 8, 0)).tolist() == ['urgent', 'urgent']
+    assert styling.classify_trials(df, datetime(2026, 10, 19, 23, 0)).tolist() == ['normal', 'normal']
+
+
+def test_migration_clears_midnight_times(conn):
+    changeset.apply_changes(conn, added=[_trial("0900000001", ""), _trial("0900000002", "19h30")])
+    with conn:
+        # As stored before: date-only rows at 00:00
+        conn.execute("UPDATE trials SET trial_ts = ? WHERE id = 1", (_at(20, 0),))
+    schema._m014_date_only_trials(conn)
+    assert conn.execute("SELECT id, trial_ts FROM trials ORDER BY id").fetchall() == [(1, None), (2, _at(20, 19, 30))]
@@ -0,0 +1,67 @@
+from trialhub import changeset, repository
+
+
+def _trial(phone, day="20/10/2026", **extra):
+    return {'trial_date': day, 'time': "19:00", 'phone': phone, 'subject': "Coding", 'status': "Chờ trial", **extra}
+
+
+def test_inserts_are_not_stamped(conn):
+    changeset.apply_changes(conn, added=[_trial("0900000001"), _trial("0900000002")])
+    assert conn.execute("SELECT COUNT(*) FROM trials WHERE change_seq <> 0").fetchone()[0] == 0
+    # ...but still bump the data version, once per row
+    assert repository.data_version(conn) == 2
+
+
+def test_fetch_changes_since_watermark(conn):
+    changeset.apply_changes(conn, added=[_trial(f"090000000{i}") for i in range(1, 5)])
+    since, after_id = repository.data_version(conn), repository.max_id(conn)
+
+    changeset.apply_changes(conn, edited={1: {'note': "gọi lại"}}, deleted=[2], added=[_trial("0900000009")])
+
+    changed, deleted = repository.fetch_changes(conn, since, after_id, ['id', 'phone', 'note'])
+    assert changed['id'].tolist() == [1, 5]
+    assert changed.loc[changed['id'] == 1, 'note'].item() == "gọi lại"
+    assert deleted == [2]
+
+    # Nothing new after the latest watermark
+    changed, deleted = repository.fetch_changes(conn, repository.data_version(conn), repository.max_id(conn))
+    assert changed.empty and deleted == []
+
+
+def test_fetch_compact_matches_fetch_trials(conn):
+    changeset.apply_changes(conn, added=[
+        _trial(f"09000000{i:02d}", status=["Gãy", "Đã trial", "Chờ trial"][i % 3], note="gọi lại" if i % 2 else None)
+        for i in range(25)
+    ] + [_trial("0900000099", day="chưa rõ")])
+    columns = repository.EXPORT_COLUMNS
+
+    full = repository.fetch_trials(conn, None, columns)
+    compact = repository.fetch_compact(conn, None, columns, chunk_size=7)
+
+    assert compact['status'].dtype == 'category' and compact['trial_ts'].dtype == 'Int64'
+    assert compact['trial_ts'].isna().sum() == 1
+    assert compact.memory_usage(deep=True).sum() < full.memory_usage(deep=True).sum()
+    as_values = compact.astype(object).where(compact.notna(), None)
+    assert as_values.values.tolist() == full.astype(object).where(full.notna(), None).values.tolist()
+    assert repository.fetch_compact(conn, {'status_codes': (99,)}, columns).empty
+
+
+def _search(conn, term):
+    return repository.fetch_trials(conn, repository.make_filters(search=term), order_by="id")['id'].tolist()
+
+
+def test_search_by_words_and_phone_digits(conn):
+    changeset.apply_changes(conn, added=[
+        _trial("0912342637", note="Gọi lại sau"),
+        _trial("0987650000", evaluator="Đức Anh"),
+        _trial("0900 112 637"),
+    ])
+    # Word prefixes, tone marks and 'đ' ignored
+    assert _search(conn, "goi la") == [1]
+    assert _search(conn, "duc") == [2]
+    # Phone prefix, last digits, digits typed with separators
+    assert _search(conn, "09123") == [1]
+    assert _search(conn, "2637") == [1, 3]
+    assert _search(conn, "112 637") == [3]
+    assert _search(conn, "0000") == [2]
+    assert _search(conn, "4444") == []
@@ -0,0 +1,45 @@
+import logging
+
+import pandas as pd
+
+from trialhub import changeset, importer, schema
+
+
+def _trial(phone, trial_date="20/10/2026"):
+    return {'trial_date': trial_date, 'time': "19:00", 'phone': phone, 'subject': "Coding", 'status': "Chờ trial"}
+
+
+def _legacy_phones(conn, phones):
+    """Rows as the editor stored them before phones were normalized (no unique index)."""
+    with conn:
+        conn.execute("DROP INDEX ux_trials_phone_date")
+        conn.executemany("UPDATE trials SET phone = ? WHERE id = ?", [(p, i) for i, p in phones.items()])
+
+
+def test_migration_normalizes_phones_and_restores_unique_index(conn):
+    changeset.apply_changes(conn, added=[_trial("0900000001"), _trial("0900000002")])
+    _legacy_phones(conn, {1: "0900 000 001", 2: "0900.000.002"})
+
+    with conn:
+        schema._m015_normalized_phones(conn)
+    assert [r[0] for r in conn.execute("SELECT phone FROM trials ORDER BY id")] == ["0900000001", "0900000002"]
+    assert schema.phone_date_index_unique(conn)
+    # A later import dedupes against them
+    assert importer.bulk_insert_trials(conn, pd.DataFrame([_trial("0900 000 001")])) == (0, 1)
+
+
+def test_duplicate_keys_keep_a_plain_index_and_are_reported(conn, caplog):
+    changeset.apply_changes(conn, added=[_trial("0900000001"), _trial("0900000002"), _trial("0900000001", "21/10/2026")])
+    _legacy_phones(conn, {2: "0900 000 001"})
+
+    with caplog.at_level(logging.WARNING, logger=schema.__name__), conn:
+        schema._m015_normalized_phones(conn)
+    assert not schema.phone_date_index_unique(conn)
+    assert schema.duplicate_phone_dates(conn) == [("0900000001", "20/10/2026", 2)]
+    assert "not unique: 1 (phone, trial_date) keys" in caplog.text
+
+    # Merged duplicates: the index becomes unique again
+    changeset.apply_changes(conn, deleted=[2])
+    with conn:
+        assert schema.ensure_phone_date_index(conn)
+    assert schema.phone_date_index_unique(conn) and schema.duplicate_phone_dates(conn) == []
@@ -0,0 +1,37 @@
+from datetime import datetime
+
+import pandas as pd
+
+from trialhub import changeset, repository, styling
+from trialhub.trial_time import to_epoch
+
+NOW = datetime(2026, 10, 16, 18, 0)
+
+
+def _frame():
+    return pd.DataFrame({
+        'id': [1, 2, 3, 4, 5, 6],
+        'status': ['Gãy', 'Hủy lịch', 'Đã trial', 'Chờ trial', 'Chờ trial', 'Chờ trial'],
+        'trial_ts': [None, None, None, to_epoch(datetime(2026, 10, 16, 19, 0)), None, to_epoch(datetime(2026, 10, 20, 19, 0))],
+    }).set_index('id')
+
+
+def test_classify_trials_categories():
+    categories = styling.classify_trials(_frame(), NOW)
+    assert categories.tolist() == ['fail', 'cancel', 'done', 'urgent', 'normal', 'normal']
+
+
+def test_classify_trials_on_compact_export_frame(conn):
+    # Export frames carry trial_ts as nullable Int64; an unparseable date stores NULL
+    changeset.apply_changes(conn, added=[
+        {'trial_date': "16/10/2026", 'time': "19:00", 'phone': "0900000001", 'status': "Chờ trial"},
+        {'trial_date': "chưa rõ", 'time': "", 'phone': "0900000002", 'status': "Chờ trial"},
+        {'trial_date': "20/10/2026", 'time': "19:00", 'phone': "0900000003", 'status': "Gãy"},
+    ])
+    compact = repository.fetch_compact(conn, None, repository.EXPORT_COLUMNS, order_by="id")
+    assert compact['trial_ts'].dtype == 'Int64' and compact['trial_ts'].isna().any()
+
+    categories = styling.classify_trials(compact, NOW)
+    assert categories.tolist() == ['urgent', 'normal', 'fail']
+    full = repository.fetch_trials(conn, None, repository.EXPORT_COLUMNS, order_by="id")
+    assert categories.tolist() == styling.classify_trials(full, NOW).tolist()
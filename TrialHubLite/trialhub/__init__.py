@@ -0,0 +1,20 @@
+"""
+TrialHub core: everything the apps do with trial data, without Streamlit.
+
+    db, schema        SQLite connections (WAL, pooled) + migrations
+    repository        filters, queries, pagination, dashboard stats
+    changeset         batched edits with optimistic concurrency
+    codes             canonical status / subject codes
+    cleaning          vectorized cleaning of uploaded sheets
+    importer          upload reading, column mapping, bulk / streamed import
+    export            styled Excel export
+    styling           row classification (fail / cancel / done / urgent)
+    jobs              background jobs (imports, exports)
+    reminders         reminder events before upcoming trials (background thread)
+    backup            DB snapshots
+    trial_time        trial date / time parsing
+    profiling         timers, query/row counts and profile log of the hot paths
+
+streamlit_app.py, app.py, import_data.py and bench.py only call into
+these modules; importing them has no side effects (no DB is opened).
+"""
@@ -0,0 +1,80 @@
+"""
+Consistent DB snapshots via the SQLite online backup API.
+
+Snapshots are written to BACKUP_DIR (optionally gzip-compressed) and only
+the most recent `keep` files are retained.
+"""
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+from datetime import datetime
+
+BACKUP_DIR = "backups"
+DEFAULT_KEEP = 5
+_PREFIX = "trialhub_backup_"
+
+
+def create_snapshot(conn, backup_dir=BACKUP_DIR, compress=True, keep=DEFAULT_KEEP):
+    """
+    Copies the live DB behind `conn` into a new snapshot file.
+    The backup API copies a consistent state even while other connections
+    are writing. Returns the snapshot path.
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    name = f"{_PREFIX}{stamp}.db"
+
+    fd, tmp_path = tempfile.mkstemp(suffix=".db", dir=backup_dir)
+    os.close(fd)
+    try:
+        dest = sqlite3.connect(tmp_path)
+        try:
+            conn.backup(dest)
+        finally:
+            dest.close()
+
+        if compress:
+            name += ".gz"
+            final_path = os.path.join(backup_dir, name)
+            with open(tmp_path, "rb") as src, gzip.open(final_path, "wb") as out:
+                shutil.copyfileobj(src, out)
+            os.remove(tmp_path)
+        else:
+            final_path = os.path.join(backup_dir, name)
+            os.replace(tmp_path, final_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    prune_snapshots(backup_dir, keep)
+    return final_path
+
+
+def list_snapshots(backup_dir=BACKUP_DIR):
+    """Catalogue of snapshots, newest first: [{name, path, size, created}]."""
+    if not os.path.isdir(backup_dir):
+        return []
+    items = []
+    for name in os.listdir(backup_dir):
+        if not name.startswith(_PREFIX):
+            continue
+        path = os.path.join(backup_dir, name)
+        stat = os.stat(path)
+        items.append({
+            'name': name,
+            'path': path,
+            'size': stat.st_size,
+            'created': datetime.fromtimestamp(stat.st_mtime),
+        })
+    # Names embed the timestamp, so sorting by name is chronological
+    items.sort(key=lambda x: x['name'], reverse=True)
+    return items
+
+
+def prune_snapshots(backup_dir=BACKUP_DIR, keep=DEFAULT_KEEP):
+    """Deletes all but the `keep` newest snapshots."""
+    for item in list_snapshots(backup_dir)[keep:]:
+        os.remove(item['path'])
@@ -0,0 +1,146 @@
+"""
+Applies a data_editor change set (edits, added rows, deleted rows) in one
+write transaction.
+
+- Only EDITABLE_COLUMNS can be written; column names never come from the
+  editor state verbatim.
+- Updates are grouped by their set of changed columns, so a large grid edit
+  is one executemany per column set.
+- Each edited/deleted row carries the `version` it was loaded with. Rows
+  whose version moved on in the meantime (another user saved them) or that
+  no longer exist are reported as conflicts and left untouched.
+"""
+from datetime import datetime
+
+from . import codes
+from . import db
+from .importer import IMPORT_COLUMNS, IMPORT_DEFAULTS, normalize_phone_value
+from .trial_time import time_columns
+
+EDITABLE_COLUMNS = IMPORT_COLUMNS
+
+
+def _check_columns(columns):
+    unknown = set(columns) - set(EDITABLE_COLUMNS)
+    if unknown:
+        raise ValueError(f"Columns not editable: {', '.join(sorted(map(str, unknown)))}")
+
+
+def _current_rows(cursor, ids):
+    """{id: (version, trial_date, time)} for the ids that still exist."""
+    current = {}
+    ids = list(ids)
+    # Stay under SQLite's bound-parameter limit
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        placeholders = ", ".join("?" * len(chunk))
+        for row_id, version, trial_date, time in cursor.execute(
+            f"SELECT id, version, trial_date, time FROM trials WHERE id IN ({placeholders})", chunk
+        ):
+            current[row_id] = (version, trial_date, time)
+    return current
+
+
+def _with_normalized_phone(values):
+    if 'phone' not in values:
+        return values
+    return {**values, 'phone': normalize_phone_value(values['phone'])}
+
+
+def apply_changes(conn, edited=None, added=None, deleted=None, versions=None):
+    """
+    edited:   {id: {column: value}}
+    added:    [{column: value}] - new rows (blank rows are ignored)
+    deleted:  [id]
+    versions: {id: version the row had when it was loaded}; rows missing here
+              are written without a version check.
+    Returns {'updated', 'inserted', 'deleted': counts, 'conflicts': [id]}.
+    Raises sqlite3.IntegrityError (nothing is written) when an edit or insert
+    collides on (phone, trial_date).
+    """
+    edited = {int(k): v for k, v in (edited or {}).items() if v}
+    added = [row for row in (added or []) if any(v not in (None, '') for v in row.values())]
+    deleted = [int(i) for i in (deleted or [])]
+    versions = {int(k): v for k, v in (versions or {}).items()}
+    # A deleted row's pending edits are moot
+    for row_id in deleted:
+        edited.pop(row_id, None)
+
+    for changes in edited.values():
+        _check_columns(changes)
+    for row in added:
+        _check_columns(row)
+    # Same phone text as imports, so the (phone, trial_date) key matches them
+    edited = {k: _with_normalized_phone(v) for k, v in edited.items()}
+    added = [_with_normalized_phone(row) for row in added]
+
+    result = {'updated': 0, 'inserted': 0, 'deleted': 0, 'conflicts': []}
+    stamp = datetime.now().isoformat(timespec='seconds')
+
+    with db.write_transaction(conn):
+        cursor = conn.cursor()
+        # Checked under the write lock: nobody can commit in between
+        current = _current_rows(cursor, list(edited) + deleted)
+
+        def stale(row_id):
+            if row_id not in current:
+                return True
+            return row_id in versions and versions[row_id] != current[row_id][0]
+
+        # --- Updates, one executemany per column set ---
+        groups = {}
+        for row_id, changes in edited.items():
+            if stale(row_id):
+                result['conflicts'].append(row_id)
+                continue
+            columns = tuple(c for c in EDITABLE_COLUMNS if c in changes)
+            values = [changes[c] for c in columns]
+            if 'trial_date' in changes or 'time' in changes:
+                _, trial_date, time = current[row_id]
+                columns += ('trial_day', 'trial_ts')
+                values += time_columns(changes.get('trial_date', trial_date), changes.get('time', time))
+            if 'status' in changes:
+                columns += ('status_code',)
+                values.append(codes.status_code(changes['status']))
+            if 'subject' in changes:
+                columns += ('subject_code',)
+                values.append(codes.subject_code(changes['subject']))
+            groups.setdefault(columns, []).append((*values, stamp, row_id))
+
+        for columns, params in groups.items():
+            assignments = ", ".join(f"{c} = ?" for c in columns)
+            cursor.executemany(
+                f"UPDATE trials SET {assignments}, version = version + 1, updated_at = ? WHERE id = ?",
+                params
+            )
+            result['updated'] += len(params)
+
+        # --- Deletes ---
+        delete_ids = []
+        for row_id in deleted:
+            if stale(row_id):
+                result['conflicts'].append(row_id)
+            else:
+                delete_ids.append((row_id,))
+        cursor.executemany("DELETE FROM trials WHERE id = ?", delete_ids)
+        result['deleted'] = len(delete_ids)
+
+        # --- Inserts ---
+        if added:
+            columns = EDITABLE_COLUMNS + ['trial_day', 'trial_ts', 'status_code', 'subject_code']
+            rows = []
+            for row in added:
+                row = {c: row.get(c, IMPORT_DEFAULTS.get(c)) for c in EDITABLE_COLUMNS}
+                rows.append((
+                    *row.values(),
+                    *time_columns(row['trial_date'], row['time']),
+                    codes.status_code(row['status']),
+                    codes.subject_code(row['subject']),
+                ))
+            cursor.executemany(
+                f"INSERT INTO trials ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                rows
+            )
+            result['inserted'] = len(rows)
+
+    return result
@@ -0,0 +1,129 @@
+"""
+Cleaning pipeline for uploaded trial sheets (preview + import).
+
+Every stage works on whole columns (vectorized string ops, patterns
+compiled once). Cells filled automatically (trial_date forward-fill) are
+reported in a boolean mask frame instead of per-row lists.
+
+    df, filled, timings = clean(df_raw, {'phone': 'SĐT', ...})
+"""
+import re
+import time
+
+import pandas as pd
+
+# Text the old astype(str) produced for missing values
+NA_TEXT = ['nan', 'NaN', 'None', '<NA>']
+
+JUNK = ["TIỀN", "TIEN", "CHƯA GỬI ZALO", "CHUA GUI ZALO", "CHƯA GỬI", "CHUA GUI"]
+JUNK_RE = re.compile('|'.join(map(re.escape, JUNK)), re.IGNORECASE)
+
+# '19h30', '19g30', '19.30' -> '19:30'
+TIME_SEPARATOR_RE = re.compile(r'[hg.]')
+
+PEOPLE_COLUMNS = ['creator', 'evaluator']
+TEXT_COLUMNS = ['note', 'subject', 'status', 'meet_link']
+# Columns that can be auto-filled (and are highlighted in the preview)
+FILLED_COLUMNS = ['trial_date']
+
+
+def _text(series):
+    return series.astype(str).replace(NA_TEXT, '')
+
+
+def _per_value(series, func):
+    """Runs the vectorized `func` on the distinct values only and maps back
+    (sheet columns repeat a handful of names, statuses, times...)."""
+    codes, uniques = pd.factorize(series)
+    cleaned = func(pd.Series(uniques, dtype=object)).to_numpy()
+    return pd.Series(cleaned[codes], index=series.index)
+
+
+def clean_people(df):
+    """Creator & evaluator: no ffill, junk markers ('TIỀN', 'CHƯA GỬI'...) removed."""
+    for col in PEOPLE_COLUMNS:
+        if col in df.columns:
+            df[col] = _per_value(_text(df[col]), lambda s: s.str.replace(JUNK_RE, '', regex=True).str.strip())
+
+
+def clean_dates(df, filled, state=None):
+    """
+    trial_date: blanks are forward-filled (merged cells) and marked in `filled`,
+    then normalized to dd/mm/yyyy ('' when unparseable).
+    `state` carries the last date over to the next chunk of a streamed file.
+    """
+    if 'trial_date' not in df.columns:
+        return
+    raw = df['trial_date'].astype(str).replace(NA_TEXT[:3] + [''], pd.NA)
+    empty = raw.isna()
+    raw = raw.ffill()
+    if state is not None:
+        if state.get('last_date') is not None:
+            raw = raw.fillna(state['last_date'])
+        if raw.notna().any():
+            state['last_date'] = raw.iloc[-1]
+    filled.loc[empty & raw.notna(), 'trial_date'] = True
+
+    # Parse each distinct value once (same format inference: first value decides)
+    raw = raw.fillna('')
+    uniques = pd.Series(raw.unique())
+    parsed = pd.to_datetime(uniques, dayfirst=True, errors='coerce').dt.strftime("%d/%m/%Y").fillna('')
+    df['trial_date'] = raw.map(dict(zip(uniques, parsed)))
+
+
+def clean_text(df):
+    for col in TEXT_COLUMNS:
+        if col in df.columns:
+            df[col] = _per_value(_text(df[col]), lambda s: s.str.strip())
+
+
+def _clean_time_values(s):
+    s = s.str.lower().str.strip()
+    missing = s.isin(['nan', 'none', ''])
+    s = s.str.replace(TIME_SEPARATOR_RE, ':', regex=True)
+    hour_only = (s.str.len() <= 2) & s.str.isdigit()
+    s = s.where(~hour_only, s.str.zfill(2) + ':00')
+    return s.where(~missing, '')
+
+
+def clean_times(df):
+    """'19h', '7', '19g30' -> '19:00', '07:00', '19:30'."""
+    if 'time' not in df.columns:
+        return
+    df['time'] = _per_value(df['time'].astype(str), _clean_time_values)
+
+
+def drop_without_phone(df, filled):
+    """Phone is required."""
+    if 'phone' not in df.columns:
+        return df, filled
+    keep = df['phone'].astype(str).str.strip() != ''
+    return df[keep], filled[keep]
+
+
+def clean(df_raw, mappings, state=None):
+    """
+    Applies the column mapping {db_col: file_col} and cleans the values.
+    Pass the same `state` dict for every chunk of one file so forward-fills
+    continue across chunk boundaries.
+    Returns (df, filled mask frame, {stage: seconds}).
+    """
+    timings = {}
+
+    def timed(stage, func, *args):
+        t0 = time.perf_counter()
+        out = func(*args)
+        timings[stage] = time.perf_counter() - t0
+        return out
+
+    # rename() returns a new frame, df_raw is left untouched
+    df = timed('map', lambda: df_raw.rename(columns={v: k for k, v in mappings.items()}))
+    filled = pd.DataFrame(False, index=df.index, columns=FILLED_COLUMNS)
+
+    timed('people', clean_people, df)
+    timed('dates', clean_dates, df, filled, state)
+    timed('text', clean_text, df)
+    timed('time', clean_times, df)
+    df, filled = timed('phone', drop_without_phone, df, filled)
+
+    return df, filled, timings
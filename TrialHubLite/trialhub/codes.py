@@ -0,0 +1,105 @@
+"""
+Canonical codes for the free-text `status` and `subject` columns.
+
+Raw text ('Gãy', 'Hủy lịch', 'Done', 'coding '...) is mapped once to a small
+integer code; the code is stored next to the text (status_code /
+subject_code) and mirrored in the trial_status / trial_subject lookup
+tables. Filters and metrics compare codes instead of matching substrings.
+"""
+import unicodedata
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Status codes (order = precedence when a text matches several rules)
+STATUS_OTHER = 0
+STATUS_WAITING = 1
+STATUS_CONFIRMED = 2
+STATUS_DONE = 3
+STATUS_FAIL = 4
+STATUS_CANCEL = 5
+STATUS_RESCHEDULE = 6
+
+# code -> (name, display label)
+STATUSES = {
+    STATUS_OTHER: ('other', 'Khác'),
+    STATUS_WAITING: ('waiting', 'Chờ trial'),
+    STATUS_CONFIRMED: ('confirmed', 'Đã confirm'),
+    STATUS_DONE: ('done', 'Đã trial'),
+    STATUS_FAIL: ('fail', 'Gãy'),
+    STATUS_CANCEL: ('cancel', 'Hủy lịch'),
+    STATUS_RESCHEDULE: ('reschedule', 'Reschedule'),
+}
+
+# First matching rule wins (same priority as the old row colors: fail > cancel > done)
+_STATUS_RULES = [
+    (STATUS_FAIL, ('gãy', 'gáy')),
+    (STATUS_CANCEL, ('hủy', 'huỷ')),
+    (STATUS_DONE, ('đã trial', 'thích', 'done')),
+    (STATUS_RESCHEDULE, ('reschedule', 'dời')),
+    (STATUS_WAITING, ('chờ', 'chưa confirm')),
+    (STATUS_CONFIRMED, ('confirm',)),
+]
+
+SUBJECT_OTHER = 0
+SUBJECT_CODING = 1
+SUBJECT_ART = 2
+SUBJECT_ROBOTICS = 3
+
+SUBJECTS = {
+    SUBJECT_OTHER: ('other', 'Khác'),
+    SUBJECT_CODING: ('coding', 'Coding'),
+    SUBJECT_ART: ('art', 'Art'),
+    SUBJECT_ROBOTICS: ('robotics', 'Robotics'),
+}
+
+_SUBJECT_RULES = [
+    (SUBJECT_CODING, ('coding',)),
+    (SUBJECT_ART, ('art',)),
+    (SUBJECT_ROBOTICS, ('robot',)),
+]
+
+
+def _fold(text):
+    # NFC: tone marks typed as combining characters compare equal
+    if text is None or (isinstance(text, float) and np.isnan(text)):
+        return ''
+    return unicodedata.normalize('NFC', str(text)).strip().lower()
+
+
+def _match(rules, default, text):
+    folded = _fold(text)
+    for code, needles in rules:
+        if any(n in folded for n in needles):
+            return code
+    return default
+
+
+@lru_cache(maxsize=4096)
+def status_code(text):
+    """Canonical status code of a raw status text."""
+    return _match(_STATUS_RULES, STATUS_OTHER, text)
+
+
+@lru_cache(maxsize=4096)
+def subject_code(text):
+    """Canonical subject code of a raw subject text."""
+    return _match(_SUBJECT_RULES, SUBJECT_OTHER, text)
+
+
+def _codes(series, func, default):
+    # Each distinct text is mapped once, rows just index into the result
+    cat = pd.Categorical(series.astype('string').fillna(''))
+    lookup = np.array([func(c) for c in cat.categories] + [default], dtype='int8')
+    return pd.Series(lookup[cat.codes], index=series.index)
+
+
+def status_codes(series):
+    """Vectorized status_code() -> int8 Series aligned with `series`."""
+    return _codes(series, status_code, STATUS_OTHER)
+
+
+def subject_codes(series):
+    """Vectorized subject_code() -> int8 Series aligned with `series`."""
+    return _codes(series, subject_code, SUBJECT_OTHER)
@@ -0,0 +1,101 @@
+"""
+Excel export of the (filtered) trials list.
+
+Uses openpyxl's write-only mode: rows are streamed to the worksheet one by
+one instead of building a full styled workbook in memory. The rows come
+from a compact frame (repository.fetch_compact) and are turned into Python
+values one block at a time.
+"""
+import io
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill
+
+from . import profiling
+from . import repository
+from . import styling
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+PROGRESS_EVERY = 1000
+
+# Same colors as styling.CATEGORY_STYLES
+_FILLS = {
+    'fail': PatternFill(fill_type='solid', fgColor='FECACA'),
+    'cancel': PatternFill(fill_type='solid', fgColor='F3F4F6'),
+    'done': PatternFill(fill_type='solid', fgColor='D1FAE5'),
+    'urgent': PatternFill(fill_type='solid', fgColor='FFEDD5'),
+}
+_FONTS = {
+    'cancel': Font(color='9CA3AF'),
+}
+_HEADER_FONT = Font(bold=True)
+
+
+def write_xlsx(df, categories, dest, progress=None):
+    """
+    Streams df to an .xlsx file, each row filled by its category.
+    dest: path or binary file object.
+    progress: optional callback(rows_written, total), called every PROGRESS_EVERY rows.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Trials")
+
+    header = []
+    for col in df.columns:
+        cell = WriteOnlyCell(ws, value=str(col))
+        cell.font = _HEADER_FONT
+        header.append(cell)
+    ws.append(header)
+
+    total = len(df)
+    categories = list(categories)
+    for start in range(0, total, PROGRESS_EVERY):
+        if progress is not None:
+            progress(start, total)
+        # NaN/NA -> empty cells, for this block only
+        block = df.iloc[start:start + PROGRESS_EVERY]
+        block = block.astype(object).where(block.notna(), None)
+        for category, values in zip(categories[start:start + PROGRESS_EVERY], block.itertuples(index=False, name=None)):
+            fill = _FILLS.get(category)
+            font = _FONTS.get(category)
+            if fill is None:
+                ws.append(list(values))
+                continue
+            row = []
+            for value in values:
+                cell = WriteOnlyCell(ws, value=value)
+                cell.fill = fill
+                if font is not None:
+                    cell.font = font
+                row.append(cell)
+            ws.append(row)
+
+    wb.save(dest)
+
+
+def _export_frame(conn, filters, now):
+    with profiling.timer('export.query'):
+        df = repository.fetch_compact(conn, filters, repository.EXPORT_COLUMNS)
+    with profiling.timer('export.styling'):
+        categories = styling.classify_trials(df, now)
+    return df.drop(columns=repository.STYLE_COLUMNS), categories
+
+
+def export_trials_xlsx(conn, filters, now):
+    """Queries the filtered trials and returns the styled workbook as bytes."""
+    df, categories = _export_frame(conn, filters, now)
+    buffer = io.BytesIO()
+    with profiling.timer('export.write'):
+        write_xlsx(df, categories, buffer)
+    return buffer.getvalue()
+
+
+def run_export(conn, report, filters, now, dest):
+    """Job body: writes the filtered export to `dest`. Returns {'rows', 'path'}."""
+    report(0, None, "Đang truy vấn dữ liệu...")
+    df, categories = _export_frame(conn, filters, now)
+    with profiling.timer('export.write'):
+        write_xlsx(df, categories, dest, progress=lambda done, total: report(done, total, "Đang ghi file Excel..."))
+    report(len(df), len(df), "Hoàn tất")
+    return {'rows': len(df), 'path': dest}
@@ -0,0 +1,389 @@
+"""
+Reading of uploaded trial files + bulk import of cleaned rows into SQLite.
+
+Uploads are parsed once into raw rows; the header is detected from the
+first buffered rows and the frame is built from the same data.
+
+Rows are loaded into a temp staging table with one executemany, then merged
+into `trials` with a single set-based INSERT ... SELECT that skips
+(phone, trial_date) pairs already in the DB or repeated in the file.
+Everything runs in one write transaction (db.write_transaction).
+From the app, cleaning + insert run as a background job (run_import).
+Large files are streamed in chunks instead (run_streaming_import), so memory
+stays bounded by the chunk size rather than the file size.
+"""
+import csv
+import hashlib
+import io
+import json
+import time
+from itertools import islice
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from . import cleaning
+from . import codes
+from . import db
+from . import profiling
+from .trial_time import time_columns
+
+IMPORT_COLUMNS = [
+    'stt', 'trial_date', 'time', 'meet_link', 'subject',
+    'phone', 'status', 'note', 'evaluator', 'creator'
+]
+# Used when the file has no column mapped to the field
+IMPORT_DEFAULTS = {'status': 'Chờ trial'}
+
+DB_COLUMNS = IMPORT_COLUMNS + ['trial_day', 'trial_ts', 'status_code', 'subject_code']
+
+# Header row must be found within the first rows of the file
+HEADER_SCAN_ROWS = 20
+
+# Large uploads are imported in chunks (streaming mode) above this size
+STREAM_THRESHOLD_BYTES = 10 * 1024 * 1024
+CHUNK_ROWS = 20000
+PREVIEW_ROWS = 1000
+
+# Column auto-mapping: keywords per DB column, in priority order
+MAPPING_KEYWORDS = {
+    'stt': ['stt', 'số thứ tự', 'no.'],
+    'trial_date': ['ngày trial', 'ngày', 'date', 'day'],
+    'time': ['thời gian', 'time', 'giờ'],
+    'meet_link': ['link trial', 'meet link', 'link', 'meet', 'zoom', 'url'],
+    'subject': ['môn học', 'môn', 'subject', 'lớp', 'class'],
+    'phone': ['số điện thoại', 'sđt', 'phone', 'tel', 'mobile', 'hotline'],
+    'status': ['tình trạng', 'status', 'trạng thái', 'kết quả'],
+    'note': ['ghi chú', 'note', 'nhận xét', 'comment', 'lý do'],
+    'evaluator': ['phụ trách đánh giá', 'phụ trách', 'người đánh giá', 'evaluator', 'gv', 'giáo viên', 'đánh giá'],
+    'creator': ['người tạo', 'tvv', 'creator', 'nguoi tao', 'sale', 'tư vấn viên']
+}
+
+
+# --- Reading uploads ---
+def _cell_text(value):
+    """Cell value as text, like pandas dtype=str (keeps leading '0' of phones)."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value if value != '' else None
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _iter_csv_rows(fileobj):
+    # Decoded incrementally: the file is never held as one big str
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', errors='replace', newline='')
+    try:
+        for row in csv.reader(text):
+            yield [_cell_text(v) for v in row]
+    finally:
+        # Leave the underlying (uploaded) file open
+        text.detach()
+
+
+def _iter_xlsx_rows(fileobj):
+    # read_only streams the sheet XML instead of building the whole workbook
+    wb = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        for row in ws.iter_rows(values_only=True):
+            yield [_cell_text(v) for v in row]
+    finally:
+        wb.close()
+
+
+def iter_upload_rows(uploaded_file):
+    """Yields the raw rows (lists of text/None) of an uploaded .csv or .xlsx."""
+    uploaded_file.seek(0)
+    if uploaded_file.name.endswith('.csv'):
+        return _iter_csv_rows(uploaded_file)
+    return _iter_xlsx_rows(uploaded_file)
+
+
+def detect_header(rows):
+    """
+    Index of the header row: must have an STT column ('stt' / 'số thứ tự' / 'no.')
+    and a phone column ('phone' / 'sđt' / 'số điện thoại'). Defaults to 0.
+    """
+    for i, row in enumerate(rows[:HEADER_SCAN_ROWS]):
+        cells = [str(c).strip().lower() for c in row if c is not None]
+        has_stt = any(c == 'stt' or 'số thứ tự' in c or 'no.' in c for c in cells)
+        has_phone = any('phone' in c or 'sđt' in c or 'số điện thoại' in c for c in cells)
+        if has_stt and has_phone:
+            return i
+    return 0
+
+
+def header_names(header, width):
+    """Stripped, deduplicated column names ('Note', 'Note.1'...)."""
+    names = []
+    counts = {}
+    for i in range(width):
+        value = header[i] if i < len(header) else None
+        c = str(value).strip() if value is not None else f"Unnamed: {i}"
+        if c in counts:
+            counts[c] += 1
+            names.append(f"{c}.{counts[c]}")
+        else:
+            counts[c] = 0
+            names.append(c)
+    return names
+
+
+def read_upload(uploaded_file):
+    """
+    Single-pass read of an uploaded file.
+    Returns (df with detected header, {stage: seconds}).
+    """
+    timings = {}
+    t0 = time.perf_counter()
+    rows = list(iter_upload_rows(uploaded_file))
+    timings['read'] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    header_idx = detect_header(rows)
+    timings['header'] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    body = [r for r in rows[header_idx + 1:] if any(v is not None for v in r)]
+    width = max([len(rows[header_idx]) if rows else 0] + [len(r) for r in body])
+    columns = header_names(rows[header_idx] if rows else [], width)
+    body = [r + [None] * (width - len(r)) for r in body]
+    df = pd.DataFrame(body, columns=columns, dtype=object)
+    timings['frame'] = time.perf_counter() - t0
+
+    return df, timings
+
+
+def identify_column_mapping(columns):
+    """
+    Auto-detects the mapping of file columns onto DB columns
+    (exact keyword match first, then contains). Returns {db_col: file_col}.
+    """
+    names = [(col, str(col).lower().strip()) for col in columns]
+
+    def get_match(targets):
+        for col, name in names:
+            if name in targets:
+                return col
+        for col, name in names:
+            if any(t in name for t in targets):
+                return col
+        return None
+
+    col_map = {}
+    for db_col, keywords in MAPPING_KEYWORDS.items():
+        match = get_match(keywords)
+        if match:
+            col_map[db_col] = match
+    return col_map
+
+
+# --- Streaming (large files) ---
+def _frame(rows, columns):
+    width = len(columns)
+    body = [(r + [None] * (width - len(r)))[:width] for r in rows if any(v is not None for v in r)]
+    return pd.DataFrame(body, columns=columns, dtype=object)
+
+
+def iter_upload_frames(uploaded_file, chunk_rows=CHUNK_ROWS):
+    """
+    Streams an upload as frames of at most `chunk_rows` rows (header detected
+    in the first rows, like read_upload). Only one chunk is held at a time.
+    Columns past the header's width are dropped.
+    """
+    rows = iter_upload_rows(uploaded_file)
+    head = list(islice(rows, HEADER_SCAN_ROWS))
+    if not head:
+        return
+    header_idx = detect_header(head)
+    columns = header_names(head[header_idx], len(head[header_idx]))
+
+    chunk = head[header_idx + 1:]
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_rows:
+            yield _frame(chunk, columns)
+            chunk = []
+    if chunk:
+        yield _frame(chunk, columns)
+
+
+def read_upload_head(uploaded_file, rows=PREVIEW_ROWS):
+    """First `rows` data rows of a large upload (for the mapping UI / preview)."""
+    return next(iter_upload_frames(uploaded_file, rows), pd.DataFrame())
+
+
+def estimate_rows(uploaded_file):
+    """Approximate number of data rows (progress total); None if unknown."""
+    uploaded_file.seek(0)
+    if uploaded_file.name.endswith('.csv'):
+        return sum(block.count(b'\n') for block in iter(lambda: uploaded_file.read(1 << 20), b''))
+    wb = load_workbook(uploaded_file, read_only=True)
+    try:
+        return wb.worksheets[0].max_row
+    finally:
+        wb.close()
+
+
+def normalize_phone(series):
+    """Phone text as stored/deduped: no spaces/dots/dashes, no '.0' float tail."""
+    s = series.astype('string').fillna('').str.strip()
+    s = s.str.replace(r'\.0$', '', regex=True)
+    return s.str.replace(r'[\s.\-]', '', regex=True)
+
+
+def normalize_phone_value(value):
+    """normalize_phone() for one value (editor/form input); missing stays missing."""
+    if value is None or pd.isna(value):
+        return value
+    return normalize_phone(pd.Series([value], dtype=object)).iloc[0]
+
+
+def prepare_rows(df):
+    """
+    Maps a cleaned import frame onto the DB columns.
+    Returns (frame ready to insert, number of rows dropped for missing phone/date).
+    """
+    out = pd.DataFrame(index=df.index)
+    for col in IMPORT_COLUMNS:
+        if col in df.columns:
+            out[col] = df[col]
+        else:
+            out[col] = IMPORT_DEFAULTS.get(col, '')
+
+    out['phone'] = normalize_phone(out['phone'])
+    out['trial_date'] = out['trial_date'].astype('string').fillna('').str.strip()
+
+    valid = (out['phone'] != '') & (out['trial_date'] != '')
+    out = out[valid]
+
+    times = [time_columns(d, t) for d, t in zip(out['trial_date'], out['time'])]
+    out['trial_day'] = [d for d, _ in times]
+    out['trial_ts'] = [ts for _, ts in times]
+    out['status_code'] = codes.status_codes(out['status'])
+    out['subject_code'] = codes.subject_codes(out['subject'])
+
+    # NaN/NA -> NULL
+    out = out.astype(object).where(out.notna(), None)
+    return out, int((~valid).sum())
+
+
+def stage_rows(cursor, rows, columns):
+    """(Re)creates temp.import_staging with `columns` and loads `rows` into it."""
+    cols = ", ".join(columns)
+    placeholders = ", ".join("?" * len(columns))
+    cursor.execute("DROP TABLE IF EXISTS temp.import_staging")
+    cursor.execute(f"CREATE TEMP TABLE import_staging ({cols})")
+    cursor.executemany(
+        f"INSERT INTO temp.import_staging ({cols}) VALUES ({placeholders})",
+        rows[columns].itertuples(index=False, name=None)
+    )
+
+
+def merge_staged(cursor, columns):
+    """
+    Inserts staged rows whose (phone, trial_date) is new - first occurrence
+    per key wins. Returns the number of inserted rows.
+    """
+    cols = ", ".join(columns)
+    cursor.execute(f"""
+        INSERT INTO trials ({cols})
+        SELECT {cols} FROM temp.import_staging s
+        WHERE s.rowid IN (
+            SELECT MIN(rowid) FROM temp.import_staging GROUP BY phone, trial_date
+        )
+        AND NOT EXISTS (
+            SELECT 1 FROM trials t
+            WHERE t.phone = s.phone AND t.trial_date = s.trial_date
+              AND t.phone <> '' AND t.trial_date <> ''
+        )
+    """)
+    return cursor.rowcount
+
+
+def bulk_insert_trials(conn, df):
+    """
+    Inserts the cleaned rows of df, skipping duplicates on (phone, trial_date).
+    Returns (inserted, skipped) - skipped includes rows missing phone/date.
+    """
+    rows, missing = prepare_rows(df)
+
+    with db.write_transaction(conn):
+        cursor = conn.cursor()
+        stage_rows(cursor, rows, DB_COLUMNS)
+        inserted = merge_staged(cursor, DB_COLUMNS)
+        cursor.execute("DROP TABLE IF EXISTS temp.import_staging")
+
+    return inserted, missing + (len(rows) - inserted)
+
+
+# --- Background import (jobs.py) ---
+def upload_key(df_raw, mappings):
+    """Idempotency key of an import: content of the uploaded rows + mapping."""
+    digest = hashlib.sha1(pd.util.hash_pandas_object(df_raw.astype(str), index=False).values.tobytes())
+    digest.update(json.dumps(mappings, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def stream_key(data, mappings):
+    """Idempotency key of a streamed import: file bytes + mapping."""
+    digest = hashlib.sha1(data)
+    digest.update(json.dumps(mappings, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def is_large(uploaded_file):
+    """Large uploads are previewed from their first rows and imported in chunks."""
+    return uploaded_file.size > STREAM_THRESHOLD_BYTES
+
+
+def run_import(conn, report, df_raw, mappings):
+    """
+    Job body: cleans the mapped upload and inserts it.
+    Returns {'rows', 'inserted', 'skipped'}.
+    """
+    report(0, len(df_raw), "Đang làm sạch dữ liệu...")
+    with profiling.timer('import.clean'):
+        df, _, _ = cleaning.clean(df_raw, mappings)
+    report(0, len(df), "Đang ghi vào DB...")
+    with profiling.timer('import.insert'):
+        inserted, skipped = bulk_insert_trials(conn, df)
+    report(len(df), len(df), "Hoàn tất")
+    return {'rows': len(df), 'inserted': inserted, 'skipped': skipped}
+
+
+def run_streaming_import(conn, report, data, name, mappings, chunk_rows=CHUNK_ROWS):
+    """
+    Job body for large files: read -> clean -> insert one chunk at a time,
+    each chunk in its own write transaction. trial_date forward-fill carries
+    over chunk boundaries. Re-running is safe: rows already in the DB are
+    skipped by the (phone, trial_date) dedupe.
+    Returns {'rows', 'inserted', 'skipped', 'chunks'}.
+    """
+    upload = io.BytesIO(data)
+    upload.name = name
+    total = estimate_rows(upload)
+    state = {}
+    result = {'rows': 0, 'inserted': 0, 'skipped': 0, 'chunks': 0}
+    read = 0
+    chunks = iter_upload_frames(upload, chunk_rows)
+    while True:
+        with profiling.timer('import.read'):
+            chunk = next(chunks, None)
+        if chunk is None:
+            break
+        read += len(chunk)
+        with profiling.timer('import.clean'):
+            df, _, _ = cleaning.clean(chunk, mappings, state)
+        with profiling.timer('import.insert'):
+            inserted, skipped = bulk_insert_trials(conn, df)
+        result['rows'] += len(df)
+        result['inserted'] += inserted
+        result['skipped'] += skipped
+        result['chunks'] += 1
+        report(read, max(total or 0, read), f"Đã import {result['inserted']} dòng ({result['chunks']} phần)...")
+    report(read, read, "Hoàn tất")
+    return result
@@ -0,0 +1,222 @@
+"""
+Background jobs (imports, Excel exports) off the Streamlit script thread.
+
+Jobs run on a small thread pool; their state lives in the `jobs` table so
+any session (or a reloaded page) can poll it. A job id is derived from its
+kind + an idempotency key (content hash of the input), so submitting the
+same work twice returns the existing job instead of running it again; a
+finished job is run again when its output file is gone or on request
+(force=True).
+Each job records the process that runs it. Jobs left queued/running by a
+process that is gone (server restart) are marked failed and can simply be
+submitted again; jobs of other live processes are left alone.
+"""
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from . import db
+from . import profiling
+
+JOBS_DIR = "jobs"
+MAX_WORKERS = 2
+# Progress writes are throttled to this interval (the final one always goes through)
+PROGRESS_INTERVAL = 0.3
+
+JOB_COLUMNS = [
+    'id', 'kind', 'label', 'status', 'progress', 'rows_done', 'rows_total',
+    'message', 'result', 'created_at', 'updated_at', 'owner'
+]
+
+# host:pid:token of this process (the token tells a restarted process that
+# got the same pid, e.g. in a container, from the one that died)
+_HOST = socket.gethostname()
+OWNER = f"{_HOST}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+def job_id(kind, key):
+    """Stable id of the job doing `kind` on input `key`."""
+    return hashlib.sha1(f"{kind}\x1f{key}".encode('utf-8')).hexdigest()[:16]
+
+
+def output_path(job, suffix):
+    """File a job writes its output to (under JOBS_DIR)."""
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    return os.path.join(JOBS_DIR, f"{job}{suffix}")
+
+
+def owner_alive(owner):
+    """Whether the process that owns a job is still running."""
+    if owner == OWNER:
+        return True
+    try:
+        host, pid, _ = owner.split(":")
+        pid = int(pid)
+    except (AttributeError, ValueError):
+        # Jobs from before owners were recorded
+        return False
+    if host != _HOST:
+        # Cannot probe another machine: leave its jobs alone
+        return True
+    if pid == os.getpid() or os.name != 'posix':
+        # Same pid, other token: a previous run of this process. (No cheap
+        # probe off POSIX: treat the owner as gone, like a single server.)
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def fail_orphans(conn):
+    """Marks failed the queued/running jobs whose process is gone. Returns their ids."""
+    rows = conn.execute("SELECT id, owner FROM jobs WHERE status IN ('queued', 'running')").fetchall()
+    orphans = [jid for jid, owner in rows if not owner_alive(owner)]
+    if orphans:
+        stamp = _now()
+        with db.write_transaction(conn):
+            conn.executemany("""
+                UPDATE jobs SET status = 'failed', message = 'Bị gián đoạn (server khởi động lại)', updated_at = ?
+                WHERE id = ? AND status IN ('queued', 'running')
+            """, [(stamp, jid) for jid in orphans])
+    return orphans
+
+
+def start(db_path=db.DB_PATH):
+    """Starts the worker pool once per process (and fails orphaned jobs)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            fail_orphans(db.get_connection(db_path))
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="trialhub-job")
+        return _executor
+
+
+def _update(conn, jid, **fields):
+    fields['updated_at'] = _now()
+    assignments = ", ".join(f"{k} = ?" for k in fields)
+    with db.write_transaction(conn):
+        conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", [*fields.values(), jid])
+
+
+def _run(jid, fn, args, db_path):
+    conn = db.get_connection(db_path)
+    last = [0.0]
+
+    def report(done, total=None, message=None):
+        """Progress callback handed to the job: rows done / total + stage text."""
+        now = time.monotonic()
+        if now - last[0] < PROGRESS_INTERVAL and (total is None or done < total):
+            return
+        last[0] = now
+        fields = {'rows_done': int(done)}
+        if total:
+            fields['rows_total'] = int(total)
+            fields['progress'] = min(done / total, 1.0)
+        if message:
+            fields['message'] = message
+        _update(conn, jid, **fields)
+
+    # Statements are not counted in jobs: the trace callback slows bulk inserts
+    run = profiling.start_run('job', count_queries=False, job=jid, fn=fn.__name__)
+    try:
+        _update(conn, jid, status='running')
+        result = fn(conn, report, *args)
+        _update(conn, jid, status='done', progress=1.0, result=json.dumps(result, default=str))
+    except Exception as e:
+        _update(conn, jid, status='failed', message=str(e))
+    finally:
+        profiling.finish_run(run)
+
+
+def _reusable(job, force):
+    """Whether `job` can stand for a new submission of the same work."""
+    if job is None or job['status'] == 'failed':
+        return False
+    if is_active(job):
+        # Still running somewhere (a dead owner's job is an orphan, run it again)
+        return owner_alive(job['owner'])
+    if force:
+        return False
+    # Finished: only while its output is still there
+    result = job['result'] if isinstance(job['result'], dict) else {}
+    return 'path' not in result or os.path.exists(result['path'])
+
+
+def submit(kind, key, fn, *args, label='', force=False, db_path=db.DB_PATH):
+    """
+    Runs fn(conn, report, *args) in the background; returns the job id.
+    An existing job with the same kind + key is reused while it runs, and
+    once done while its result['path'] (if any) exists, unless `force`.
+    """
+    executor = start(db_path)
+    jid = job_id(kind, key)
+    conn = db.get_connection(db_path)
+    with db.write_transaction(conn):
+        if _reusable(get(conn, jid), force):
+            return jid
+        stamp = _now()
+        conn.execute("""
+            INSERT OR REPLACE INTO jobs (id, kind, label, status, progress, rows_done, rows_total, message, result, created_at, updated_at, owner)
+            VALUES (?, ?, ?, 'queued', 0, 0, NULL, NULL, NULL, ?, ?, ?)
+        """, (jid, kind, label, stamp, stamp, OWNER))
+    executor.submit(_run, jid, fn, args, db_path)
+    return jid
+
+
+def _as_dict(row):
+    job = dict(zip(JOB_COLUMNS, row))
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+
+def get(conn, jid):
+    """The job as a dict (result decoded), or None."""
+    row = conn.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = ?", (jid,)).fetchone()
+    return _as_dict(row) if row else None
+
+
+def recent(conn, kind=None, limit=5):
+    """Latest jobs, newest first."""
+    where, params = ("WHERE kind = ?", [kind]) if kind else ("", [])
+    rows = conn.execute(
+        f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs {where} ORDER BY created_at DESC LIMIT ?",
+        params + [limit]
+    ).fetchall()
+    return [_as_dict(r) for r in rows]
+
+
+def prune(conn, kind, keep=10):
+    """Drops all but the `keep` newest finished jobs of `kind` and their output files."""
+    rows = conn.execute(
+        "SELECT id FROM jobs WHERE kind = ? AND status IN ('done', 'failed') ORDER BY created_at DESC LIMIT -1 OFFSET ?",
+        (kind, keep)
+    ).fetchall()
+    if not rows:
+        return
+    for (jid,) in rows:
+        for name in os.listdir(JOBS_DIR) if os.path.isdir(JOBS_DIR) else []:
+            if name.startswith(jid):
+                os.remove(os.path.join(JOBS_DIR, name))
+    with db.write_transaction(conn):
+        conn.executemany("DELETE FROM jobs WHERE id = ?", rows)
+
+
+def is_active(job):
+    return job is not None and job['status'] in ('queued', 'running')
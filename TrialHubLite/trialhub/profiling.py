@@ -0,0 +1,236 @@
+"""
+Lightweight instrumentation of the hot paths.
+
+A *run* collects what one unit of work cost: a Streamlit rerun or a
+background job. Code marks its stages with `timer()` / `@timed`; SQLite
+connections (db.connect) count their statements and repository reads
+report the rows they fetched. Outside a run all of this is a no-op: the
+statement counter is only attached to the thread's connections while a
+run that counts queries is active (it costs ~20% on bulk inserts).
+A run can also capture a full profile (pyinstrument if installed,
+cProfile otherwise).
+
+Finished runs are appended as JSON lines to a rotating log
+(logs/profile.log), so slow reruns in production can be found later.
+
+    run = profiling.start_run('rerun')
+    with profiling.timer('load_data'):
+        ...
+    profiling.finish_run(run)
+"""
+import cProfile
+import hmac
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from logging.handlers import RotatingFileHandler
+
+try:
+    import pyinstrument
+except ImportError:  # optional, cProfile is used instead
+    pyinstrument = None
+
+LOG_DIR = "logs"
+LOG_FILE = "profile.log"
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUPS = 5
+# Lines of the captured profile kept in the run (and the log)
+PROFILE_LINES = 40
+
+# Admin panel: enabled when the URL carries ?admin=<TRIALHUB_ADMIN_TOKEN>
+ADMIN_TOKEN_ENV = "TRIALHUB_ADMIN_TOKEN"
+
+_local = threading.local()
+_log_lock = threading.Lock()
+_logger = None
+
+
+def current():
+    """The run active on this thread, or None."""
+    return getattr(_local, 'run', None)
+
+
+def _tracked():
+    conns = getattr(_local, 'conns', None)
+    if conns is None:
+        conns = _local.conns = []
+    return conns
+
+
+def _trace(enabled):
+    for conn in _tracked():
+        conn.set_trace_callback(on_statement if enabled else None)
+
+
+def track(conn):
+    """Registers a connection held by this thread for statement counting (db.get_connection)."""
+    _tracked().append(conn)
+    run = current()
+    # Pooled connections move between threads: drop a counter left on by the last one
+    conn.set_trace_callback(on_statement if run is not None and run['_count_queries'] else None)
+    return conn
+
+
+def start_run(name, capture=False, count_queries=True, **meta):
+    """
+    Starts collecting for this thread (replacing any unfinished run).
+    capture: also record a full profile. count_queries: count SQL statements.
+    """
+    run = {
+        'name': name,
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'meta': meta,
+        'seconds': None,
+        'queries': 0,
+        'rows': 0,
+        # stage -> {'seconds', 'calls', 'queries', 'rows'}
+        'timers': {},
+        'profile': None,
+        '_t0': time.perf_counter(),
+        '_profiler': None,
+        '_count_queries': count_queries,
+    }
+    if capture:
+        try:
+            if pyinstrument is not None:
+                profiler = pyinstrument.Profiler()
+                profiler.start()
+            else:
+                profiler = cProfile.Profile()
+                profiler.enable()
+            run['_profiler'] = profiler
+        except (RuntimeError, ValueError):
+            # Another profiler is already active (only one per process on 3.12+)
+            pass
+    _local.run = run
+    _trace(count_queries)
+    return run
+
+
+def _profile_text(profiler):
+    if pyinstrument is not None:
+        profiler.stop()
+        return profiler.output_text(unicode=True, color=False)
+    profiler.disable()
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_LINES)
+    return out.getvalue()
+
+
+def finish_run(run, log=True):
+    """Stops the run, appends it to the profile log and returns it."""
+    if current() is run:
+        _local.run = None
+        _trace(False)
+    run['seconds'] = time.perf_counter() - run['_t0']
+    profiler = run.pop('_profiler', None)
+    if profiler is not None:
+        text = _profile_text(profiler)
+        run['profile'] = "\n".join(text.splitlines()[:PROFILE_LINES * 2])
+    if log:
+        write_log(run)
+    return run
+
+
+@contextmanager
+def timer(stage):
+    """Adds the time, statements and rows spent in the block to `stage` of the current run."""
+    run = current()
+    if run is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    queries, rows = run['queries'], run['rows']
+    try:
+        yield
+    finally:
+        entry = run['timers'].setdefault(stage, {'seconds': 0.0, 'calls': 0, 'queries': 0, 'rows': 0})
+        entry['seconds'] += time.perf_counter() - t0
+        entry['calls'] += 1
+        entry['queries'] += run['queries'] - queries
+        entry['rows'] += run['rows'] - rows
+
+
+def timed(stage=None):
+    """Decorator form of timer() (stage defaults to the function name)."""
+    def decorate(func):
+        name = stage or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def on_statement(sql):
+    """sqlite3 trace callback (see track()): counts statements."""
+    run = current()
+    if run is not None:
+        run['queries'] += 1
+
+
+def add_rows(n):
+    """Rows fetched from SQLite (called by the repository reads)."""
+    run = current()
+    if run is not None:
+        run['rows'] += int(n)
+
+
+# --- Log ---
+def log_path():
+    return os.path.join(LOG_DIR, LOG_FILE)
+
+
+def _get_logger():
+    global _logger
+    with _log_lock:
+        if _logger is None:
+            os.makedirs(LOG_DIR, exist_ok=True)
+            logger = logging.getLogger("trialhub.profile")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            handler = RotatingFileHandler(log_path(), maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding='utf-8')
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            _logger = logger
+        return _logger
+
+
+def write_log(run):
+    record = {k: v for k, v in run.items() if not k.startswith('_')}
+    _get_logger().info(json.dumps(record, ensure_ascii=False, default=str))
+
+
+def recent(name=None, limit=20):
+    """Latest logged runs (current log file only), newest first."""
+    try:
+        with open(log_path(), encoding='utf-8') as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return []
+    runs = []
+    for line in reversed(lines):
+        try:
+            run = json.loads(line)
+        except ValueError:
+            continue
+        if name is None or run['name'] == name:
+            runs.append(run)
+            if len(runs) >= limit:
+                break
+    return runs
+
+
+def is_admin(token):
+    """True when `token` matches the admin token from the environment (unset = nobody)."""
+    expected = os.environ.get(ADMIN_TOKEN_ENV, "")
+    return bool(expected) and hmac.compare_digest(str(token), expected)
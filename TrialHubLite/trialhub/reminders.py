@@ -0,0 +1,261 @@
+"""
+Reminders before upcoming trials, emitted from a background thread.
+
+The scheduler keeps a min-heap of (fire time, trial) for the trials
+starting within the next hours only, loaded with a range query on the
+trial_ts index. It sleeps until the next reminder is due. While idle it
+checks the data version (one primary-key lookup) and reloads the window
+when something was written or when the window runs out. It never scans
+the whole table.
+
+Each reminder goes to every sink: a callable taking the event dict (see
+log_sink / webhook_sink). Sent reminders are recorded in reminders_sent
+(schema._m011_reminders), so a restart doesn't resend them. A rescheduled
+trial gets a new reminder for its new time. Trials that are done,
+cancelled or failed get none.
+
+"now" is read from the clock on every tick.
+
+    reminders.start(db.DB_PATH, [reminders.log_sink()], leads=(7200, 900))
+"""
+import argparse
+import heapq
+import json
+import os
+import threading
+import time
+import urllib.request
+from datetime import datetime
+
+from . import codes
+from . import db
+from . import repository
+from .trial_time import VN_TZ
+
+# Seconds before the trial: 2 hours and 15 minutes
+DEFAULT_LEADS = (2 * 60 * 60, 15 * 60)
+# Trials loaded ahead of the longest lead time
+WINDOW_SECONDS = 60 * 60
+# Longest sleep between data-version checks
+POLL_SECONDS = 30
+
+LOG_PATH = os.path.join("logs", "reminders.log")
+WEBHOOK_TIMEOUT = 5
+
+# Environment configuration used by the app (see sinks_from_env / leads_from_env)
+LEADS_ENV = "TRIALHUB_REMINDER_LEADS"        # minutes, e.g. "120,15"
+WEBHOOK_ENV = "TRIALHUB_REMINDER_WEBHOOK"    # URL receiving a JSON POST per reminder
+
+# Trials in these states need no reminder
+CLOSED_STATUSES = (codes.STATUS_DONE, codes.STATUS_FAIL, codes.STATUS_CANCEL)
+
+EVENT_COLUMNS = ['id', 'trial_ts', 'trial_date', 'time', 'subject', 'phone', 'status', 'meet_link', 'evaluator', 'creator']
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+# --- Sinks ---
+def log_sink(path=LOG_PATH):
+    """Appends each reminder as a JSON line to `path`."""
+    lock = threading.Lock()
+
+    def sink(event):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with lock, open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+    return sink
+
+
+def webhook_sink(url, timeout=WEBHOOK_TIMEOUT):
+    """POSTs each reminder as JSON to `url` (e.g. a local chat bot / notifier)."""
+    def sink(event):
+        request = urllib.request.Request(
+            url, data=json.dumps(event, ensure_ascii=False).encode("utf-8"),
+            headers={"Content-Type": "application/json"}, method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=timeout):
+            pass
+    return sink
+
+
+def sinks_from_env():
+    """Log sink, plus a webhook sink when TRIALHUB_REMINDER_WEBHOOK is set."""
+    sinks = [log_sink()]
+    if os.environ.get(WEBHOOK_ENV):
+        sinks.append(webhook_sink(os.environ[WEBHOOK_ENV]))
+    return sinks
+
+
+def leads_from_env():
+    """Lead times in seconds from TRIALHUB_REMINDER_LEADS (minutes), else DEFAULT_LEADS."""
+    raw = os.environ.get(LEADS_ENV, "")
+    leads = [int(float(m) * 60) for m in raw.split(",") if m.strip()]
+    return tuple(leads) or DEFAULT_LEADS
+
+
+# --- Queries ---
+def upcoming(conn, start_ts, end_ts):
+    """
+    Open trials starting in [start_ts, end_ts) (range scan on idx_trials_trial_ts).
+    Date-only trials (NULL trial_ts, see trial_time.time_columns) have no
+    start time to remind of and are never returned.
+    """
+    placeholders = ", ".join("?" * len(CLOSED_STATUSES))
+    cursor = conn.execute(f"""
+        SELECT {', '.join(EVENT_COLUMNS)} FROM trials
+        WHERE trial_ts >= ? AND trial_ts < ? AND status_code NOT IN ({placeholders})
+        ORDER BY trial_ts
+    """, [int(start_ts), int(end_ts), *CLOSED_STATUSES])
+    return [dict(zip(EVENT_COLUMNS, row)) for row in cursor]
+
+
+def _still_due(conn, trial):
+    # The row may have been edited/deleted since the window was loaded
+    row = conn.execute("SELECT trial_ts, status_code FROM trials WHERE id = ?", (trial['id'],)).fetchone()
+    return row is not None and row[0] == trial['trial_ts'] and row[1] not in CLOSED_STATUSES
+
+
+def _already_sent(conn, trial, lead):
+    return conn.execute(
+        "SELECT 1 FROM reminders_sent WHERE trial_id = ? AND lead_seconds = ? AND trial_ts = ?",
+        (trial['id'], lead, trial['trial_ts'])
+    ).fetchone() is not None
+
+
+def _mark_sent(conn, trial, lead):
+    with db.write_transaction(conn):
+        conn.execute(
+            "INSERT OR IGNORE INTO reminders_sent (trial_id, lead_seconds, trial_ts, sent_at) VALUES (?, ?, ?, ?)",
+            (trial['id'], lead, trial['trial_ts'], datetime.now().isoformat(timespec='seconds'))
+        )
+
+
+# --- Scheduler ---
+def new_scheduler(db_path=db.DB_PATH, sinks=(), leads=DEFAULT_LEADS):
+    """Scheduler state (run it with tick() / run_forever(), or start())."""
+    return {
+        'db_path': db_path,
+        'sinks': list(sinks),
+        'leads': tuple(sorted(set(int(l) for l in leads), reverse=True)),
+        # (fire_ts, trial_id, lead, trial)
+        'heap': [],
+        'version': None,
+        'window_end': None,
+        'stop': threading.Event(),
+        'sent': 0,
+        'errors': 0,
+    }
+
+
+def _reload(sched, conn, now_ts):
+    """Rebuilds the heap from the trials inside the window."""
+    window_end = now_ts + max(sched['leads']) + WINDOW_SECONDS
+    heap = []
+    for trial in upcoming(conn, now_ts, window_end):
+        due = [lead for lead in sched['leads'] if trial['trial_ts'] - lead >= now_ts]
+        missed = [lead for lead in sched['leads'] if trial['trial_ts'] - lead < now_ts]
+        if missed:
+            # Time passed (scheduler down, trial just added): send the closest one now, once
+            due.append(min(missed))
+        for lead in due:
+            heap.append((max(trial['trial_ts'] - lead, now_ts), trial['id'], lead, trial))
+    heapq.heapify(heap)
+    sched['heap'] = heap
+    sched['window_end'] = window_end
+
+
+def event_for(trial, lead, now_ts):
+    """Reminder payload sent to the sinks."""
+    trial_at = datetime.fromtimestamp(trial['trial_ts'], VN_TZ)
+    return {
+        **{k: trial[k] for k in EVENT_COLUMNS if k != 'id'},
+        'trial_id': trial['id'],
+        'trial_at': trial_at.strftime("%d/%m/%Y %H:%M"),
+        'lead_minutes': lead // 60,
+        'minutes_left': max(0, (trial['trial_ts'] - int(now_ts)) // 60),
+        'sent_at': datetime.fromtimestamp(now_ts, VN_TZ).isoformat(timespec='seconds'),
+    }
+
+
+def _emit(sched, event):
+    for sink in sched['sinks']:
+        try:
+            sink(event)
+        except Exception:
+            # One failing sink (webhook down) must not block the others
+            sched['errors'] += 1
+
+
+def tick(sched, now_ts=None):
+    """
+    Reloads the window if the data changed or it ran out, then emits every
+    reminder due at `now_ts` (default: now). Returns the emitted events.
+    """
+    now_ts = time.time() if now_ts is None else now_ts
+    conn = db.get_connection(sched['db_path'])
+    version = repository.data_version(conn)
+    if version != sched['version'] or sched['window_end'] is None or now_ts >= sched['window_end'] - max(sched['leads']):
+        _reload(sched, conn, now_ts)
+        sched['version'] = version
+
+    events = []
+    heap = sched['heap']
+    while heap and heap[0][0] <= now_ts:
+        _, _, lead, trial = heapq.heappop(heap)
+        if trial['trial_ts'] <= now_ts or not _still_due(conn, trial) or _already_sent(conn, trial, lead):
+            continue
+        event = event_for(trial, lead, now_ts)
+        _emit(sched, event)
+        _mark_sent(conn, trial, lead)
+        sched['sent'] += 1
+        events.append(event)
+    return events
+
+
+def next_wakeup(sched, now_ts):
+    """Seconds to sleep: until the next reminder, at most POLL_SECONDS."""
+    if sched['heap']:
+        return max(0.0, min(sched['heap'][0][0] - now_ts, POLL_SECONDS))
+    return POLL_SECONDS
+
+
+def run_forever(sched):
+    """Ticks until sched['stop'] is set."""
+    while not sched['stop'].is_set():
+        try:
+            tick(sched)
+        except Exception:
+            sched['errors'] += 1
+        sched['stop'].wait(next_wakeup(sched, time.time()))
+
+
+def start(db_path=db.DB_PATH, sinks=None, leads=None):
+    """Starts the reminder thread once per process; returns its scheduler state."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = new_scheduler(
+                db_path,
+                sinks if sinks is not None else sinks_from_env(),
+                leads if leads is not None else leads_from_env(),
+            )
+            threading.Thread(target=run_forever, args=(_scheduler,), name="trialhub-reminders", daemon=True).start()
+        return _scheduler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send reminders before upcoming trials.")
+    parser.add_argument("--db", default=db.DB_PATH, help="SQLite file (default: trialhub.db)")
+    parser.add_argument("--leads", type=float, nargs='+', help="Minutes before the trial (default: 120 15)")
+    parser.add_argument("--webhook", help="URL receiving a JSON POST per reminder")
+    parser.add_argument("--log", default=LOG_PATH, help=f"JSON lines log of reminders (default: {LOG_PATH})")
+    args = parser.parse_args()
+    sinks = [log_sink(args.log)] + ([webhook_sink(args.webhook)] if args.webhook else [])
+    leads = [int(m * 60) for m in args.leads] if args.leads else leads_from_env()
+    scheduler = new_scheduler(args.db, sinks, leads)
+    print(f"Reminders {[l // 60 for l in scheduler['leads']]} min before each trial -> {args.log}")
+    try:
+        run_forever(scheduler)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,299 @@
+"""
+Data access layer for the `trials` table.
+
+Turns the sidebar filters and the search box into parameterized SQL so each
+view only pulls the rows and columns it actually needs from SQLite.
+"""
+import re
+from datetime import timedelta
+from functools import lru_cache
+
+import pandas as pd
+
+from . import codes
+from . import profiling
+
+TRIAL_COLUMNS = [
+    'id', 'stt', 'trial_date', 'time', 'meet_link', 'subject',
+    'phone', 'status', 'note', 'evaluator', 'creator'
+]
+
+# Column sets per view (trial_day / trial_ts are used for row styling, not
+# displayed; version is the optimistic-concurrency token of editable views)
+LIST_COLUMNS = TRIAL_COLUMNS + ['trial_day', 'trial_ts', 'version']
+EXPORT_COLUMNS = TRIAL_COLUMNS + ['trial_day', 'trial_ts']
+# Columns only used for the classification (dropped before display/export)
+STYLE_COLUMNS = ['trial_day', 'trial_ts']
+
+# Compact frames (fetch_compact): repeated text (days, times, statuses,
+# people) as categoricals, the rest Arrow-backed, nullable integer times
+CATEGORY_COLUMNS = ['trial_date', 'trial_day', 'time', 'subject', 'status', 'evaluator', 'creator']
+INT_COLUMNS = ['id', 'version']
+NULLABLE_INT_COLUMNS = ['trial_ts']
+
+# Search box tokens (letters/digits, Vietnamese included)
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+# Phone-like search text: digits and the separators people type ('2637', '0901 234')
+_PHONE_TERM_RE = re.compile(r"[\d\s.\-]*\d[\d\s.\-]*")
+
+
+# --- SQL helper functions (registered on each connection) ---
+@lru_cache(maxsize=4096)
+def _vn_lower(value):
+    # SQLite lower() only folds ASCII, Vietnamese text needs Python's lower()
+    if value is None:
+        return ''
+    return str(value).lower()
+
+
+def prepare_connection(conn):
+    """Registers the SQL functions used by the filter clauses."""
+    conn.create_function("vn_lower", 1, _vn_lower, deterministic=True)
+    return conn
+
+
+# --- Filters ---
+def make_filters(date_range=None, subjects=None, statuses=None, evaluator=None, search=None):
+    """
+    Normalizes raw widget values into a hashable filter dict.
+    date_range: (start_date, end_date) or anything else (ignored unless 2 dates).
+    """
+    filters = {}
+    if date_range is not None and len(date_range) == 2:
+        start_date, end_date = date_range
+        filters['date_range'] = (start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"))
+    # Selected labels -> canonical codes (codes.py), compared as integers in SQL
+    if subjects:
+        filters['subject_codes'] = tuple(sorted({codes.subject_code(s) for s in subjects}))
+    if statuses:
+        filters['status_codes'] = tuple(sorted({codes.status_code(s) for s in statuses}))
+    if evaluator and evaluator.strip():
+        filters['evaluator'] = evaluator.strip()
+    if search and search.strip():
+        filters['search'] = search.strip()
+    return filters
+
+
+def _any_contains(column, needles):
+    # Same semantics as `any(s.lower() in str(x).lower() for s in needles)`
+    clause = " OR ".join(f"instr(vn_lower({column}), ?) > 0" for _ in needles)
+    return f"({clause})", [n.lower() for n in needles]
+
+
+def fts_query(term):
+    """
+    Builds an FTS5 MATCH expression from the search box text.
+    Every word must match as a prefix; tone marks are ignored by the
+    tokenizer and 'đ' is folded to 'd' like in the index (schema._fts_value).
+    Returns None when the term has no searchable word.
+    """
+    term = term.replace('đ', 'd').replace('Đ', 'D')
+    tokens = _TOKEN_RE.findall(term)
+    if not tokens:
+        return None
+    return " ".join(f'"{t}"*' for t in tokens)
+
+
+def phone_digits(term):
+    """The digits of a phone-like search term, as stored (importer.normalize_phone); else None."""
+    if not _PHONE_TERM_RE.fullmatch(term):
+        return None
+    return re.sub(r"\D", "", term)
+
+
+def _conditions(filters):
+    """(clauses, params) for the given filter dict."""
+    clauses = []
+    params = []
+    if not filters:
+        return clauses, params
+
+    if 'date_range' in filters:
+        # trial_day is ISO + indexed -> index range scan
+        clauses.append("trial_day BETWEEN ? AND ?")
+        params.extend(filters['date_range'])
+
+    for key, column in (('subject_codes', 'subject_code'), ('status_codes', 'status_code')):
+        if key in filters:
+            clauses.append(f"{column} IN ({', '.join('?' * len(filters[key]))})")
+            params.extend(filters[key])
+
+    if 'evaluator' in filters:
+        sql, p = _any_contains('evaluator', [filters['evaluator']])
+        clauses.append(sql)
+        params.extend(p)
+
+    if 'search' in filters:
+        match = fts_query(filters['search'])
+        digits = phone_digits(filters['search'])
+        if digits:
+            # FTS only matches word prefixes: the last digits of a phone are found with instr()
+            clauses.append("(id IN (SELECT rowid FROM trials_fts WHERE trials_fts MATCH ?) OR instr(phone, ?) > 0)")
+            params.extend([match, digits])
+        elif match:
+            clauses.append("id IN (SELECT rowid FROM trials_fts WHERE trials_fts MATCH ?)")
+            params.append(match)
+
+    return clauses, params
+
+
+def build_where(filters, extra_clauses=(), extra_params=()):
+    """
+    Returns (where_sql, params) for the given filter dict (+ optional extra
+    clauses). where_sql is empty when there is nothing to filter on.
+    """
+    clauses, params = _conditions(filters)
+    clauses += list(extra_clauses)
+    params += list(extra_params)
+    if not clauses:
+        return "", []
+    return "WHERE " + " AND ".join(clauses), params
+
+
+# --- Queries ---
+def data_version(conn):
+    """Write counter of `trials` (bumped by triggers on every insert/update/delete)."""
+    row = conn.execute("SELECT value FROM data_meta WHERE key = 'trials'").fetchone()
+    return row[0] if row else 0
+
+
+def data_epoch(conn):
+    """Changes when `trials` is rebuilt from scratch (deltas do not span epochs)."""
+    row = conn.execute("SELECT value FROM data_meta WHERE key = 'trials_epoch'").fetchone()
+    return row[0] if row else 0
+
+
+def max_id(conn):
+    """Highest trial id (ids only grow within an epoch: AUTOINCREMENT)."""
+    return conn.execute("SELECT COALESCE(MAX(id), 0) FROM trials").fetchone()[0]
+
+
+def fetch_changes(conn, since, after_id, columns=None):
+    """
+    Rows updated after data version `since` or inserted with an id above
+    `after_id` (inserts are not stamped, see schema._m012_unstamped_inserts),
+    and ids deleted after `since`. Returns (changed frame, [deleted ids]).
+    """
+    columns = columns or TRIAL_COLUMNS
+    changed = pd.read_sql(
+        f"SELECT {', '.join(columns)} FROM trials WHERE change_seq > ? OR id > ? ORDER BY id",
+        conn, params=[int(since), int(after_id)]
+    )
+    deleted = [r[0] for r in conn.execute("SELECT id FROM trial_tombstones WHERE seq > ?", (int(since),))]
+    profiling.add_rows(len(changed) + len(deleted))
+    return changed, deleted
+
+
+def fetch_trials(conn, filters=None, columns=None, order_by="id DESC", limit=None):
+    """Fetches only the requested columns of the rows matching `filters`."""
+    columns = columns or TRIAL_COLUMNS
+    where_sql, params = build_where(filters)
+    sql = f"SELECT {', '.join(columns)} FROM trials {where_sql} ORDER BY {order_by}"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params = params + [int(limit)]
+    df = pd.read_sql(sql, conn, params=params)
+    profiling.add_rows(len(df))
+    return df
+
+
+def iter_trials(conn, columns=None, chunk_size=10000, filters=None, order_by="id"):
+    """Rows matching `filters` (default: whole table) in id order, as frames of at most `chunk_size` rows."""
+    columns = columns or TRIAL_COLUMNS
+    where_sql, params = build_where(filters)
+    sql = f"SELECT {', '.join(columns)} FROM trials {where_sql} ORDER BY {order_by}"
+    for chunk in pd.read_sql(sql, conn, params=params, chunksize=chunk_size):
+        profiling.add_rows(len(chunk))
+        yield chunk
+
+
+def _compact_chunk(df):
+    for col in df.columns:
+        if col in INT_COLUMNS:
+            df[col] = df[col].astype('int64')
+        elif col in NULLABLE_INT_COLUMNS:
+            df[col] = df[col].astype('Int64')
+        else:
+            df[col] = df[col].astype('string[pyarrow]')
+    return df
+
+
+def fetch_compact(conn, filters=None, columns=None, order_by="id DESC", chunk_size=10000):
+    """
+    fetch_trials() with compact dtypes (CATEGORY_COLUMNS...), built chunk by
+    chunk: only one chunk of Python str objects is alive at a time.
+    """
+    columns = columns or TRIAL_COLUMNS
+    chunks = [_compact_chunk(chunk) for chunk in iter_trials(conn, columns, chunk_size, filters, order_by)]
+    if not chunks:
+        return _compact_chunk(pd.DataFrame({col: pd.Series(dtype=object) for col in columns}))
+    df = pd.concat(chunks, ignore_index=True)
+    for col in df.columns.intersection(CATEGORY_COLUMNS):
+        df[col] = df[col].astype('category')
+    return df
+
+
+def fetch_page(conn, filters=None, columns=None, before_id=None, page_size=50):
+    """
+    Keyset pagination, newest first: the `page_size` rows with id < before_id
+    (first page when before_id is None). Cost does not grow with the page number.
+    """
+    columns = columns or TRIAL_COLUMNS
+    if before_id is None:
+        where_sql, params = build_where(filters)
+    else:
+        where_sql, params = build_where(filters, ["id < ?"], [int(before_id)])
+    sql = f"SELECT {', '.join(columns)} FROM trials {where_sql} ORDER BY id DESC LIMIT ?"
+    df = pd.read_sql(sql, conn, params=params + [int(page_size)])
+    profiling.add_rows(len(df))
+    return df
+
+
+def count_trials(conn, filters=None):
+    where_sql, params = build_where(filters)
+    return conn.execute(f"SELECT COUNT(*) FROM trials {where_sql}", params).fetchone()[0]
+
+
+def dashboard_stats(conn, today):
+    """
+    Dashboard metrics from the trial_stats aggregate (schema._m006_trial_stats).
+    today: date. Reads one row per (day, subject, status) group, not per trial.
+    Returns a dict of counts + 'status_counts' (Series) for the chart.
+    """
+    groups = pd.read_sql("SELECT trial_day, subject, status, n FROM trial_stats WHERE n > 0", conn)
+    profiling.add_rows(len(groups))
+    n = groups['n']
+
+    def count(mask):
+        return int(n[mask].sum())
+
+    today_iso = today.strftime("%Y-%m-%d")
+    upcoming_end = (today + timedelta(days=7)).strftime("%Y-%m-%d")
+    status = codes.status_codes(groups['status'])
+    subject = codes.subject_codes(groups['subject'])
+
+    status_counts = groups[groups['status'] != ''].groupby('status')['n'].sum().sort_values(ascending=False)
+    return {
+        'total': int(n.sum()),
+        'today': count(groups['trial_day'] == today_iso),
+        # From tomorrow to today+7
+        'upcoming': count((groups['trial_day'] > today_iso) & (groups['trial_day'] <= upcoming_end)),
+        'completed': count(status == codes.STATUS_DONE),
+        'broken': count(status == codes.STATUS_FAIL),
+        'cancelled': count(status == codes.STATUS_CANCEL),
+        'coding': count(subject == codes.SUBJECT_CODING),
+        'art': count(subject == codes.SUBJECT_ART),
+        'status_counts': status_counts,
+    }
+
+
+def get_trial(conn, trial_id):
+    """Returns a single trial (with its version) as a dict, or None if it does not exist."""
+    columns = TRIAL_COLUMNS + ['version']
+    cursor = conn.execute(
+        f"SELECT {', '.join(columns)} FROM trials WHERE id = ?", (int(trial_id),)
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return dict(zip(columns, row))
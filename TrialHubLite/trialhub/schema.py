@@ -0,0 +1,483 @@
+"""
+Schema creation and migrations for trialhub.db.
+
+Migrations are applied in order and tracked with PRAGMA user_version,
+so calling `migrate()` on every start is cheap once the DB is up to date.
+"""
+import logging
+import sqlite3
+
+import pandas as pd
+
+from . import codes
+from .importer import normalize_phone
+from .trial_time import has_time, time_columns
+
+log = logging.getLogger(__name__)
+
+
+def _create_trials(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS trials (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            stt TEXT,
+            trial_date TEXT,
+            time TEXT,
+            meet_link TEXT,
+            subject TEXT,
+            phone TEXT,
+            status TEXT,
+            note TEXT,
+            evaluator TEXT,
+            creator TEXT
+        )
+    """)
+
+
+def _columns(conn, table):
+    return [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def backfill_time_columns(conn, ids=None):
+    """
+    Recomputes trial_day / trial_ts from trial_date + time.
+    ids: only these rows (None = whole table).
+    """
+    if ids is None:
+        rows = conn.execute("SELECT id, trial_date, time FROM trials").fetchall()
+    else:
+        ids = list(ids)
+        if not ids:
+            return 0
+        placeholders = ", ".join("?" * len(ids))
+        rows = conn.execute(
+            f"SELECT id, trial_date, time FROM trials WHERE id IN ({placeholders})", ids
+        ).fetchall()
+
+    updates = [(*time_columns(d, t), row_id) for row_id, d, t in rows]
+    conn.executemany("UPDATE trials SET trial_day = ?, trial_ts = ? WHERE id = ?", updates)
+    return len(updates)
+
+
+def _m001_time_columns(conn):
+    cols = _columns(conn, "trials")
+    if 'trial_day' not in cols:
+        conn.execute("ALTER TABLE trials ADD COLUMN trial_day TEXT")
+    if 'trial_ts' not in cols:
+        conn.execute("ALTER TABLE trials ADD COLUMN trial_ts INTEGER")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_trials_trial_day ON trials(trial_day)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_trials_trial_ts ON trials(trial_ts)")
+    backfill_time_columns(conn)
+
+
+# --- Full-text search ---
+FTS_COLUMNS = ['phone', 'note', 'subject', 'evaluator', 'creator', 'status']
+
+
+def _fts_value(ref, column):
+    """
+    SQL expression indexed for `ref.column`.
+    unicode61 strips Vietnamese tone marks but keeps 'đ', so fold it here;
+    phones stored as 84xxx are also indexed in their local 0xxx form.
+    """
+    expr = f"replace(replace(coalesce({ref}.{column}, ''), 'đ', 'd'), 'Đ', 'D')"
+    if column == 'phone':
+        expr = (f"{expr} || CASE WHEN {ref}.phone LIKE '84%' "
+                f"THEN ' 0' || substr({ref}.phone, 3) ELSE '' END")
+    return expr
+
+
+def _fts_insert_sql(ref, rowid):
+    cols = ", ".join(FTS_COLUMNS)
+    values = ", ".join(_fts_value(ref, c) for c in FTS_COLUMNS)
+    return f"INSERT INTO trials_fts(rowid, {cols}) SELECT {rowid}, {values}"
+
+
+def _m002_fts(conn):
+    conn.execute("DROP TABLE IF EXISTS trials_fts")
+    conn.execute(f"""
+        CREATE VIRTUAL TABLE trials_fts USING fts5(
+            {', '.join(FTS_COLUMNS)},
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+    """)
+    conn.execute("DROP TRIGGER IF EXISTS trials_fts_ai")
+    conn.execute("DROP TRIGGER IF EXISTS trials_fts_ad")
+    conn.execute("DROP TRIGGER IF EXISTS trials_fts_au")
+    conn.execute(f"""
+        CREATE TRIGGER trials_fts_ai AFTER INSERT ON trials BEGIN
+            {_fts_insert_sql('new', 'new.id')};
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER trials_fts_ad AFTER DELETE ON trials BEGIN
+            DELETE FROM trials_fts WHERE rowid = old.id;
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER trials_fts_au AFTER UPDATE OF {', '.join(FTS_COLUMNS)} ON trials BEGIN
+            DELETE FROM trials_fts WHERE rowid = old.id;
+            {_fts_insert_sql('new', 'new.id')};
+        END
+    """)
+    # Backfill existing rows
+    conn.execute(_fts_insert_sql('t', 't.id') + " FROM trials t")
+
+
+def _m003_phone_date_index(conn):
+    # Dedupe key used by imports: one trial per (phone, trial_date)
+    ensure_phone_date_index(conn)
+
+
+def phone_date_index_unique(conn):
+    """True once ux_trials_phone_date enforces one trial per (phone, trial_date)."""
+    return any(name == 'ux_trials_phone_date' and unique for _, name, unique, *_ in conn.execute("PRAGMA index_list(trials)"))
+
+
+def duplicate_phone_dates(conn):
+    """[(phone, trial_date, count)] keys stored more than once (they keep the index non-unique)."""
+    return conn.execute("""
+        SELECT phone, trial_date, COUNT(*) FROM trials
+        WHERE phone <> '' AND trial_date <> ''
+        GROUP BY phone, trial_date HAVING COUNT(*) > 1
+        ORDER BY COUNT(*) DESC, phone
+    """).fetchall()
+
+
+def ensure_phone_date_index(conn):
+    """
+    Makes ux_trials_phone_date unique. While legacy duplicates exist it stays
+    a plain index (the importer's merge still dedupes new rows) and a warning
+    is logged. Call it inside a write transaction; returns whether it is unique.
+    """
+    if phone_date_index_unique(conn):
+        return True
+    conn.execute("DROP INDEX IF EXISTS ux_trials_phone_date")
+    try:
+        conn.execute("""
+            CREATE UNIQUE INDEX ux_trials_phone_date
+            ON trials(phone, trial_date) WHERE phone <> '' AND trial_date <> ''
+        """)
+        return True
+    except sqlite3.IntegrityError:
+        conn.execute("""
+            CREATE INDEX ux_trials_phone_date
+            ON trials(phone, trial_date) WHERE phone <> '' AND trial_date <> ''
+        """)
+        log.warning(
+            "ux_trials_phone_date is not unique: %d (phone, trial_date) keys are stored more than once "
+            "(schema.duplicate_phone_dates)", len(duplicate_phone_dates(conn)))
+        return False
+
+
+def _m004_sheet_sync(conn):
+    # Fingerprint of the sheet row each trial was last synced from (import_data.py)
+    if 'sheet_hash' not in _columns(conn, "trials"):
+        conn.execute("ALTER TABLE trials ADD COLUMN sheet_hash TEXT")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sync_state (
+            source TEXT PRIMARY KEY,
+            content_hash TEXT,
+            synced_at TEXT,
+            rows_seen INTEGER,
+            inserted INTEGER,
+            updated INTEGER
+        )
+    """)
+
+
+def _m005_row_version(conn):
+    # Optimistic concurrency: every UPDATE bumps version (changeset.py checks it)
+    cols = _columns(conn, "trials")
+    if 'version' not in cols:
+        conn.execute("ALTER TABLE trials ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+    if 'updated_at' not in cols:
+        conn.execute("ALTER TABLE trials ADD COLUMN updated_at TEXT")
+    # Writers that set version themselves are left alone (no double bump)
+    conn.execute("DROP TRIGGER IF EXISTS trials_version_au")
+    conn.execute("""
+        CREATE TRIGGER trials_version_au AFTER UPDATE ON trials
+        WHEN NEW.version = OLD.version
+        BEGIN
+            UPDATE trials
+            SET version = OLD.version + 1,
+                updated_at = strftime('%Y-%m-%dT%H:%M:%S', 'now', 'localtime')
+            WHERE id = NEW.id;
+        END
+    """)
+
+
+# Dashboard aggregate: row counts per (day, subject, status), kept in step
+# with `trials` by triggers so the dashboard never scans the raw rows.
+# NULLs are stored as '' (NULLs are never equal in a primary key).
+_STATS_KEY = "COALESCE({r}.trial_day, ''), COALESCE({r}.subject, ''), COALESCE({r}.status, '')"
+
+
+def _stats_delta(row, delta):
+    return f"""
+        INSERT INTO trial_stats (trial_day, subject, status, n)
+        VALUES ({_STATS_KEY.format(r=row)}, {delta})
+        ON CONFLICT (trial_day, subject, status) DO UPDATE SET n = n + ({delta});
+    """
+
+
+def _m006_trial_stats(conn):
+    for name in ("trial_stats_ai", "trial_stats_ad", "trial_stats_au"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    conn.execute("DROP TABLE IF EXISTS trial_stats")
+    conn.execute("""
+        CREATE TABLE trial_stats (
+            trial_day TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            status TEXT NOT NULL,
+            n INTEGER NOT NULL,
+            PRIMARY KEY (trial_day, subject, status)
+        ) WITHOUT ROWID
+    """)
+    conn.execute(f"""
+        INSERT INTO trial_stats (trial_day, subject, status, n)
+        SELECT {_STATS_KEY.format(r='trials')}, COUNT(*) FROM trials GROUP BY 1, 2, 3
+    """)
+    # Empty groups are left with n = 0 and skipped when reading
+    conn.execute(f"""
+        CREATE TRIGGER trial_stats_ai AFTER INSERT ON trials BEGIN
+            {_stats_delta('NEW', 1)}
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER trial_stats_ad AFTER DELETE ON trials BEGIN
+            {_stats_delta('OLD', -1)}
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER trial_stats_au AFTER UPDATE OF trial_day, subject, status ON trials BEGIN
+            {_stats_delta('OLD', -1)}
+            {_stats_delta('NEW', 1)}
+        END
+    """)
+
+
+def _m007_codes(conn):
+    # Canonical status/subject codes (codes.py): lookup tables + stored columns
+    cols = _columns(conn, "trials")
+    for col in ('status_code', 'subject_code'):
+        if col not in cols:
+            conn.execute(f"ALTER TABLE trials ADD COLUMN {col} INTEGER NOT NULL DEFAULT 0")
+    for table, entries in (("trial_status", codes.STATUSES), ("trial_subject", codes.SUBJECTS)):
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.execute(f"CREATE TABLE {table} (code INTEGER PRIMARY KEY, name TEXT NOT NULL, label TEXT NOT NULL)")
+        conn.executemany(
+            f"INSERT INTO {table} (code, name, label) VALUES (?, ?, ?)",
+            [(code, name, label) for code, (name, label) in entries.items()]
+        )
+    # One-time backfill
+    rows = conn.execute("SELECT id, status, subject FROM trials").fetchall()
+    conn.executemany(
+        "UPDATE trials SET status_code = ?, subject_code = ? WHERE id = ?",
+        [(codes.status_code(status), codes.subject_code(subject), row_id) for row_id, status, subject in rows]
+    )
+
+
+def _m008_data_version(conn):
+    # Counter bumped by every write to trials, from any process; cached reads
+    # are keyed on it (repository.data_version)
+    conn.execute("CREATE TABLE IF NOT EXISTS data_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+    conn.execute("INSERT OR IGNORE INTO data_meta (key, value) VALUES ('trials', 0)")
+    for name, event in (("ai", "INSERT"), ("ad", "DELETE"), ("au", "UPDATE")):
+        conn.execute(f"DROP TRIGGER IF EXISTS trials_dv_{name}")
+        conn.execute(f"""
+            CREATE TRIGGER trials_dv_{name} AFTER {event} ON trials BEGIN
+                UPDATE data_meta SET value = value + 1 WHERE key = 'trials';
+            END
+        """)
+
+
+# Columns whose change is a data change (bumps version / change_seq).
+# Bookkeeping columns (version, updated_at, change_seq) are left out so the
+# triggers' own stamping updates do not fire them again.
+DATA_COLUMNS = [
+    'stt', 'trial_date', 'time', 'meet_link', 'subject', 'phone', 'status', 'note',
+    'evaluator', 'creator', 'trial_day', 'trial_ts', 'sheet_hash', 'status_code', 'subject_code',
+]
+
+
+def _m009_change_log(conn):
+    # Change log: each row carries the data version of its last change,
+    # deletes leave a tombstone (api.py /changes pulls only what moved)
+    if 'change_seq' not in _columns(conn, "trials"):
+        conn.execute("ALTER TABLE trials ADD COLUMN change_seq INTEGER NOT NULL DEFAULT 0")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_trials_change_seq ON trials(change_seq)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS trial_tombstones (
+            id INTEGER PRIMARY KEY,
+            seq INTEGER NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_trial_tombstones_seq ON trial_tombstones(seq)")
+    # A rebuilt table (import_data.py --full) gets a new epoch: deltas cannot
+    # bridge it, readers reload everything
+    conn.execute("""
+        INSERT INTO data_meta (key, value) VALUES ('trials_epoch', 1)
+        ON CONFLICT (key) DO UPDATE SET value = value + 1
+    """)
+
+    data_cols = ", ".join(DATA_COLUMNS)
+    bump = "UPDATE data_meta SET value = value + 1 WHERE key = 'trials';"
+    seq = "(SELECT value FROM data_meta WHERE key = 'trials')"
+    for name in ("trials_dv_ai", "trials_dv_ad", "trials_dv_au", "trials_version_au"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    conn.execute(f"""
+        CREATE TRIGGER trials_dv_ai AFTER INSERT ON trials BEGIN
+            {bump}
+            UPDATE trials SET change_seq = {seq} WHERE id = NEW.id;
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER trials_dv_au AFTER UPDATE OF {data_cols} ON trials BEGIN
+            {bump}
+            UPDATE trials SET change_seq = {seq} WHERE id = NEW.id;
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER trials_dv_ad AFTER DELETE ON trials BEGIN
+            {bump}
+            INSERT OR REPLACE INTO trial_tombstones (id, seq) VALUES (OLD.id, {seq});
+        END
+    """)
+    # Same rule as _m005_row_version, limited to data columns
+    conn.execute(f"""
+        CREATE TRIGGER trials_version_au AFTER UPDATE OF {data_cols} ON trials
+        WHEN NEW.version = OLD.version
+        BEGIN
+            UPDATE trials
+            SET version = OLD.version + 1,
+                updated_at = strftime('%Y-%m-%dT%H:%M:%S', 'now', 'localtime')
+            WHERE id = NEW.id;
+        END
+    """)
+    conn.execute(f"UPDATE trials SET change_seq = {seq}")
+
+
+def _m010_jobs(conn):
+    # Background jobs (jobs.py): state + progress, readable from any session
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            label TEXT,
+            status TEXT NOT NULL,
+            progress REAL NOT NULL DEFAULT 0,
+            rows_done INTEGER NOT NULL DEFAULT 0,
+            rows_total INTEGER,
+            message TEXT,
+            result TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs(kind, created_at)")
+
+
+def _m011_reminders(conn):
+    # Reminders already emitted (reminders.py): one per trial, lead time and
+    # trial time, so restarts don't resend and a rescheduled trial is reminded again
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS reminders_sent (
+            trial_id INTEGER NOT NULL,
+            lead_seconds INTEGER NOT NULL,
+            trial_ts INTEGER NOT NULL,
+            sent_at TEXT NOT NULL,
+            PRIMARY KEY (trial_id, lead_seconds, trial_ts)
+        ) WITHOUT ROWID
+    """)
+
+
+def _m012_unstamped_inserts(conn):
+    # Inserts no longer stamp change_seq: that was one more UPDATE per inserted
+    # row on every write path (imports, sheet sync). New rows are found by id
+    # instead, ids only grow (repository.fetch_changes)
+    conn.execute("DROP TRIGGER IF EXISTS trials_dv_ai")
+    conn.execute("""
+        CREATE TRIGGER trials_dv_ai AFTER INSERT ON trials BEGIN
+            UPDATE data_meta SET value = value + 1 WHERE key = 'trials';
+        END
+    """)
+
+
+def _m013_job_owner(conn):
+    # Process running each job (jobs.py): a starting server only fails the
+    # queued/running jobs of processes that are gone
+    if 'owner' not in _columns(conn, "jobs"):
+        conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+
+
+def _m014_date_only_trials(conn):
+    # Rows with a date but no time were stored at 00:00, so reminders fired
+    # the night before: they keep their trial_day and lose trial_ts
+    rows = conn.execute("SELECT id, trial_date, time FROM trials WHERE trial_ts IS NOT NULL").fetchall()
+    backfill_time_columns(conn, [row_id for row_id, d, t in rows if not has_time(t)])
+
+
+def _m015_normalized_phones(conn):
+    # Only imports normalized phones: rows typed in the editor/form ("0901 234 567")
+    # escaped the (phone, trial_date) dedupe. The index is dropped while the
+    # phones are rewritten, then rebuilt (unique unless real duplicates show up).
+    rows = conn.execute("SELECT id, phone FROM trials WHERE phone IS NOT NULL").fetchall()
+    phones = pd.Series([phone for _, phone in rows], dtype=object)
+    updates = [
+        (new, row_id) for (row_id, old), new in zip(rows, normalize_phone(phones)) if new != old
+    ]
+    if updates:
+        conn.execute("DROP INDEX IF EXISTS ux_trials_phone_date")
+        conn.executemany("UPDATE trials SET phone = ? WHERE id = ?", updates)
+    ensure_phone_date_index(conn)
+
+
+# Append only: position in the list is the schema version.
+MIGRATIONS = [
+    _m001_time_columns,
+    _m002_fts,
+    _m003_phone_date_index,
+    _m004_sheet_sync,
+    _m005_row_version,
+    _m006_trial_stats,
+    _m007_codes,
+    _m008_data_version,
+    _m009_change_log,
+    _m010_jobs,
+    _m011_reminders,
+    _m012_unstamped_inserts,
+    _m013_job_owner,
+    _m014_date_only_trials,
+    _m015_normalized_phones,
+]
+
+
+def migrate(conn):
+    """
+    Creates the schema if needed and applies pending migrations.
+    Each step runs in its own BEGIN IMMEDIATE transaction, so concurrent
+    starters (sessions, import_data.py) apply every step exactly once.
+    """
+    if conn.in_transaction:
+        conn.commit()
+    # Fast path: nothing to do, no write lock taken
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= len(MIGRATIONS):
+        return len(MIGRATIONS)
+
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            _create_trials(conn)
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= len(MIGRATIONS):
+                conn.commit()
+                break
+            MIGRATIONS[version](conn)
+            conn.execute(f"PRAGMA user_version = {version + 1}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    return len(MIGRATIONS)
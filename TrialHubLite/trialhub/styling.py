@@ -0,0 +1,77 @@
+"""
+Vectorized row classification + styling for the trial tables.
+
+Every row gets one category (fail/cancel/done/urgent/normal) computed for
+the whole frame in one pass; the CSS is then looked up per category
+instead of calling a Python function per row.
+"""
+import numpy as np
+import pandas as pd
+
+from . import codes
+from .trial_time import time_columns, to_epoch
+
+CATEGORIES = ['fail', 'cancel', 'done', 'urgent', 'normal']
+
+# Colors
+CATEGORY_STYLES = {
+    'fail': 'background-color: #fecaca',                    # Gãy
+    'cancel': 'background-color: #f3f4f6; color: #9ca3af',  # Hủy
+    'done': 'background-color: #d1fae5',                    # Đã trial
+    'urgent': 'background-color: #ffedd5',                  # Today or < 2 hours
+    'normal': '',
+}
+
+URGENT_WINDOW_SECONDS = 2 * 60 * 60
+
+
+def _trial_times(df):
+    """(trial_ts as float64, trial_day or None when the frame has no such column)."""
+    if 'trial_ts' in df.columns:
+        # float64, not nullable Int64 (repository.fetch_compact): comparisons with NA
+        # would yield NA instead of False and np.select rejects them
+        ts = pd.to_numeric(df['trial_ts'], errors='coerce').astype('float64')
+        return ts, df['trial_day'] if 'trial_day' in df.columns else None
+    # Fallback for frames without the precomputed columns
+    times = [time_columns(d, t) for d, t in zip(df['trial_date'], df['time'])]
+    return (pd.Series([ts for _, ts in times], index=df.index, dtype='float64'),
+            pd.Series([day for day, _ in times], index=df.index, dtype=object))
+
+
+def classify_trials(df, now):
+    """
+    Returns a categorical Series (aligned with df.index) of row categories.
+    df needs 'status' and 'trial_day' + 'trial_ts' (or 'trial_date' + 'time').
+    now: naive VN datetime.
+    """
+    status = codes.status_codes(df['status']).to_numpy()
+    ts, day = _trial_times(df)
+
+    now_ts = to_epoch(now)
+    diff = ts - now_ts
+    if day is not None:
+        # By day: date-only trials (no trial_ts) are today's too
+        today = (day.astype('string') == now.strftime("%Y-%m-%d")).fillna(False)
+    else:
+        today_start = to_epoch(now.replace(hour=0, minute=0, second=0, microsecond=0))
+        today = (ts >= today_start) & (ts < today_start + 86400)
+
+    conditions = [
+        status == codes.STATUS_FAIL,
+        status == codes.STATUS_CANCEL,
+        status == codes.STATUS_DONE,
+        (today | ((diff >= 0) & (diff <= URGENT_WINDOW_SECONDS))).to_numpy(dtype=bool),
+    ]
+    values = np.select(conditions, CATEGORIES[:4], default='normal')
+    return pd.Series(pd.Categorical(values, categories=CATEGORIES), index=df.index)
+
+
+def style_trials(df, categories):
+    """Styler coloring each row of df by its category."""
+    css = categories.map(CATEGORY_STYLES).astype(str).to_numpy()
+    css_frame = pd.DataFrame(
+        np.repeat(css[:, None], len(df.columns), axis=1),
+        index=df.index,
+        columns=df.columns,
+    )
+    return df.style.apply(lambda _: css_frame, axis=None)
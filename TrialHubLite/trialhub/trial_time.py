@@ -0,0 +1,74 @@
+"""
+Parsing of the free-text `trial_date` / `time` columns into the normalized
+`trial_day` (ISO yyyy-mm-dd) and `trial_ts` (epoch seconds) columns.
+Rows with a date but no usable time get a trial_day and no trial_ts.
+"""
+from datetime import datetime
+
+import pytz
+
+VN_TZ = pytz.timezone('Asia/Ho_Chi_Minh')
+
+
+def parse_trial_datetime(date_str, time_str):
+    try:
+        # Parse date
+        d = datetime.strptime(str(date_str), "%d/%m/%Y")
+        # Parse time
+        t_str = str(time_str).lower().replace('h', ':').replace('g', ':').strip()
+        if ':' not in t_str:
+            if t_str.isdigit():
+                t_str += ":00"
+            else:
+                return d # Date only
+
+        parts = t_str.split(':')
+        h = int(parts[0])
+        m = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 0
+        return d.replace(hour=h, minute=m)
+    except:
+        return None
+
+
+def now_vn():
+    """Current VN wall-clock time as a naive datetime (call it when needed, don't keep it)."""
+    return datetime.now(VN_TZ).replace(tzinfo=None)
+
+
+def to_trial_day(date_str):
+    """dd/mm/yyyy -> yyyy-mm-dd (None if unparseable)."""
+    try:
+        return datetime.strptime(str(date_str).strip(), "%d/%m/%Y").strftime("%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None
+
+
+def to_epoch(dt):
+    """Naive VN wall-clock datetime -> epoch seconds."""
+    if dt is None:
+        return None
+    return int(VN_TZ.localize(dt).timestamp())
+
+
+def day_start_epoch(day):
+    """Epoch seconds of 00:00 VN time for a date/datetime."""
+    return to_epoch(datetime(day.year, day.month, day.day))
+
+
+def has_time(time_str):
+    """True if `time_str` holds a time parse_trial_datetime understands ('19h30', '7', '20:00')."""
+    t_str = str(time_str).lower().replace('h', ':').replace('g', ':').strip()
+    return ':' in t_str or t_str.isdigit()
+
+
+def time_columns(date_str, time_str):
+    """
+    Returns (trial_day, trial_ts) for one row. trial_ts is None for date-only
+    rows: midnight is not their start time (reminders, urgent countdown).
+    """
+    day = to_trial_day(date_str)
+    if day is None:
+        return None, None
+    if not has_time(time_str):
+        return day, None
+    return day, to_epoch(parse_trial_datetime(str(date_str).strip(), time_str))